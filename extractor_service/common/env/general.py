@@ -1,14 +1,69 @@
 import os
 
+from utils.common import parse_bool
+
 SRV_LOG_LEVEL = os.getenv("SRV_LOG_LEVEL", "INFO").upper()
+# Записи логов передаются в процесс логирования пачками: по LOG_BATCH_SIZE записей или раз в
+# LOG_FLUSH_INTERVAL_SEC (записи WARNING и выше - сразу). При заполненной очереди (LOG_QUEUE_MAX_BATCHES пачек)
+# записи отбрасываются и учитываются в метрике logging.dropped
+LOG_BATCH_SIZE = max(int(os.getenv("LOG_BATCH_SIZE", 64)), 1)
+LOG_FLUSH_INTERVAL_SEC = float(os.getenv("LOG_FLUSH_INTERVAL_SEC", 0.2))
+LOG_QUEUE_MAX_BATCHES = int(os.getenv("LOG_QUEUE_MAX_BATCHES", 1024))
+# Из повторяющихся записей DEBUG (одного логера с одним шаблоном) передается каждая N-я (1 - все)
+LOG_DEBUG_SAMPLE_RATE = max(int(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1)), 1)
+# Сообщение длиннее LOG_MAX_MESSAGE_LENGTH символов обрезается; summarize() показывает
+# не больше LOG_SUMMARY_MAX_ITEMS элементов каждой коллекции
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", 10000))
+LOG_SUMMARY_MAX_ITEMS = int(os.getenv("LOG_SUMMARY_MAX_ITEMS", 3))
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8080))
+# Число процессов API (1 - сервер в основном процессе). Процессы используют общие реплики технологий
+# и моделей: каждый получает ответы ресурсов через свою очередь
+API_WORKERS = max(int(os.getenv("API_WORKERS", 1)), 1)
+# Каждый процесс API открывает свой сокет с SO_REUSEPORT и соединения распределяет ядро;
+# иначе процессы принимают соединения из одного общего сокета
+API_REUSE_PORT: bool = parse_bool(os.getenv("API_REUSE_PORT", True))
 
 S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
 S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
 S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
 
+# Хранилище объектов: 's3' или 'filesystem' (объект bucket/key - файл <DATA_STORAGE_ROOT_DIR>/bucket/key)
+DATA_STORAGE_BACKEND = os.getenv("DATA_STORAGE_BACKEND", "s3")
+DATA_STORAGE_ROOT_DIR = os.getenv("DATA_STORAGE_ROOT_DIR")
+
 # Переменные среды ограничения размеров очереди для subscribers
 DEFAULT_SUB_PENDING_MSGS_LIMIT: int = int(os.getenv("DEFAULT_SUB_PENDING_MSGS_LIMIT", 512 * 1024))
 DEFAULT_SUB_PENDING_BYTES_LIMIT: int = int(os.getenv("DEFAULT_SUB_PENDING_BYTES_LIMIT", 128 * 1024 * 1024))
 
 CONTENTS_FETCH_THREADS = int(os.getenv("CONTENTS_FETCH_THREADS", 4))
-CONTENTS_BATCH_SIZE = int(os.getenv("CONTENTS_BATCH_SIZE", 1))
\ No newline at end of file
+# Кэш тел объектов S3 на локальном диске по ETag (каталог не задан - кэш выключен)
+S3_DISK_CACHE_DIR = os.getenv("S3_DISK_CACHE_DIR")
+S3_DISK_CACHE_MAX_BYTES = int(os.getenv("S3_DISK_CACHE_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+CONTENTS_BATCH_SIZE = int(os.getenv("CONTENTS_BATCH_SIZE", 1))
+# Максимальное число загруженных, но еще не обработанных контейнеров на запрос
+CONTENTS_QUEUE_SIZE = int(os.getenv("CONTENTS_QUEUE_SIZE", 64))
+# Размер буфера каждого потребителя при раздаче элементов шага в pre-collected шаги
+PIPELINE_BROADCAST_BUFFER_SIZE = int(os.getenv("PIPELINE_BROADCAST_BUFFER_SIZE", 64))
+# Кэш загруженных объектов S3 в памяти (0 - без кэша, только объединение одновременных загрузок)
+S3_OBJECT_CACHE_TTL_SEC = float(os.getenv("S3_OBJECT_CACHE_TTL_SEC", 0))
+S3_OBJECT_CACHE_MAX_BYTES = int(os.getenv("S3_OBJECT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Размер пула соединений клиента S3 (botocore max_pool_connections); он же ограничивает
+# число одновременных чтений объектов одним клиентом
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+# Чтение объектов S3 частями: размер части и максимальный размер объекта
+S3_READ_CHUNK_SIZE = int(os.getenv("S3_READ_CHUNK_SIZE", 1024 * 1024))
+S3_MAX_OBJECT_SIZE = int(os.getenv("S3_MAX_OBJECT_SIZE", 256 * 1024 * 1024))
+# Повторы обращений к хранилищу: число попыток и экспоненциальная задержка со случайной добавкой
+S3_RETRY_TRIES = int(os.getenv("S3_RETRY_TRIES", 3))
+S3_RETRY_BASE_DELAY_SEC = float(os.getenv("S3_RETRY_BASE_DELAY_SEC", 0.1))
+S3_RETRY_MAX_DELAY_SEC = float(os.getenv("S3_RETRY_MAX_DELAY_SEC", 2))
+# Бюджет повторов: неудача тратит жетон, успех возвращает S3_RETRY_BUDGET_RATIO жетона;
+# пока жетонов не больше половины, повторы не выполняются
+S3_RETRY_BUDGET_TOKENS = float(os.getenv("S3_RETRY_BUDGET_TOKENS", 10))
+S3_RETRY_BUDGET_RATIO = float(os.getenv("S3_RETRY_BUDGET_RATIO", 0.1))
+# Размыкатель цепи: после S3_CIRCUIT_FAILURE_THRESHOLD неудач подряд обращения к хранилищу
+# отклоняются сразу в течение S3_CIRCUIT_RESET_SEC, затем пропускается одна пробная попытка
+S3_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("S3_CIRCUIT_FAILURE_THRESHOLD", 5))
+S3_CIRCUIT_RESET_SEC = float(os.getenv("S3_CIRCUIT_RESET_SEC", 10))
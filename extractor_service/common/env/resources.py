@@ -7,3 +7,10 @@ CPU_LIMIT: Optional[float] = os.getenv('CPU_LIMIT')
 MEMORY_LIMIT: Optional[int] = os.getenv('MEMORY_LIMIT')     # in bytes
 USE_GPU: Optional[bool] = parse_bool(os.getenv('USE_GPU', False))
 PROCESS_QUEUE_MAX_SIZE = int(os.getenv("PROCESS_QUEUE_MAX_SIZE", 1000))
+# Время ожидания ответа реплик на служебную команду (снимок памяти, метрики): реплика, занятая
+# долгой задачей, попадает в ответ со статусом ошибки
+CONTROL_COMMAND_TIMEOUT_SEC = float(os.getenv("CONTROL_COMMAND_TIMEOUT_SEC", 10))
+
+# Отслеживание аллокаций в репликах ресурсов (tracemalloc)
+MEMORY_TRACE_ON_START: bool = parse_bool(os.getenv('MEMORY_TRACE_ON_START', False))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", 1))
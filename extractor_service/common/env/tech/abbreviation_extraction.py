@@ -1,7 +1,55 @@
 import os
+from typing import Optional
+
+from utils.common import parse_bool
 
 ABBREVIATION_DETECTION_TECH_REPLICAS = int(os.getenv("ABBREVIATION_DETECTION_TECH_REPLICAS", 1))
 ABBREVIATION_DETECTOR_REPLICAS = int(os.getenv("ABBREVIATION_DETECTOR_REPLICAS", 1))
 EXPANSION_DETECTOR_REPLICAS = int(os.getenv("EXPANSION_DETECTOR_REPLICAS", 1))
 
 ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE = int(os.getenv("ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE", 500))
+
+# Ограничения числа одновременно обрабатываемых элементов на шагах пайплайна
+# (слот шага занят, пока не завершены и его дочерние шаги)
+CONTENT_MERGE_CONCURRENCY = int(os.getenv("CONTENT_MERGE_CONCURRENCY", 64))
+ABBREVIATION_EXTRACTION_CONCURRENCY = int(os.getenv("ABBREVIATION_EXTRACTION_CONCURRENCY", 32))
+RESULT_UPLOAD_CONCURRENCY = int(os.getenv("RESULT_UPLOAD_CONCURRENCY", 8))
+
+# Кэш результатов извлечения по содержимому текста
+RESULT_CACHE_ENABLED: bool = parse_bool(os.getenv("RESULT_CACHE_ENABLED", True))
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+# Файл дискового уровня кэша, общий для реплик технологии (не задан - только кэш в памяти)
+RESULT_CACHE_DISK_PATH: Optional[str] = os.getenv("RESULT_CACHE_DISK_PATH")
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+
+# Форматировать JSON результатов с отступами (по умолчанию - компактная запись)
+RESULT_JSON_INDENT: bool = parse_bool(os.getenv("RESULT_JSON_INDENT", False))
+# Сжатие выгружаемых результатов (в обоих режимах выгрузки): 'none', 'gzip' или 'zstd'
+RESULT_COMPRESSION = os.getenv("RESULT_COMPRESSION", "none")
+# Выгрузка результатов: 'object' - отдельный JSON-объект S3 на каждый контейнер,
+# 'aggregated' - результаты запроса дописываются строками в общие объекты JSONL
+RESULT_UPLOAD_MODE = os.getenv("RESULT_UPLOAD_MODE", "object")
+# Максимальное число результатов в одном объекте JSONL
+RESULT_AGGREGATE_MAX_ITEMS = int(os.getenv("RESULT_AGGREGATE_MAX_ITEMS", 1000))
+# Префикс ключей объектов JSONL
+RESULT_AGGREGATE_KEY_PREFIX = os.getenv("RESULT_AGGREGATE_KEY_PREFIX", "results/")
+
+# Максимальная длина текста (символов), переданного в запросе /abbrev/extract_text
+INLINE_TEXT_MAX_LENGTH = int(os.getenv("INLINE_TEXT_MAX_LENGTH", 1024 * 1024))
+
+# Асинхронные задания (/abbrev/jobs): файл состояния sqlite (не задан - состояние в памяти,
+# незавершенные задания не возобновляются после перезапуска)
+JOB_STORE_PATH: Optional[str] = os.getenv("JOB_STORE_PATH")
+# Число одновременно выполняемых заданий (остальные ждут в очереди)
+JOBS_MAX_RUNNING = int(os.getenv("JOBS_MAX_RUNNING", 2))
+# Контейнеров задания в одном запросе к технологии: между частями технология обслуживает другие запросы
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 1000))
+# Результатов, сохраняемых в файл состояния одной транзакцией
+JOB_PERSIST_BATCH_SIZE = int(os.getenv("JOB_PERSIST_BATCH_SIZE", 100))
+# Время хранения завершенных заданий, с
+JOB_RETENTION_SEC = float(os.getenv("JOB_RETENTION_SEC", 7 * 24 * 3600))
+# Период удаления завершенных заданий старше JOB_RETENTION_SEC, с
+JOB_PURGE_PERIOD_SEC = float(os.getenv("JOB_PURGE_PERIOD_SEC", 3600))
+# Уведомление о завершении задания: таймаут запроса и число попыток
+JOB_WEBHOOK_TIMEOUT_SEC = float(os.getenv("JOB_WEBHOOK_TIMEOUT_SEC", 10))
+JOB_WEBHOOK_TRIES = int(os.getenv("JOB_WEBHOOK_TRIES", 3))
@@ -5,5 +5,6 @@ from pydantic import BaseModel
 
 class S3ContentType(str, Enum):
     JSON = "application/json"
+    JSON_LINES = "application/x-ndjson"
     TEXT = "text/plain"
     OCTET_STREAM = "application/octet-stream"
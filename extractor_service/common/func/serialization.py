@@ -0,0 +1,60 @@
+import datetime
+import json
+from enum import Enum
+from typing import Any, Iterable, Union
+
+try:
+    import orjson
+except ImportError:                                                         # pragma: no cover
+    orjson = None
+
+from fastapi import Response
+
+from utils.aes_utils.models.base_model import BaseModel
+
+JSON_MEDIA_TYPE = "application/json"
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+    _INDENT_OPTIONS = _OPTIONS | orjson.OPT_INDENT_2
+
+
+def _default(obj: Any) -> Any:
+    # типы, которые orjson сериализует сам
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """ Сериализовать в JSON (UTF-8, без экранирования не-ASCII символов)
+
+    Используется orjson, если он установлен, иначе стандартный json
+
+    :param obj: словари, списки, строки, числа, datetime
+    :param indent: форматировать с отступом в 2 пробела (по умолчанию - компактно)
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_INDENT_OPTIONS if indent else _OPTIONS)
+
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def models_response(models: Iterable[BaseModel], status_code: int = 200) -> Response:
+    """ Готовый ответ API со списком моделей
+
+    Модели преобразуются в словари (по псевдонимам полей, как при ответе FastAPI)
+    и сериализуются один раз, без повторного обхода jsonable_encoder
+    """
+    content = dumps([model.dict(by_alias=True) for model in models])
+    return Response(content=content, status_code=status_code, media_type=JSON_MEDIA_TYPE)
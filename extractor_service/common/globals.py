@@ -1,24 +1,43 @@
 import logging
 import logging.config
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
+from extractor_service.common.struct.metrics import MetricsRegistry
 from extractor_service.common.struct.process_logger import ProcessLogger, QueueHandler
 from extractor_service.common.struct.resource_manager import ResourceManager
 from utils import ut_logging
 
+if TYPE_CHECKING:
+    from multiprocessing import Queue
+
+    from extractor_service.common.struct.job_manager import JobManager
+
 service_logger: Optional[logging.Logger] = None
+# очередь записей процесса логирования
+log_queue: Optional['Queue'] = None
 service_config = {}
 
 resource_manager = ResourceManager()
 
+# метрики текущего процесса (у каждой реплики ресурса свой реестр)
+metrics = MetricsRegistry()
+
+# асинхронные задания (создается при запуске сервиса)
+job_manager: Optional['JobManager'] = None
+
 
 def init_service_config(config: dict):
     global service_config
     service_config = config
 
 
-def init_service_logger(service_name, conf_dict):
-    global service_logger
+def init_service_logger(service_name, conf_dict, queue: Optional['Queue'] = None):
+    """ Направить записи логов в процесс логирования
+
+    :param queue: очередь уже запущенного процесса логирования (в процессах API);
+                  None - запустить процесс логирования
+    """
+    global service_logger, log_queue
 
     root_logger = logging.getLogger()
     root_level = root_logger.level
@@ -34,10 +53,12 @@ def init_service_logger(service_name, conf_dict):
 
         logging.config.dictConfig(conf_dict[ut_logging.LOGGING_SECTION])
 
-    process_logger = ProcessLogger(service_name, conf_dict)
+    if queue is None:
+        queue = ProcessLogger(service_name, conf_dict).queue
+    log_queue = queue
 
     root_logger.handlers.clear()
-    qh = QueueHandler(process_logger.queue)
+    qh = QueueHandler(queue, metrics=metrics)
     root_logger.addHandler(qh)
 
     # выставляем хэндлер по-умолчанию для логеров из конфигурации
@@ -0,0 +1,140 @@
+import asyncio
+from typing import AsyncIterator, AsyncGenerator, List, Optional, TypeVar
+
+import extractor_service.common.globals as aes_globals
+
+ItemType = TypeVar("ItemType")
+
+# признак окончания источника
+_END = object()
+
+
+class _SourceError:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class BoundedBroadcast:
+    """ Раздача элементов асинхронного источника нескольким потребителям
+
+    У каждого потребителя свой буфер ограниченного размера. Пока буфер любого
+    из потребителей заполнен, источник не читается, поэтому в памяти находится
+    не более buffer_size элементов на потребителя, а не весь отставший поток (как в tee).
+    Потребитель, переставший читать (close_consumer), из раздачи исключается
+    """
+
+    def __init__(self,
+                 source: AsyncIterator[ItemType],
+                 consumers: int,
+                 buffer_size: int,
+                 metric_name: str = "pipeline.broadcast"):
+        """
+        :param source: источник элементов
+        :param consumers: число потребителей
+        :param buffer_size: размер буфера каждого потребителя
+        :param metric_name: префикс метрик
+        """
+        if consumers < 1:
+            raise ValueError("Broadcast must have at least one consumer")
+
+        if buffer_size < 1:
+            raise ValueError("Broadcast buffer size must be positive")
+
+        self._source = source
+        self._buffers: List[asyncio.Queue] = [asyncio.Queue() for _ in range(consumers)]
+        # свободные места в буферах потребителей
+        self._free_slots: List[asyncio.Semaphore] = [asyncio.Semaphore(buffer_size) for _ in range(consumers)]
+        self._closed: List[bool] = [False] * consumers
+        self._high_water: List[int] = [0] * consumers
+        self._pump_task: Optional[asyncio.Task] = None
+
+        self._high_water_gauge = aes_globals.metrics.gauge(f"{metric_name}.buffer_high_water")
+        self._items_counter = aes_globals.metrics.counter(f"{metric_name}.items")
+
+    @property
+    def high_water_marks(self) -> List[int]:
+        """ Максимальная заполненность буфера каждого потребителя """
+        return list(self._high_water)
+
+    def start(self) -> List[AsyncGenerator[ItemType, None]]:
+        """ Запустить чтение источника
+
+        :return: генераторы потребителей (по одному на каждого)
+        """
+        if self._pump_task is None:
+            self._pump_task = asyncio.create_task(self._pump())
+        return [self._consume(idx) for idx in range(len(self._buffers))]
+
+    async def _put(self, idx: int, item):
+        if self._closed[idx]:
+            return
+
+        await self._free_slots[idx].acquire()
+        # потребитель мог быть закрыт, пока источник ожидал места в его буфере
+        if self._closed[idx]:
+            return
+
+        buffer = self._buffers[idx]
+        buffer.put_nowait(item)
+
+        buffer_size = buffer.qsize()
+        if buffer_size > self._high_water[idx]:
+            self._high_water[idx] = buffer_size
+            self._high_water_gauge.set_max(buffer_size)
+
+    async def _pump(self):
+        end = _END
+        try:
+            async for item in self._source:
+                self._items_counter.inc()
+                for idx in range(len(self._buffers)):
+                    await self._put(idx, item)
+        except asyncio.CancelledError:
+            end = _SourceError(asyncio.CancelledError())
+            raise
+        except Exception as ex:
+            end = _SourceError(ex)
+        finally:
+            for idx, buffer in enumerate(self._buffers):
+                if self._closed[idx]:
+                    continue
+                # маркер конца не занимает место в буфере
+                buffer.put_nowait(end)
+
+    async def _consume(self, idx: int) -> AsyncGenerator[ItemType, None]:
+        buffer = self._buffers[idx]
+        try:
+            while True:
+                item = await buffer.get()
+                self._free_slots[idx].release()
+                if item is _END:
+                    return
+
+                if isinstance(item, _SourceError):
+                    raise item.error
+                yield item
+        finally:
+            self.close_consumer(idx)
+
+    def close_consumer(self, idx: int, *_):
+        """ Исключить потребителя из раздачи и освободить его буфер """
+        if self._closed[idx]:
+            return
+
+        self._closed[idx] = True
+        buffer = self._buffers[idx]
+        while not buffer.empty():
+            buffer.get_nowait()
+        # будим источник, если он ожидает места в буфере этого потребителя
+        self._free_slots[idx].release()
+
+    async def close(self):
+        """ Остановить чтение источника """
+        for idx in range(len(self._buffers)):
+            self.close_consumer(idx)
+
+        if self._pump_task is not None and not self._pump_task.done():
+            self._pump_task.cancel()
+            await asyncio.gather(self._pump_task, return_exceptions=True)
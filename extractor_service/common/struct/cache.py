@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from enum import Enum
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import extractor_service.common.globals as aes_globals
+
+# ключ метаданных запроса с режимом использования кэшей
+CACHE_MODE_KEY = "cache_mode"
+
+
+class CacheMode(str, Enum):
+    USE = "use"          # читать и пополнять кэш
+    BYPASS = "bypass"    # не обращаться к кэшу
+    REFRESH = "refresh"  # не читать, но перезаписать результат
+
+    @classmethod
+    def from_meta(cls, meta: Optional[Dict[str, Any]]) -> 'CacheMode':
+        if not meta:
+            return cls.USE
+        return cls(meta.get(CACHE_MODE_KEY, cls.USE))
+
+
+def make_cache_key(*parts: Union[str, bytes]) -> str:
+    """ Ключ кэша по содержимому: sha256 от частей ключа """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class MemoryLRUCache:
+    """ LRU-кэш в памяти процесса, ограниченный суммарным размером значений """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self._max_bytes:
+            return
+
+        old_value = self._items.pop(key, None)
+        if old_value is not None:
+            self._size -= len(old_value)
+
+        self._items[key] = value
+        self._size += len(value)
+        while self._size > self._max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        value = self._items.pop(key, None)
+        if value is not None:
+            self._size -= len(value)
+
+    def clear(self):
+        self._items.clear()
+        self._size = 0
+
+
+class TTLCache:
+    """ Кэш в памяти с ограниченным временем жизни записей и суммарным размером значений """
+
+    def __init__(self, ttl_sec: float, max_bytes: int, size_func: Callable[[Any], int] = len):
+        self._ttl_sec = ttl_sec
+        self._max_bytes = max_bytes
+        self._size_func = size_func
+        # ключ -> (время истечения, значение, размер)
+        self._items: OrderedDict[Any, tuple] = OrderedDict()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _pop(self, key: Any):
+        _, _, size = self._items.pop(key)
+        self._size -= size
+
+    def get(self, key: Any) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        return value
+
+    def put(self, key: Any, value: Any):
+        size = self._size_func(value)
+        if size > self._max_bytes:
+            return
+
+        if key in self._items:
+            self._pop(key)
+
+        now = time.monotonic()
+        self._items[key] = (now + self._ttl_sec, value, size)
+        self._size += size
+
+        # записи добавляются в порядке истечения, поэтому вытесняются с начала
+        while self._items and (self._size > self._max_bytes or next(iter(self._items.values()))[0] < now):
+            self._pop(next(iter(self._items)))
+
+    def clear(self):
+        self._items.clear()
+        self._size = 0
+
+
+class SqliteCache:
+    """ Кэш в файле sqlite, общий для реплик на одном узле
+
+    Вытесняются давно не читавшиеся записи, когда суммарный размер превышает max_bytes.
+    Суммарный размер хранится в таблице cache_meta и меняется в одной транзакции с записями
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = Lock()
+        self.evictions = 0
+
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                           "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_meta ("
+                           "id INTEGER PRIMARY KEY CHECK (id = 0), total_size INTEGER NOT NULL)")
+        # файл, созданный без cache_meta: размер считается один раз
+        self._conn.execute("INSERT OR IGNORE INTO cache_meta (id, total_size) "
+                           "SELECT 0, COALESCE(SUM(size), 0) FROM cache")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self._max_bytes:
+            return
+
+        with self._lock:
+            # IMMEDIATE: размер читается и меняется без вмешательства других реплик
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old_size = self._size_of(key)
+                self._conn.execute("INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                                   (key, value, len(value), time.time()))
+                self._add_size(len(value) - old_size)
+                self._evict()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _size_of(self, key: str) -> int:
+        row = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def _add_size(self, delta: int):
+        if delta:
+            self._conn.execute("UPDATE cache_meta SET total_size = total_size + ? WHERE id = 0", (delta,))
+
+    @property
+    def total_size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT total_size FROM cache_meta WHERE id = 0").fetchone()[0]
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT total_size FROM cache_meta WHERE id = 0").fetchone()[0]
+        evicted_size = 0
+        while total_size - evicted_size > self._max_bytes:
+            row = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (row[0],))
+            evicted_size += row[1]
+            self.evictions += 1
+        self._add_size(-evicted_size)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._add_size(-self._size_of(key))
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResultCache:
+    """ Двухуровневый кэш результатов: LRU в памяти и (опционально) sqlite на диске
+
+    Метрики (в aes_globals.metrics с префиксом name):
+    hits, misses, memory_hits, disk_hits, evictions, hit_ratio, memory_bytes
+    """
+
+    def __init__(self,
+                 name: str,
+                 memory_max_bytes: int,
+                 disk_path: Optional[str] = None,
+                 disk_max_bytes: int = 0):
+        """
+        :param name: название кэша (префикс метрик)
+        :param memory_max_bytes: максимальный суммарный размер значений в памяти
+        :param disk_path: путь к файлу дискового уровня (None - без дискового уровня)
+        :param disk_max_bytes: максимальный суммарный размер значений на диске
+        """
+        self._memory = MemoryLRUCache(memory_max_bytes)
+        self._disk = SqliteCache(disk_path, disk_max_bytes) if disk_path else None
+
+        metrics = aes_globals.metrics
+        self._hits = metrics.counter(f"{name}.hits")
+        self._misses = metrics.counter(f"{name}.misses")
+        self._memory_hits = metrics.counter(f"{name}.memory_hits")
+        self._disk_hits = metrics.counter(f"{name}.disk_hits")
+        self._evictions = metrics.gauge(f"{name}.evictions")
+        self._hit_ratio = metrics.gauge(f"{name}.hit_ratio")
+        self._memory_bytes = metrics.gauge(f"{name}.memory_bytes")
+
+    def _update_ratio(self):
+        total = self._hits.value + self._misses.value
+        self._hit_ratio.set(self._hits.value / total if total else 0)
+
+    def _update_size(self):
+        evictions = self._memory.evictions
+        if self._disk is not None:
+            evictions += self._disk.evictions
+        self._evictions.set(evictions)
+        self._memory_bytes.set(self._memory.size)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory_hits.inc()
+        elif self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self._disk_hits.inc()
+                self._memory.put(key, value)
+                self._update_size()
+
+        if value is None:
+            self._misses.inc()
+        else:
+            self._hits.inc()
+        self._update_ratio()
+        return value
+
+    async def put(self, key: str, value: bytes):
+        self._memory.put(key, value)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.put, key, value)
+        self._update_size()
+
+    async def delete(self, key: str):
+        self._memory.delete(key)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.delete, key)
+        self._update_size()
+
+    def close(self):
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.close()
+
+
+class StepCache:
+    """ Мемоизация результатов шага пайплайна
+
+    Результат шага (список элементов) сохраняется в backend под ключом,
+    который key_func строит по аргументам обработчика шага
+    """
+
+    def __init__(self,
+                 key_func: Callable[..., Optional[str]],
+                 backend: ResultCache,
+                 key_arg: Optional[str] = None):
+        """
+        :param key_func: ключ по аргументам обработчика (None - результат не кэшируется)
+        :param backend: хранилище результатов
+        :param key_arg: аргумент обработчика с ключом элемента: при попадании в кэш
+                        key_ сохраненных элементов заменяется его значением
+                        (один результат используется для разных элементов с одинаковым содержимым)
+        """
+        self._key_func = key_func
+        self._backend = backend
+        self._key_arg = key_arg
+
+    def key(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        return self._key_func(**kwargs)
+
+    async def load(self, key: str, kwargs: Dict[str, Any]) -> Optional[List[Any]]:
+        value = await self._backend.get(key)
+        if value is None:
+            return None
+
+        items = pickle.loads(value)
+        if self._key_arg is not None and self._key_arg in kwargs:
+            for item in items:
+                item.key_ = kwargs[self._key_arg]
+        return items
+
+    async def store(self, key: str, items: List[Any]):
+        await self._backend.put(key, pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL))
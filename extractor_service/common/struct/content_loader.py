@@ -1,21 +1,36 @@
 import asyncio
+from functools import partial
 from abc import abstractmethod, ABC
 from asyncio import QueueEmpty, Task
 from io import BytesIO
 from itertools import chain
-from typing import AsyncGenerator, List, Optional, Generator, Dict
+from typing import AsyncGenerator, List, Optional, Generator, Dict, Iterator
 
 import extractor_service.common.globals as aes_globals
-from extractor_service.common.env.general import CONTENTS_FETCH_THREADS, CONTENTS_BATCH_SIZE
+from extractor_service.common.env.general import CONTENTS_FETCH_THREADS, CONTENTS_BATCH_SIZE, CONTENTS_QUEUE_SIZE, \
+    S3_OBJECT_CACHE_TTL_SEC, S3_OBJECT_CACHE_MAX_BYTES, S3_RETRY_TRIES, S3_RETRY_BASE_DELAY_SEC, \
+    S3_RETRY_MAX_DELAY_SEC, S3_RETRY_BUDGET_TOKENS, S3_RETRY_BUDGET_RATIO, S3_CIRCUIT_FAILURE_THRESHOLD, \
+    S3_CIRCUIT_RESET_SEC
 from extractor_service.common.func.misc import S3ContentType
-from extractor_service.common.struct.data_storage.s3 import S3Storage
+from extractor_service.common.struct.cache import TTLCache
+from extractor_service.common.struct.data_storage.compression import COMPRESSION_NONE, compress, encoding_header
+from extractor_service.common.struct.data_storage.stream import TextChunks, text_size
+from extractor_service.common.struct.data_storage.base import DataStorage
+from extractor_service.common.struct.data_storage.factory import create_data_storage
 from extractor_service.common.struct.model.abbreviation_extractor import CreatedS3Object
-from extractor_service.common.struct.model.common import LoadedContainer, BaseData, S3ContainerInfo, ContentList
+from extractor_service.common.struct.model.common import LoadedContainer, BaseData, S3ContainerInfo, ContentList, \
+    Content
+from extractor_service.common.struct.retry_policy import CircuitBreaker, RetryPolicy, is_transient
+from extractor_service.common.struct.single_flight import SingleFlight
+from utils.aes_utils.exceptions import CircuitOpenException
 from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
 from utils.aes_utils.models.base_message import Status
 from utils.common import grouper
 from utils.status import StatusCodes
 
+# признак завершения всех задач загрузки
+_DONE = object()
+
 
 class ContentsLoader(ABC):
     @abstractmethod
@@ -35,16 +50,31 @@ class ContentsLoader(ABC):
         await asyncio.gather(*tasks)
         return [await queue.get() for _ in range(queue.qsize())]
 
+    @staticmethod
+    async def _mark_done(tasks: List[Task], queue: asyncio.Queue):
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await queue.put(_DONE)
+
     async def gen_as_ready(self, tasks: List[Task], queue: asyncio.Queue) -> AsyncGenerator:
-        while tasks:
-            for item in self._queue_ready_items_gen(queue):
+        """ Выдавать результаты задач по мере их появления в очереди
+
+        Если очередь ограничена, задачи ждут, пока потребитель заберет результаты
+        """
+        done_task = asyncio.create_task(self._mark_done(tasks, queue))
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
                 yield item
 
-            _, tasks = await asyncio.wait(tasks, timeout=0.5)
-
-        # оставшиеся результаты
-        for item in self._queue_ready_items_gen(queue):
-            yield item
+            # пробрасываем исключения задач
+            await done_task
+        finally:
+            for task in chain(tasks, [done_task]):
+                task.cancel()
 
     @staticmethod
     async def _put_with_status(queue: asyncio.Queue,
@@ -67,26 +97,52 @@ class ContentsLoader(ABC):
 
 
 class S3ContentsLoader(ContentsLoader):
-    def __init__(self):
+    def __init__(self, storage: Optional[DataStorage] = None):
         self._logger = aes_globals.service_logger.getChild("content_loader.s3")
 
-        self._s3_client = S3Storage()
+        self._storage = storage if storage is not None else create_data_storage()
 
         self._semaphore = asyncio.Semaphore(CONTENTS_FETCH_THREADS)
         self._access_lock = asyncio.Lock()
 
+        # одновременные загрузки одного объекта (в том числе из разных запросов) объединяются
+        self._object_fetches = SingleFlight()
+        self._object_cache: Optional[TTLCache] = None
+        if S3_OBJECT_CACHE_TTL_SEC > 0:
+            self._object_cache = TTLCache(ttl_sec=S3_OBJECT_CACHE_TTL_SEC,
+                                          max_bytes=S3_OBJECT_CACHE_MAX_BYTES,
+                                          size_func=text_size)
+
+        # общая для чтения и записи политика: при недоступности хранилища
+        # обращения отклоняются сразу, а не ждут таймаутов и повторов
+        self._retry_policy = RetryPolicy(tries=S3_RETRY_TRIES,
+                                         base_delay=S3_RETRY_BASE_DELAY_SEC,
+                                         max_delay=S3_RETRY_MAX_DELAY_SEC,
+                                         budget_tokens=S3_RETRY_BUDGET_TOKENS,
+                                         budget_ratio=S3_RETRY_BUDGET_RATIO,
+                                         name="content_loader.s3",
+                                         circuit=CircuitBreaker(failure_threshold=S3_CIRCUIT_FAILURE_THRESHOLD,
+                                                                reset_timeout_sec=S3_CIRCUIT_RESET_SEC,
+                                                                name="content_loader.s3"))
+
+        metrics = aes_globals.metrics
+        self._fetches = metrics.counter("content_loader.s3.fetches")
+        self._fetches_coalesced = metrics.counter("content_loader.s3.fetches_coalesced")
+        self._fetches_cached = metrics.counter("content_loader.s3.fetches_cached")
+        self._fetches_saved = metrics.counter("content_loader.s3.fetches_saved")
+
     async def close(self):
-        """Закрываем соединение с S3."""
-        if not self._s3_client:
+        """Закрываем соединение с хранилищем."""
+        if not self._storage:
             return
-        await self._s3_client.close()
+        await self._storage.close()
 
-    async def _update_s3_client(self):
-        await self._s3_client.reinit()
+    async def _update_storage(self):
+        await self._storage.reinit()
 
     def _assemble_content(self,
                           container_info: S3ContainerInfo,
-                          contents: Dict[S3ObjectId, Optional[str]]) -> Optional[ContentList]:
+                          contents: Dict[S3ObjectId, Optional[Content]]) -> Optional[ContentList]:
         if not contents:
             return None
 
@@ -110,8 +166,48 @@ class S3ContentsLoader(ContentsLoader):
                                               content_type: S3ContentType,
                                               merge_contents: bool):
 
+        # результаты передаются в общую очередь уже после освобождения семафора,
+        # чтобы медленный потребитель одного запроса не задерживал загрузки других
+        batch_queue = asyncio.Queue()
         async with self._semaphore:
-            await self.fetch_and_parse(container_batch, queue, content_type, merge_contents)
+            await self.fetch_and_parse(container_batch, batch_queue, content_type, merge_contents)
+
+        for item in self._queue_ready_items_gen(batch_queue):
+            await queue.put(item)
+
+    async def _download_object(self, s3_object: S3ObjectId) -> Optional[TextChunks]:
+        self._fetches.inc()
+        # текст остается частями до склейки в merge_contents, чтобы не держать лишних полных копий
+        content = await self._storage.get_s3_object_chunks(bucket_name=s3_object.bucket_name,
+                                                             object_key=s3_object.s3_key)
+        if self._object_cache is not None and content is not None:
+            self._object_cache.put((s3_object.bucket_name, s3_object.s3_key), content)
+        return content
+
+    async def fetch_object(self, s3_object: S3ObjectId) -> Optional[TextChunks]:
+        """ Загрузить объект S3 (из кэша или общей с другими запросами загрузки) """
+        object_key = (s3_object.bucket_name, s3_object.s3_key)
+        if self._object_cache is not None:
+            content = self._object_cache.get(object_key)
+            if content is not None:
+                self._fetches_cached.inc()
+                self._fetches_saved.inc()
+                return content
+
+        content, shared = await self._object_fetches.do(object_key, partial(self._download_object, s3_object))
+        if shared:
+            self._fetches_coalesced.inc()
+            self._fetches_saved.inc()
+        return content
+
+    async def fetch_objects(self, s3_objects: List[S3ObjectId]) -> Dict[S3ObjectId, Optional[TextChunks]]:
+        # объекты пачки загружаются параллельно, число одновременных запросов ограничивает клиент S3
+        contents = await asyncio.gather(*(self.fetch_object(s3_object) for s3_object in s3_objects),
+                                        return_exceptions=True)
+        for content in contents:
+            if isinstance(content, BaseException):
+                raise content
+        return dict(zip(s3_objects, contents))
 
     @staticmethod
     def _to_flat_object_list(data: List[S3ContainerInfo]) -> List[S3ObjectId]:
@@ -126,16 +222,17 @@ class S3ContentsLoader(ContentsLoader):
                               merge_contents: bool):
         s3_objects = self._to_flat_object_list(container_batch)
 
-        retry_limit = 3
         contents = None
-        while retry_limit:
-            try:
-                contents = await self._s3_client.get_s3_objects(objects=s3_objects)
-                break
-            except Exception as ex:
-                self._logger.warning(f"Failed to get S3 objects: {ex}, retry...")
-                await asyncio.sleep(1)
-                retry_limit -= 1
+        fetch_status = None
+        try:
+            contents = await self._retry_policy.call(partial(self.fetch_objects, s3_objects))
+        except Exception as ex:
+            self._logger.warning("Failed to get S3 objects: %s", ex)
+            # повторная загрузка не исправит сам контент (например, слишком большой объект),
+            # а при сбое хранилища контейнер можно отправить повторно
+            if is_transient(ex) or isinstance(ex, CircuitOpenException):
+                fetch_status = Status.make_status(status=StatusCodes.CONNECTION_ERROR,
+                                                  message=f"Can't get contents from S3: {ex}")
 
         for container in container_batch:
             container_contents = self._assemble_content(container_info=container,
@@ -144,8 +241,8 @@ class S3ContentsLoader(ContentsLoader):
                 message = f"Contents for s3_object '{container.container_id}' wasn't found in S3"
                 self._logger.debug(message)
 
-                status = Status.make_status(status=StatusCodes.CONTENT_NOT_FOUND,
-                                            message=message)
+                status = fetch_status or Status.make_status(status=StatusCodes.CONTENT_NOT_FOUND,
+                                                            message=message)
                 await self._put_with_status(queue=queue, data=container, status=status)
                 continue
 
@@ -173,21 +270,35 @@ class S3ContentsLoader(ContentsLoader):
 
         return await self.wait_and_collect(tasks, result_queue)
 
+    async def _fetch_worker(self,
+                            batches: Iterator[List[S3ContainerInfo]],
+                            queue: asyncio.Queue,
+                            content_type: S3ContentType,
+                            merge_contents: bool):
+        # пачки разбираются общим итератором, поэтому число задач не зависит от размера запроса
+        for batch in batches:
+            await self._fetch_and_parse_with_semaphore(container_batch=batch,
+                                                       queue=queue,
+                                                       content_type=content_type,
+                                                       merge_contents=merge_contents)
+
     async def get_contents_gen(self,
                                data: List[S3ContainerInfo],
                                content_type: S3ContentType = S3ContentType.TEXT,
                                merge_contents: bool = False) -> AsyncGenerator[LoadedContainer, None]:
         aes_globals.service_logger.debug("Request S3 contents sequentially ...")
 
-        result_queue = asyncio.Queue()
+        # ограниченная очередь: пока следующие шаги не заберут загруженное, новые объекты не скачиваются
+        result_queue = asyncio.Queue(maxsize=CONTENTS_QUEUE_SIZE)
+        batches = iter(grouper(data, CONTENTS_BATCH_SIZE))
         tasks = [
             asyncio.create_task(
-                self._fetch_and_parse_with_semaphore(container_batch=batch,
-                                                     queue=result_queue,
-                                                     content_type=content_type,
-                                                     merge_contents=merge_contents)
+                self._fetch_worker(batches=batches,
+                                   queue=result_queue,
+                                   content_type=content_type,
+                                   merge_contents=merge_contents)
             )
-            for batch in grouper(data, CONTENTS_BATCH_SIZE)
+            for _ in range(CONTENTS_FETCH_THREADS)
         ]
 
         async for item in self.gen_as_ready(tasks, result_queue):
@@ -198,22 +309,32 @@ class S3ContentsLoader(ContentsLoader):
                           file_data: BytesIO,
                           bucket_name: str,
                           data_length: int,
-                          file_type: S3ContentType) -> CreatedS3Object:
+                          file_type: S3ContentType,
+                          content_encoding: Optional[str] = None,
+                          compression: str = COMPRESSION_NONE) -> CreatedS3Object:
+        """
+        :param content_encoding: Content-Encoding уже сжатых данных
+        :param compression: сжать данные перед выгрузкой ('none', 'gzip', 'zstd')
+        """
         aes_globals.service_logger.debug("Create S3 contents sequentially ...")
 
-        retry_limit = 3
-        while retry_limit:
-            try:
-                object_id = await self._s3_client.put_s3_object(data=file_data,
-                                                                object_id=content_id,
-                                                                bucket_name=bucket_name,
-                                                                data_length=data_length,
-                                                                file_type=file_type)
-                return CreatedS3Object.construct(key_=content_id, bucket_name=bucket_name, s3_key=object_id)
-            except Exception as ex:
-                self._logger.warning(f"Failed to put S3 object: {ex}, retry...")
-                await asyncio.sleep(1)
-                retry_limit -= 1
-        status = Status.make_status(status=StatusCodes.CONNECTION_ERROR,
-                                    message="Can't push content to S3")
-        return CreatedS3Object.construct(key_=content_id, status=status)
+        if compression != COMPRESSION_NONE:
+            content_encoding = encoding_header(compression)
+            compressed = await asyncio.to_thread(compress, file_data.getvalue(), compression)
+            file_data, data_length = BytesIO(compressed), len(compressed)
+
+        put_object = partial(self._storage.put_s3_object,
+                             data=file_data,
+                             object_id=content_id,
+                             bucket_name=bucket_name,
+                             data_length=data_length,
+                             file_type=file_type,
+                             content_encoding=content_encoding)
+        try:
+            object_id = await self._retry_policy.call(put_object)
+        except Exception as ex:
+            self._logger.warning("Failed to put S3 object: %s", ex)
+            status = Status.make_status(status=StatusCodes.CONNECTION_ERROR,
+                                        message=f"Can't push content to S3: {ex}")
+            return CreatedS3Object.construct(key_=content_id, status=status)
+        return CreatedS3Object.construct(key_=content_id, bucket_name=bucket_name, s3_key=object_id)
@@ -0,0 +1,69 @@
+import asyncio
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Dict, List, Optional, Union
+
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.data_storage.stream import TextChunks
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+
+
+class DataStorage(ABC):
+    """ Хранилище объектов, адресуемых парой (bucket_name, object_key) как S3ObjectId
+
+    Ошибки чтения и записи передаются как S3Exception: статусы с кодом от CONTENT_NOT_FOUND
+    означают проблему самого объекта, и повторять запрос не имеет смысла
+    """
+
+    async def init(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def reinit(self):
+        pass
+
+    @abstractmethod
+    async def get_s3_object_chunks(self,
+                                   bucket_name: str,
+                                   object_key: str,
+                                   encoding: str = "utf-8") -> TextChunks:
+        """ Текст объекта частями (без сборки в одну строку) """
+        raise NotImplementedError
+
+    async def get_s3_object(self,
+                            bucket_name: str,
+                            object_key: str,
+                            encoding: str = "utf-8") -> Optional[Union[bytes, str, dict]]:
+        return "".join(await self.get_s3_object_chunks(bucket_name, object_key, encoding))
+
+    async def get_s3_objects(self,
+                             objects: List[S3ObjectId],
+                             encoding: str = "utf-8") -> Dict[S3ObjectId, Optional[Union[bytes, str, dict]]]:
+        # объекты читаются параллельно, число одновременных чтений ограничивает реализация
+        contents = await asyncio.gather(*(
+            self.get_s3_object(bucket_name=s3_object.bucket_name,
+                               object_key=s3_object.s3_key,
+                               encoding=encoding)
+            for s3_object in objects
+        ), return_exceptions=True)
+
+        for content in contents:
+            if isinstance(content, BaseException):
+                raise content
+        return dict(zip(objects, contents))
+
+    @abstractmethod
+    async def put_s3_object(self,
+                            bucket_name: str,
+                            object_id: str,
+                            data: BytesIO,
+                            data_length: int,
+                            file_type: S3ContentType,
+                            content_encoding: Optional[str] = None) -> Optional[str]:
+        """ Записать объект
+
+        :return: ключ записанного объекта
+        """
+        raise NotImplementedError
@@ -0,0 +1,348 @@
+import codecs
+import gzip
+import zlib
+from typing import Callable, Dict, Optional
+
+import zstandard
+
+from extractor_service.common.struct.data_storage.stream import TextChunks, too_large_error
+from utils.aes_utils.exceptions import S3Exception
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+ENCODING_GZIP = "gzip"
+ENCODING_ZSTD = "zstd"
+
+# значения Content-Encoding -> алгоритм сжатия
+_CONTENT_ENCODINGS = {
+    "gzip": ENCODING_GZIP,
+    "x-gzip": ENCODING_GZIP,
+    "zstd": ENCODING_ZSTD,
+}
+
+_MAGIC_BYTES = {
+    b"\x1f\x8b": ENCODING_GZIP,
+    b"\x28\xb5\x2f\xfd": ENCODING_ZSTD,
+}
+MAGIC_SIZE = max(len(magic) for magic in _MAGIC_BYTES)
+
+# сжатие результатов: алгоритм (он же значение Content-Encoding) -> функция сжатия
+COMPRESSION_NONE = "none"
+_COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    ENCODING_GZIP: lambda data: gzip.compress(data, compresslevel=6),
+    ENCODING_ZSTD: lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+}
+COMPRESSIONS = frozenset((COMPRESSION_NONE, *_COMPRESSORS))
+
+# размер распакованной части, которую декодер выдает за один шаг
+_WRITE_SIZE = 256 * 1024
+
+
+def _broken_content(message: str) -> S3Exception:
+    return S3Exception(status=Status.make_status(status=StatusCodes.BROKEN_CONTENT_ERROR, message=message))
+
+
+def detect_encoding(content_encoding: Optional[str], head: bytes) -> Optional[str]:
+    """ Алгоритм сжатия объекта по заголовку Content-Encoding или первым байтам содержимого
+
+    :return: ENCODING_GZIP, ENCODING_ZSTD или None (данные не сжаты)
+    """
+    if content_encoding:
+        encoding = _CONTENT_ENCODINGS.get(content_encoding.strip().lower())
+        if encoding is not None:
+            return encoding
+
+    for magic, encoding in _MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return encoding
+    return None
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    """ Сжать данные (compression - ENCODING_GZIP или ENCODING_ZSTD) """
+    try:
+        return _COMPRESSORS[compression](data)
+    except KeyError:
+        raise ValueError(f"Unsupported compression: '{compression}'") from None
+
+
+def encoding_header(compression: str) -> Optional[str]:
+    """ Значение Content-Encoding для сжатия из настроек (None - без сжатия) """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: '{compression}'")
+    return None if compression == COMPRESSION_NONE else compression
+
+
+class _BoundedBuffer:
+    """ Приемник распакованных данных: не больше max_size байт за все время """
+
+    def __init__(self, max_size: Optional[int]):
+        self.data = bytearray()
+        self.total = 0
+        self._max_size = max_size
+
+    def write(self, data: bytes) -> int:
+        self.total += len(data)
+        if self._max_size is not None and self.total > self._max_size:
+            raise too_large_error(self.total, self._max_size)
+        self.data += data
+        return len(data)
+
+
+class _GzipDecompressor:
+    def __init__(self, sink: _BoundedBuffer):
+        self._sink = sink
+        self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+    def write(self, data: bytes):
+        while data:
+            # выход ограничен на каждом шаге, поэтому "zip-бомба" не распаковывается целиком
+            self._sink.write(self._decompressor.decompress(data, _WRITE_SIZE))
+            data = self._decompressor.unconsumed_tail
+            if self._decompressor.eof and not data:
+                # несколько gzip-членов подряд (например, после дописывания)
+                data = self._decompressor.unused_data
+                if data:
+                    self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+    def close(self):
+        if not self._decompressor.eof:
+            raise _broken_content("Truncated gzip stream")
+
+
+class _ZstdFrames:
+    """ Разбор границ кадров zstd во входных данных
+
+    Распаковщик-писатель не сообщает о конце кадра, поэтому заголовки кадров и блоков читаются отдельно,
+    а содержимое блоков пропускается без распаковки
+    """
+
+    _MAGIC, _SKIPPABLE_SIZE, _FRAME_HEADER, _FRAME_HEADER_REST, _BLOCK_HEADER, _CHECKSUM = range(6)
+
+    def __init__(self):
+        self._state = self._MAGIC
+        self._need = 4
+        self._head = b""
+        self._skip = 0
+        self._checksum = False
+        self._started = False
+
+    @property
+    def complete(self) -> bool:
+        """ Прочитан хотя бы один кадр, и последний кадр закончен """
+        return self._started and self._state == self._MAGIC and not self._head and not self._skip
+
+    def feed(self, data: bytes):
+        pos = 0
+        while pos < len(data):
+            if self._skip:
+                skipped = min(self._skip, len(data) - pos)
+                self._skip -= skipped
+                pos += skipped
+                continue
+
+            taken = data[pos:pos + self._need - len(self._head)]
+            self._head += taken
+            pos += len(taken)
+            if len(self._head) == self._need:
+                head, self._head = self._head, b""
+                self._parse(head)
+
+    def _expect(self, state: int, need: int, skip: int = 0):
+        self._state, self._need, self._skip = state, need, skip
+
+    def _parse(self, head: bytes):
+        self._started = True
+        if self._state == self._MAGIC:
+            magic = int.from_bytes(head, "little")
+            if magic == 0xFD2FB528:
+                self._expect(self._FRAME_HEADER, 1)
+            elif magic & 0xFFFFFFF0 == 0x184D2A50:
+                self._expect(self._SKIPPABLE_SIZE, 4)
+            else:
+                raise zstandard.ZstdError("Unknown frame magic")
+
+        elif self._state == self._SKIPPABLE_SIZE:
+            self._expect(self._MAGIC, 4, skip=int.from_bytes(head, "little"))
+
+        elif self._state == self._FRAME_HEADER:
+            descriptor = head[0]
+            single_segment = bool(descriptor & 0x20)
+            self._checksum = bool(descriptor & 0x04)
+            rest = (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 0x03] \
+                + (1 if single_segment else 0, 2, 4, 8)[descriptor >> 6]
+            if rest:
+                self._expect(self._FRAME_HEADER_REST, rest)
+            else:
+                self._expect(self._BLOCK_HEADER, 3)
+
+        elif self._state == self._FRAME_HEADER_REST:
+            self._expect(self._BLOCK_HEADER, 3)
+
+        elif self._state == self._BLOCK_HEADER:
+            header = int.from_bytes(head, "little")
+            # RLE-блок (тип 1) содержит один байт
+            size = 1 if (header >> 1) & 0x03 == 1 else header >> 3
+            if not header & 0x01:
+                self._expect(self._BLOCK_HEADER, 3, skip=size)
+            elif self._checksum:
+                self._expect(self._CHECKSUM, 4, skip=size)
+            else:
+                self._expect(self._MAGIC, 4, skip=size)
+
+        else:
+            self._expect(self._MAGIC, 4)
+
+
+class _ZstdDecompressor:
+    def __init__(self, sink: _BoundedBuffer):
+        # приемник получает распакованные данные частями по _WRITE_SIZE
+        self._writer = zstandard.ZstdDecompressor().stream_writer(sink, write_size=_WRITE_SIZE, closefd=False)
+        self._frames = _ZstdFrames()
+
+    def write(self, data: bytes):
+        self._writer.write(data)
+        self._frames.feed(data)
+
+    def close(self):
+        self._writer.flush()
+        if not self._frames.complete:
+            raise _broken_content("Truncated zstd stream")
+
+
+_DECOMPRESSORS = {
+    ENCODING_GZIP: _GzipDecompressor,
+    ENCODING_ZSTD: _ZstdDecompressor,
+}
+
+
+class DecompressingStream:
+    """ Поток, распаковывающий сжатое содержимое по мере чтения
+
+    Алгоритм определяется по Content-Encoding или первым байтам, несжатые данные
+    передаются без изменений. Распакованные данные ограничены max_size
+    """
+
+    def __init__(self,
+                 stream,
+                 content_encoding: Optional[str] = None,
+                 max_size: Optional[int] = None,
+                 read_size: int = 1024 * 1024):
+        """
+        :param stream: поток с асинхронным методом read(amt)
+        :param content_encoding: значение заголовка Content-Encoding
+        :param max_size: максимальный размер распакованных данных, байт (None - без ограничения)
+        :param read_size: размер читаемой из потока части, байт
+        """
+        self._stream = stream
+        self._content_encoding = content_encoding
+        self._max_size = max_size
+        self._read_size = read_size
+
+        self._started = False
+        self._head = b""
+        self._buffer: Optional[_BoundedBuffer] = None
+        self._decompressor = None
+        self._eof = False
+
+    async def _start(self):
+        self._started = True
+        # для определения сжатия нужно несколько первых байт
+        head = b""
+        while len(head) < MAGIC_SIZE:
+            chunk = await self._stream.read(self._read_size)
+            if not chunk:
+                self._eof = True
+                break
+            head += chunk
+        self._head = head
+
+        encoding = detect_encoding(self._content_encoding, head)
+        if encoding is None:
+            return
+
+        self._buffer = _BoundedBuffer(self._max_size)
+        self._decompressor = _DECOMPRESSORS[encoding](self._buffer)
+        self._feed(head)
+        self._head = b""
+        if self._eof:
+            self._decompressor.close()
+
+    def _feed(self, data: bytes):
+        try:
+            self._decompressor.write(data)
+        except (zlib.error, zstandard.ZstdError) as ex:
+            raise _broken_content(f"Can't decompress object: {ex}")
+
+    async def read(self, amt: int = -1) -> bytes:
+        if not self._started:
+            await self._start()
+
+        if self._decompressor is None:
+            if self._head:
+                head, self._head = self._head, b""
+                return head
+            if self._eof:
+                return b""
+            return await self._stream.read(amt)
+
+        buffer = self._buffer.data
+        while not self._eof and (amt < 0 or len(buffer) < amt):
+            chunk = await self._stream.read(self._read_size)
+            if not chunk:
+                self._eof = True
+                self._decompressor.close()
+                break
+            self._feed(chunk)
+
+        if amt < 0 or len(buffer) <= amt:
+            data = bytes(buffer)
+            buffer.clear()
+            return data
+
+        data = bytes(buffer[:amt])
+        del buffer[:amt]
+        return data
+
+
+def read_compressed_text(path: str,
+                         encoding: str = "utf-8",
+                         chunk_size: int = 1024 * 1024,
+                         max_size: Optional[int] = None) -> Optional[TextChunks]:
+    """ Прочитать сжатый файл и декодировать частями
+
+    :return: части текста или None, если файл не сжат
+    """
+    with open(path, "rb") as file:
+        compression = detect_encoding(None, file.read(MAGIC_SIZE))
+        if compression is None:
+            return None
+        file.seek(0)
+
+        buffer = _BoundedBuffer(max_size)
+        decompressor = _DECOMPRESSORS[compression](buffer)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        chunks = []
+        try:
+            while True:
+                data = file.read(chunk_size)
+                if not data:
+                    decompressor.close()
+                else:
+                    decompressor.write(data)
+
+                if buffer.data:
+                    text = decoder.decode(buffer.data)
+                    buffer.data.clear()
+                    if text:
+                        chunks.append(text)
+
+                if not data:
+                    break
+        except (zlib.error, zstandard.ZstdError) as ex:
+            raise _broken_content(f"Can't decompress object: {ex}")
+
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            chunks.append(tail)
+        return chunks
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+from threading import Lock
+from typing import Optional, Tuple
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.data_storage.stream import TextChunks, read_mapped_text
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class DiskObjectCache:
+    """ Кэш тел объектов S3 на локальном диске
+
+    Тела хранятся по ETag (content-addressed): objects/<sha256(etag)>,
+    соответствие bucket/key -> ETag - в index/<sha256(bucket/key)>.
+    Перед использованием запись проверяется условным GET (If-None-Match),
+    при превышении max_bytes удаляются давно не читавшиеся тела (по mtime).
+    Каталог может использоваться несколькими процессами: файлы записываются
+    во временный файл и переименовываются атомарно
+    """
+
+    def __init__(self, directory: str, max_bytes: int, chunk_size: int = 1024 * 1024):
+        self._objects_dir = os.path.join(directory, "objects")
+        self._index_dir = os.path.join(directory, "index")
+        self._tmp_dir = os.path.join(directory, "tmp")
+        for path in (self._objects_dir, self._index_dir, self._tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+        self._max_bytes = max_bytes
+        self._chunk_size = chunk_size
+        self._lock = Lock()
+        self._size = self._scan_size()
+
+        metrics = aes_globals.metrics
+        self._evictions = metrics.counter("s3.disk_cache.evictions")
+        self._size_gauge = metrics.gauge("s3.disk_cache.bytes")
+        self._size_gauge.set(self._size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self._objects_dir) if entry.is_file())
+
+    def _object_path(self, etag: str) -> str:
+        return os.path.join(self._objects_dir, _digest(etag))
+
+    def _index_path(self, bucket_name: str, object_key: str) -> str:
+        return os.path.join(self._index_dir, _digest(f"{bucket_name}\0{object_key}"))
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def lookup(self, bucket_name: str, object_key: str) -> Optional[str]:
+        """ ETag закэшированного тела объекта (None - тела нет в кэше) """
+        try:
+            with open(self._index_path(bucket_name, object_key), "r", encoding="utf-8") as index_file:
+                etag = index_file.read()
+        except FileNotFoundError:
+            return None
+
+        if not os.path.exists(self._object_path(etag)):
+            return None
+        return etag
+
+    def read_text(self, etag: str, encoding: str = "utf-8") -> Optional[TextChunks]:
+        """ Прочитать тело через mmap и декодировать частями """
+        path = self._object_path(etag)
+        try:
+            # недавно прочитанные тела вытесняются последними
+            os.utime(path)
+            return read_mapped_text(path, encoding=encoding, chunk_size=self._chunk_size)
+        except FileNotFoundError:
+            # тело могло быть вытеснено другим процессом
+            return None
+
+    def open_writer(self) -> Tuple[int, str]:
+        """ Временный файл для записи тела по мере загрузки """
+        return tempfile.mkstemp(dir=self._tmp_dir)
+
+    def commit(self, bucket_name: str, object_key: str, etag: str, tmp_path: str):
+        """ Сохранить загруженное тело и запись индекса """
+        object_path = self._object_path(etag)
+        size = os.path.getsize(tmp_path)
+        if size > self._max_bytes:
+            os.remove(tmp_path)
+            return
+
+        exists = os.path.exists(object_path)
+        os.replace(tmp_path, object_path)
+        self._write_atomic(self._index_path(bucket_name, object_key), etag.encode("utf-8"))
+
+        with self._lock:
+            if not exists:
+                self._size += size
+            if self._size > self._max_bytes:
+                self._evict()
+            self._size_gauge.set(self._size)
+
+    def discard(self, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def _evict(self):
+        # размер пересчитывается по каталогу, т.к. его могут пополнять другие процессы
+        entries = [entry for entry in os.scandir(self._objects_dir) if entry.is_file()]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self._size <= self._max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self._evictions.inc()
@@ -0,0 +1,26 @@
+from extractor_service.common.env.general import DATA_STORAGE_BACKEND, DATA_STORAGE_ROOT_DIR
+from extractor_service.common.struct.data_storage.base import DataStorage
+
+STORAGE_BACKEND_S3 = "s3"
+STORAGE_BACKEND_FILESYSTEM = "filesystem"
+
+
+def create_data_storage(backend: str = DATA_STORAGE_BACKEND,
+                        root_dir: str = DATA_STORAGE_ROOT_DIR) -> DataStorage:
+    """ Хранилище объектов по настройкам сервиса
+
+    :param backend: 's3' или 'filesystem'
+    :param root_dir: корневой каталог хранилища 'filesystem'
+    """
+    if backend == STORAGE_BACKEND_S3:
+        from extractor_service.common.struct.data_storage.s3 import S3Storage
+        return S3Storage()
+
+    if backend == STORAGE_BACKEND_FILESYSTEM:
+        if not root_dir:
+            raise ValueError("DATA_STORAGE_ROOT_DIR must be set for the filesystem storage backend")
+
+        from extractor_service.common.struct.data_storage.filesystem import FileSystemStorage
+        return FileSystemStorage(root_dir)
+
+    raise ValueError(f"Unsupported data storage backend: '{backend}'")
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import tempfile
+from io import BytesIO
+from typing import Optional
+
+from extractor_service.common.env.general import S3_READ_CHUNK_SIZE, S3_MAX_OBJECT_SIZE
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.data_storage.base import DataStorage
+from extractor_service.common.struct.data_storage.compression import read_compressed_text
+from extractor_service.common.struct.data_storage.stream import TextChunks, read_mapped_text
+from utils.aes_utils.exceptions import S3Exception
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+def _storage_error(status: StatusCodes, message: str) -> S3Exception:
+    return S3Exception(status=Status.make_status(status=status, message=message))
+
+
+class FileSystemStorage(DataStorage):
+    """ Хранилище объектов в локальном каталоге (NVMe, NFS)
+
+    Объект (bucket_name, object_key) - файл <root_dir>/<bucket_name>/<object_key>.
+    Несжатые файлы читаются через mmap, записываются во временный файл рядом и переименовываются атомарно,
+    поэтому читатель никогда не видит частично записанный объект
+    """
+
+    def __init__(self,
+                 root_dir: str,
+                 chunk_size: int = S3_READ_CHUNK_SIZE,
+                 max_object_size: int = S3_MAX_OBJECT_SIZE):
+        """
+        :param root_dir: корневой каталог (каталоги в нем - бакеты)
+        :param chunk_size: размер декодируемой части, байт
+        :param max_object_size: максимальный размер читаемого объекта, байт
+        """
+        self._root_dir = os.path.realpath(root_dir)
+        self._chunk_size = chunk_size
+        self._max_object_size = max_object_size
+
+    def _resolve(self, bucket_name: str, object_key: str) -> str:
+        # ключ не должен выводить за пределы бакета ('..', абсолютные пути);
+        # проверка лексическая, чтобы бакеты и объекты могли быть ссылками на другие тома
+        valid_bucket = bucket_name not in ("", ".", "..") and os.sep not in bucket_name
+        bucket_dir = os.path.join(self._root_dir, bucket_name)
+        path = os.path.normpath(os.path.join(bucket_dir, object_key))
+        if not valid_bucket or not path.startswith(bucket_dir + os.sep):
+            raise _storage_error(StatusCodes.CONTENT_NOT_FOUND,
+                                 f"Invalid object key '{bucket_name}:{object_key}'")
+        return path
+
+    def _read_text_chunks(self, bucket_name: str, object_key: str, encoding: str) -> TextChunks:
+        path = self._resolve(bucket_name, object_key)
+        try:
+            # сжатые (gzip, zstd) файлы распознаются по первым байтам
+            chunks = read_compressed_text(path,
+                                          encoding=encoding,
+                                          chunk_size=self._chunk_size,
+                                          max_size=self._max_object_size)
+            if chunks is not None:
+                return chunks
+            return read_mapped_text(path,
+                                    encoding=encoding,
+                                    chunk_size=self._chunk_size,
+                                    max_size=self._max_object_size)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise _storage_error(StatusCodes.CONTENT_NOT_FOUND,
+                                 f"Object '{bucket_name}:{object_key}' doesn't exist")
+        except OSError as ex:
+            raise _storage_error(StatusCodes.DB_ERROR, str(ex))
+
+    async def get_s3_object_chunks(self,
+                                   bucket_name: str,
+                                   object_key: str,
+                                   encoding: str = "utf-8") -> TextChunks:
+        return await asyncio.to_thread(self._read_text_chunks, bucket_name, object_key, encoding)
+
+    def _write_atomic(self, path: str, data: BytesIO):
+        dir_name = os.path.dirname(path)
+        os.makedirs(dir_name, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data.getbuffer())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def put_s3_object(self,
+                            bucket_name: str,
+                            object_id: str,
+                            data: BytesIO,
+                            data_length: int,
+                            file_type: S3ContentType,
+                            content_encoding: Optional[str] = None) -> Optional[str]:
+        # тип и кодировка содержимого в файловой системе не сохраняются
+        path = self._resolve(bucket_name, object_id)
+        try:
+            await asyncio.to_thread(self._write_atomic, path, data)
+        except OSError as ex:
+            raise _storage_error(StatusCodes.DB_ERROR, str(ex))
+        return object_id
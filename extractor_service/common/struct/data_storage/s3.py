@@ -1,17 +1,25 @@
-from asyncio import Condition, Lock
+import asyncio
+import os
+from asyncio import Condition, Lock, Semaphore
 from contextlib import asynccontextmanager, AsyncExitStack
 from functools import wraps
 from inspect import ismethod
 from io import BytesIO
-from typing import Optional, Union, List, Dict
+from typing import Optional, Union
 
 import aioboto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-from extractor_service.common.env.general import S3_ACCESS_KEY, S3_SECRET_KEY, S3_ENDPOINT_URL
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.env.general import S3_ACCESS_KEY, S3_SECRET_KEY, S3_ENDPOINT_URL, S3_MAX_POOL_CONNECTIONS, \
+    S3_READ_CHUNK_SIZE, S3_MAX_OBJECT_SIZE, S3_DISK_CACHE_DIR, S3_DISK_CACHE_MAX_BYTES
 from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.data_storage.base import DataStorage
+from extractor_service.common.struct.data_storage.compression import DecompressingStream
+from extractor_service.common.struct.data_storage.disk_cache import DiskObjectCache
+from extractor_service.common.struct.data_storage.stream import TextChunks, TeeStream, iter_decoded_chunks
 from utils.aes_utils.exceptions import S3Exception
-from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
 from utils.aes_utils.models.base_message import Status
 from utils.status import StatusCodes
 
@@ -21,12 +29,55 @@ def not_activity(func):
     return func
 
 
-class S3Storage:
-    def __init__(self):
+def _is_not_modified(error: ClientError) -> bool:
+    return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304
+
+
+# коды ошибок S3 об отсутствии объекта или бакета
+_NOT_FOUND_CODES = frozenset(("NoSuchKey", "NoSuchBucket", "NotFound", "404"))
+# ошибки запроса (4xx), которые повторить все же имеет смысл: таймаут запроса и ограничение частоты
+_RETRIABLE_HTTP_CODES = frozenset((408, 429))
+
+
+def _client_error(error: ClientError) -> S3Exception:
+    """ Ошибка клиента S3 как S3Exception
+
+    Отсутствующий объект - CONTENT_NOT_FOUND, прочие ошибки запроса (4xx) - WRONG_PARAMETER_VALUE:
+    повторять их бесполезно (см. is_transient). Остальные ошибки - DB_ERROR
+    """
+    error_info = error.response.get("Error", {})
+    error_message = error_info.get("Message", "Unknown error from S3")
+    http_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+
+    if error_info.get("Code") in _NOT_FOUND_CODES or http_code == 404:
+        status = StatusCodes.CONTENT_NOT_FOUND
+    elif http_code is not None and 400 <= http_code < 500 and http_code not in _RETRIABLE_HTTP_CODES:
+        status = StatusCodes.WRONG_PARAMETER_VALUE
+    else:
+        status = StatusCodes.DB_ERROR
+    return S3Exception(status=Status.make_status(status=status, message=error_message))
+
+
+class S3Storage(DataStorage):
+    def __init__(self,
+                 max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+                 disk_cache_dir: Optional[str] = S3_DISK_CACHE_DIR):
         self._exit_stack = AsyncExitStack()
         self._session = aioboto3.Session()
         self._client = None
 
+        # запросов к S3 одновременно не больше, чем соединений в пуле клиента
+        self._max_pool_connections = max_pool_connections
+        self._connection_slots = Semaphore(max_pool_connections)
+
+        self._disk_cache: Optional[DiskObjectCache] = None
+        if disk_cache_dir:
+            self._disk_cache = DiskObjectCache(disk_cache_dir,
+                                               max_bytes=S3_DISK_CACHE_MAX_BYTES,
+                                               chunk_size=S3_READ_CHUNK_SIZE)
+            self._disk_cache_hits = aes_globals.metrics.counter("s3.disk_cache.hits")
+            self._disk_cache_misses = aes_globals.metrics.counter("s3.disk_cache.misses")
+
         self._active_cond = Condition()
         self._active_req_count = 0
         self._update_lock = Lock()
@@ -43,7 +94,8 @@ class S3Storage:
                 service_name="s3",
                 endpoint_url=S3_ENDPOINT_URL,
                 aws_access_key_id=S3_ACCESS_KEY,
-                aws_secret_access_key=S3_SECRET_KEY
+                aws_secret_access_key=S3_SECRET_KEY,
+                config=Config(max_pool_connections=self._max_pool_connections)
             )
         )
 
@@ -124,31 +176,102 @@ class S3Storage:
     async def update_token(self, current_activities: int = 0):
         pass
 
-    async def get_s3_object(self,
-                            bucket_name: str,
-                            object_key: str,
-                            encoding: str = "utf-8") -> Optional[Union[bytes, str, dict]]:
+    async def _get_object(self, bucket_name: str, object_key: str, etag: Optional[str] = None) -> Optional[dict]:
+        """ GET объекта; при совпадении etag (304 Not Modified) возвращает None """
+        request = dict(Bucket=bucket_name, Key=object_key)
+        if etag is not None:
+            request["IfNoneMatch"] = etag
+
         try:
-            resp = await self._client.get_object(
-                Bucket=bucket_name,
-                Key=object_key
-            )
+            return await self._client.get_object(**request)
         except ClientError as e:
-            error_message = e.response["Error"].get("Message", "Unknown error from S3")
-            raise S3Exception(status=Status.make_status(status=StatusCodes.DB_ERROR, message=error_message))
+            if etag is not None and _is_not_modified(e):
+                return None
+            raise _client_error(e)
+
+    @staticmethod
+    async def _decode_body(stream, resp: dict, encoding: str) -> TextChunks:
+        # тело не читается целиком в байты: части декодируются по мере чтения
+        return [
+            chunk async for chunk in iter_decoded_chunks(stream,
+                                                         encoding=encoding,
+                                                         chunk_size=S3_READ_CHUNK_SIZE,
+                                                         max_size=S3_MAX_OBJECT_SIZE,
+                                                         content_length=resp.get("ContentLength"))
+        ]
+
+    async def _decode_and_store(self,
+                                stream,
+                                resp: dict,
+                                bucket_name: str,
+                                object_key: str,
+                                encoding: str) -> TextChunks:
+        fd, tmp_path = self._disk_cache.open_writer()
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                chunks = await self._decode_body(TeeStream(stream, tmp_file), resp, encoding)
+            await asyncio.to_thread(self._disk_cache.commit, bucket_name, object_key, resp["ETag"], tmp_path)
+        except BaseException:
+            self._disk_cache.discard(tmp_path)
+            raise
+        return chunks
+
+    async def _read_text_chunks(self,
+                                bucket_name: str,
+                                object_key: str,
+                                encoding: str) -> TextChunks:
+        async with self._connection_slots:
+            cached_etag = None
+            if self._disk_cache is not None:
+                cached_etag = await asyncio.to_thread(self._disk_cache.lookup, bucket_name, object_key)
+
+            resp = await self._get_object(bucket_name, object_key, etag=cached_etag)
+            if resp is None:
+                # объект не изменился: читаем тело с диска
+                chunks = await asyncio.to_thread(self._disk_cache.read_text, cached_etag, encoding)
+                if chunks is not None:
+                    self._disk_cache_hits.inc()
+                    return chunks
+                resp = await self._get_object(bucket_name, object_key)
 
-        async with resp["Body"] as stream:
-            raw_data = await stream.read()
+            # читаем через обертку botocore: контекст тела возвращает ответ aiohttp без read(amt)
+            body = resp["Body"]
+            async with body:
+                # сжатое тело распаковывается по мере чтения, на диск сохраняется уже распакованным
+                stream = DecompressingStream(body,
+                                             content_encoding=resp.get("ContentEncoding"),
+                                             max_size=S3_MAX_OBJECT_SIZE,
+                                             read_size=S3_READ_CHUNK_SIZE)
+                if self._disk_cache is None or not resp.get("ETag"):
+                    return await self._decode_body(stream, resp, encoding)
 
-        text_data = raw_data.decode(encoding)
-        return text_data
+                self._disk_cache_misses.inc()
+                return await self._decode_and_store(stream, resp, bucket_name, object_key, encoding)
+
+    async def get_s3_object_chunks(self,
+                                   bucket_name: str,
+                                   object_key: str,
+                                   encoding: str = "utf-8") -> TextChunks:
+        """ Текст объекта частями (без сборки в одну строку) """
+        return await self._read_text_chunks(bucket_name, object_key, encoding)
+
+    async def get_s3_object(self,
+                            bucket_name: str,
+                            object_key: str,
+                            encoding: str = "utf-8") -> Optional[Union[bytes, str, dict]]:
+        return "".join(await self._read_text_chunks(bucket_name, object_key, encoding))
 
     async def put_s3_object(self,
                             bucket_name: str,
                             object_id: str,
                             data: BytesIO,
                             data_length: int,
-                            file_type: S3ContentType) -> Optional[str]:
+                            file_type: S3ContentType,
+                            content_encoding: Optional[str] = None) -> Optional[str]:
+
+        params = {}
+        if content_encoding:
+            params["ContentEncoding"] = content_encoding
 
         try:
             await self._client.put_object(
@@ -156,20 +279,9 @@ class S3Storage:
                 Key=object_id,
                 Body=data.getvalue(),
                 ContentType=file_type.value,
-                ContentLength=data_length
+                ContentLength=data_length,
+                **params
             )
             return object_id
         except ClientError as e:
-            error_message = e.response["Error"].get("Message", "Unknown error from S3")
-            raise S3Exception(status=Status.make_status(status=StatusCodes.DB_ERROR, message=error_message))
-
-    async def get_s3_objects(self,
-                             objects: List[S3ObjectId],
-                             encoding: str = "utf-8") -> Dict[S3ObjectId, Optional[Union[bytes, str, dict]]]:
-        results = {}
-        for s3_object in objects:
-            content = await self.get_s3_object(bucket_name=s3_object.bucket_name,
-                                               object_key=s3_object.s3_key,
-                                               encoding=encoding)
-            results[s3_object] = content
-        return results
+            raise _client_error(e)
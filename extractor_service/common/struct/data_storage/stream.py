@@ -0,0 +1,110 @@
+import asyncio
+import codecs
+import mmap
+import os
+from typing import AsyncGenerator, List, Optional, Union
+
+from utils.aes_utils.exceptions import S3Exception
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+# текст объекта, декодированный по частям (без сборки в одну строку)
+TextChunks = List[str]
+
+
+def too_large_error(object_size: int, max_size: int) -> S3Exception:
+    return S3Exception(status=Status.make_status(status=StatusCodes.BROKEN_CONTENT_ERROR,
+                                                 message=f"Object is too large ({object_size} > {max_size} bytes)"))
+
+
+async def iter_decoded_chunks(stream,
+                              encoding: str = "utf-8",
+                              chunk_size: int = 1024 * 1024,
+                              max_size: Optional[int] = None,
+                              content_length: Optional[int] = None) -> AsyncGenerator[str, None]:
+    """ Читать поток частями и декодировать их инкрементально
+
+    В памяти одновременно находится не больше одной части в байтах;
+    многобайтовые символы на границе частей декодер собирает сам
+
+    :param stream: поток с асинхронным методом read(amt)
+    :param encoding: кодировка текста
+    :param chunk_size: размер читаемой части, байт
+    :param max_size: максимальный размер объекта, байт (None - без ограничения)
+    :param content_length: заявленный размер объекта (для проверки до начала чтения)
+    """
+    if max_size is not None and content_length is not None and content_length > max_size:
+        raise too_large_error(content_length, max_size)
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    read_size = 0
+    while True:
+        chunk = await stream.read(chunk_size)
+        if not chunk:
+            break
+
+        read_size += len(chunk)
+        if max_size is not None and read_size > max_size:
+            raise too_large_error(read_size, max_size)
+
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read_mapped_text(path: str,
+                     encoding: str = "utf-8",
+                     chunk_size: int = 1024 * 1024,
+                     max_size: Optional[int] = None) -> TextChunks:
+    """ Прочитать файл через mmap и декодировать частями
+
+    Страницы файла читаются ядром по мере декодирования, копия всего файла в байтах не создается
+
+    :param path: путь к файлу
+    :param encoding: кодировка текста
+    :param chunk_size: размер декодируемой части, байт
+    :param max_size: максимальный размер файла, байт (None - без ограничения)
+    """
+    with open(path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        if max_size is not None and file_size > max_size:
+            raise too_large_error(file_size, max_size)
+        if file_size == 0:
+            return []
+
+        decoder = codecs.getincrementaldecoder(encoding)()
+        chunks = []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, len(view), chunk_size):
+                chunk = decoder.decode(view[offset:offset + chunk_size])
+                if chunk:
+                    chunks.append(chunk)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            chunks.append(tail)
+        return chunks
+
+
+class TeeStream:
+    """ Поток, дублирующий прочитанные части в файл """
+
+    def __init__(self, stream, sink):
+        self._stream = stream
+        self._sink = sink
+
+    async def read(self, amt: int = -1) -> bytes:
+        chunk = await self._stream.read(amt)
+        if chunk:
+            await asyncio.to_thread(self._sink.write, chunk)
+        return chunk
+
+
+def text_size(content: Union[str, TextChunks]) -> int:
+    """ Длина текста объекта (строки или декодированных частей) """
+    if isinstance(content, list):
+        return sum(len(chunk) for chunk in content)
+    return len(content)
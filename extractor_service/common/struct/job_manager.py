@@ -0,0 +1,288 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+from uuid import uuid4
+
+import aiohttp
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.const.resources.tech_names import ABBREVIATION_EXTRACTION
+from extractor_service.common.func.serialization import JSON_MEDIA_TYPE, dumps, loads
+from extractor_service.common.struct.job_store import JobStore, JobRecord
+from extractor_service.common.struct.model.common import S3ContainerInfo
+from extractor_service.common.struct.resource_manager import ResourceManager
+from utils.aes_utils.common import retry
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionJobData, \
+    AbbreviationExtractionJobResponseMsg, S3ObjectProcessed
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+class JobManager:
+    """ Асинхронные задания расшифровки аббревиатур объектов S3
+
+    Задание выполняется технологией частями по chunk_size контейнеров, результаты сохраняются
+    в JobStore по мере готовности. Одновременно выполняется не больше max_running заданий,
+    остальные ждут в очереди. При запуске продолжаются задания, не завершенные до перезапуска
+
+    Метрики (в aes_globals.metrics с префиксом name): submitted, completed, failed, running, queued,
+    webhook_errors
+    """
+
+    def __init__(self,
+                 resource_manager: ResourceManager,
+                 store: JobStore,
+                 max_running: int,
+                 chunk_size: int,
+                 persist_batch_size: int,
+                 retention_sec: float,
+                 webhook_timeout_sec: float,
+                 webhook_tries: int,
+                 webhook_retry_delay_sec: float = 1,
+                 purge_period_sec: float = 3600,
+                 name: str = "jobs"):
+        """
+        :param resource_manager: менеджер ресурсов с технологией извлечения
+        :param store: состояние заданий
+        :param max_running: число одновременно выполняемых заданий
+        :param chunk_size: контейнеров в одном запросе к технологии
+        :param persist_batch_size: результатов, сохраняемых одной транзакцией
+        :param retention_sec: время хранения завершенных заданий, с
+        :param webhook_timeout_sec: таймаут уведомления о завершении, с
+        :param webhook_tries: число попыток уведомления
+        :param webhook_retry_delay_sec: задержка перед первой повторной попыткой (далее удваивается), с
+        :param purge_period_sec: период удаления заданий старше retention_sec, с
+        :param name: префикс метрик
+        """
+        self._resource_manager = resource_manager
+        self._store = store
+        self._max_running = max(max_running, 1)
+        self._chunk_size = max(chunk_size, 1)
+        self._persist_batch_size = max(persist_batch_size, 1)
+        self._retention_sec = retention_sec
+        self._webhook_timeout_sec = webhook_timeout_sec
+        self._webhook_tries = webhook_tries
+        self._webhook_retry_delay_sec = webhook_retry_delay_sec
+        self._purge_period_sec = purge_period_sec
+        self._logger = aes_globals.service_logger.getChild('job_manager')
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._purge_task: Optional[asyncio.Task] = None
+        self._waiting = 0
+        self._active = 0
+
+        metrics = aes_globals.metrics
+        self._submitted = metrics.counter(f"{name}.submitted")
+        self._completed = metrics.counter(f"{name}.completed")
+        self._failed = metrics.counter(f"{name}.failed")
+        self._webhook_errors = metrics.counter(f"{name}.webhook_errors")
+        self._running = metrics.gauge(f"{name}.running")
+        self._queued = metrics.gauge(f"{name}.queued")
+
+    async def start(self, resume: bool = True, created_before: Optional[float] = None):
+        """ Возобновить незавершенные задания и доставить неотправленные уведомления
+
+        Если файл состояния общий для нескольких процессов API, задания возобновляет только один из них
+
+        :param resume: возобновлять задания (False - только принимать новые)
+        :param created_before: возобновлять только задания, созданные до этого момента (до запуска сервиса),
+                               а не принятые уже запущенными процессами API
+        """
+        self._semaphore = asyncio.Semaphore(self._max_running)
+        self._purge_task = asyncio.create_task(self._purge_routine(), name="jobs-purge")
+        if not resume:
+            return
+
+        created_before = created_before or time.time()
+        for job_id in await asyncio.to_thread(self._store.unfinished, created_before):
+            self._logger.info("Resuming job %s", job_id)
+            self._schedule(job_id)
+
+        for job_id in await asyncio.to_thread(self._store.unnotified, created_before):
+            self._spawn(job_id, self._notify(job_id))
+
+    async def stop(self):
+        """ Прервать выполнение заданий: их состояние сохранено, после запуска они продолжатся """
+        tasks = list(self._tasks.values())
+        if self._purge_task is not None:
+            tasks.append(self._purge_task)
+            self._purge_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._store.close()
+
+    async def submit(self,
+                     containers: List[S3ContainerInfo],
+                     language: str,
+                     cache_mode: str,
+                     webhook_url: Optional[str] = None) -> AbbreviationExtractionJobData:
+        job_id = str(uuid4())
+        data = [dumps(container.dict()) for container in containers]
+        await asyncio.to_thread(self._store.create, job_id, language, cache_mode, webhook_url, data)
+        self._submitted.inc()
+        self._logger.info("Job %s submitted: %d containers", job_id, len(containers))
+
+        self._schedule(job_id)
+        return self._job_data(await asyncio.to_thread(self._store.get, job_id))
+
+    async def get(self, job_id: str, offset: int = 0, limit: int = 0) -> Optional[AbbreviationExtractionJobData]:
+        """ Состояние задания и результаты обработанных контейнеров [offset, offset + limit) """
+        record = await asyncio.to_thread(self._store.get, job_id)
+        if record is None:
+            return None
+
+        results = []
+        if limit > 0:
+            results = await asyncio.to_thread(self._store.results, job_id, offset, limit)
+        return self._job_data(record, [S3ObjectProcessed.parse_obj(loads(result)) for result in results])
+
+    @staticmethod
+    def _job_data(record: JobRecord, s3_objects: List[S3ObjectProcessed] = None) -> AbbreviationExtractionJobData:
+        return AbbreviationExtractionJobData(job_id=record.job_id,
+                                             status=record.status,
+                                             total=record.total,
+                                             processed=record.processed,
+                                             failed=record.failed,
+                                             s3_objects=s3_objects or [])
+
+    def _spawn(self, job_id: str, coro):
+        task = asyncio.create_task(coro, name=f"job-{job_id}")
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def _schedule(self, job_id: str):
+        self._spawn(job_id, self._run(job_id))
+
+    def _update_gauges(self):
+        self._running.set(self._active)
+        self._queued.set(self._waiting)
+
+    async def _run(self, job_id: str):
+        self._waiting += 1
+        self._update_gauges()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        self._update_gauges()
+        try:
+            await self._execute(job_id)
+        finally:
+            self._semaphore.release()
+            self._active -= 1
+            self._update_gauges()
+        await self._notify(job_id)
+
+    async def _execute(self, job_id: str):
+        record = await asyncio.to_thread(self._store.get, job_id)
+        await asyncio.to_thread(self._store.set_status, job_id, Status.make_status(status=StatusCodes.IN_PROGRESS))
+        t0 = time.time()
+        try:
+            while True:
+                pending = await asyncio.to_thread(self._store.pending, job_id, self._chunk_size)
+                if not pending:
+                    break
+                await self._process_chunk(record, pending)
+        except asyncio.CancelledError:
+            # статус остается IN_PROGRESS: задание продолжится после перезапуска
+            raise
+        except Exception:
+            self._logger.exception("Job %s failed", job_id)
+            self._failed.inc()
+            status = Status.make_status(status=StatusCodes.INTERNAL_ERROR, message="Error while processing job")
+        else:
+            self._completed.inc()
+            status = Status.make_status(status=StatusCodes.OK)
+            self._logger.info("Job %s done (%.2f s)", job_id, time.time() - t0)
+        await asyncio.to_thread(self._store.set_status, job_id, status)
+
+    async def _process_chunk(self, record: JobRecord, pending: List[tuple]):
+        tech = self._resource_manager.get_resource(ABBREVIATION_EXTRACTION)
+
+        # результаты технологии сопоставляются с номерами контейнеров по container_id
+        # (он может повторяться в запросе)
+        indexes: Dict[str, Deque[int]] = defaultdict(deque)
+        containers = {}
+        for idx, data in pending:
+            container = S3ContainerInfo.parse_obj(loads(data))
+            indexes[container.container_id].append(idx)
+            containers[idx] = container
+
+        batch = []
+        results = tech.handle_stream(data=list(containers.values()), language=record.language,
+                                     cache_mode=record.cache_mode)
+        try:
+            async for result in results:
+                container_indexes = indexes.get(result.container_id)
+                if not container_indexes:
+                    # лишний результат или контейнер не из этой части: остальные результаты сохраняются
+                    self._logger.warning("Job %s: skipped unexpected result for container '%s'",
+                                         record.job_id, result.container_id)
+                    continue
+                processed = S3ObjectProcessed.from_model(result)
+                batch.append((container_indexes.popleft(),
+                              dumps(processed.dict(by_alias=True)),
+                              processed.status.code != StatusCodes.OK.code))
+                if len(batch) >= self._persist_batch_size:
+                    await asyncio.to_thread(self._store.save_results, record.job_id, batch)
+                    batch = []
+
+            # контейнеры без результата отмечаются ошибкой, иначе та же часть выбиралась бы снова бесконечно
+            missing = sorted(idx for container_indexes in indexes.values() for idx in container_indexes)
+            if missing:
+                self._logger.warning("Job %s: no result for %d containers", record.job_id, len(missing))
+            status = Status.make_status(status=StatusCodes.INTERNAL_ERROR, message="No result for container")
+            for idx in missing:
+                container = containers[idx]
+                processed = S3ObjectProcessed(container_id=container.container_id,
+                                              user_data=container.user_data,
+                                              status=status)
+                batch.append((idx, dumps(processed.dict(by_alias=True)), True))
+        finally:
+            await results.aclose()
+            # готовые результаты сохраняются и при прерывании: после перезапуска они не пересчитываются
+            if batch:
+                await asyncio.to_thread(self._store.save_results, record.job_id, batch)
+
+    async def _purge_routine(self):
+        """ Удалять завершенные задания старше retention_sec: сервис может работать без перезапуска долго """
+        while True:
+            try:
+                purged = await asyncio.to_thread(self._store.purge, time.time() - self._retention_sec)
+            except Exception:
+                self._logger.exception("Can't purge finished jobs")
+            else:
+                if purged:
+                    self._logger.info("Purged %d finished jobs", purged)
+            await asyncio.sleep(self._purge_period_sec)
+
+    async def _notify(self, job_id: str):
+        record = await asyncio.to_thread(self._store.get, job_id)
+        if record is None or not record.webhook_url:
+            return
+
+        msg = AbbreviationExtractionJobResponseMsg(data=self._job_data(record))
+        body = dumps(msg.dict(by_alias=True))
+        try:
+            await self._post_webhook(record.webhook_url, body)
+        except Exception as ex:
+            self._webhook_errors.inc()
+            self._logger.warning("Job %s: webhook '%s' failed: %s", job_id, record.webhook_url, ex)
+            return
+        await asyncio.to_thread(self._store.set_notified, job_id)
+
+    async def _post_webhook(self, url: str, body: bytes):
+        @retry(exceptions=(aiohttp.ClientError, asyncio.TimeoutError), tries=self._webhook_tries,
+               delay=self._webhook_retry_delay_sec, backoff=2)
+        async def _post():
+            timeout = aiohttp.ClientTimeout(total=self._webhook_timeout_sec)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(url, data=body, headers={"Content-Type": JSON_MEDIA_TYPE}) as response:
+                    response.raise_for_status()
+
+        await _post()
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Iterable, List, Optional, Tuple
+
+from utils.aes_utils.models.base_message import Status
+from utils.aes_utils.models.base_model import BaseModel
+from utils.status import StatusCodes
+
+MEMORY_PATH = ":memory:"
+
+# задания с этими статусами еще не завершены
+UNFINISHED_CODES = (StatusCodes.WAITING.code, StatusCodes.IN_PROGRESS.code)
+
+
+class JobRecord(BaseModel):
+    job_id: str
+    language: str
+    cache_mode: str
+    webhook_url: Optional[str]
+    status: Status
+    total: int
+    processed: int
+    failed: int
+    created: float
+    updated: float
+
+
+class JobStore:
+    """ Состояние асинхронных заданий в файле sqlite
+
+    Хранятся параметры задания, его контейнеры и результаты обработанных контейнеров:
+    после перезапуска задание продолжается с контейнеров без результата.
+    Методы синхронные, из цикла событий вызываются через asyncio.to_thread
+    """
+
+    def __init__(self, path: str = MEMORY_PATH):
+        """
+        :param path: путь к файлу (':memory:' - состояние в памяти, без возобновления после перезапуска)
+        """
+        self._lock = Lock()
+
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                           "job_id TEXT PRIMARY KEY, language TEXT NOT NULL, cache_mode TEXT NOT NULL, "
+                           "webhook_url TEXT, status_code INTEGER NOT NULL, status_message TEXT NOT NULL, "
+                           "total INTEGER NOT NULL, notified INTEGER NOT NULL DEFAULT 0, "
+                           "created REAL NOT NULL, updated REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS containers ("
+                           "job_id TEXT NOT NULL, idx INTEGER NOT NULL, container BLOB NOT NULL, "
+                           "result BLOB, failed INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, idx))")
+
+    def create(self,
+               job_id: str,
+               language: str,
+               cache_mode: str,
+               webhook_url: Optional[str],
+               containers: List[bytes]):
+        """
+        :param containers: сериализованные контейнеры задания (в порядке запроса)
+        """
+        now = time.time()
+        status = Status.make_status(status=StatusCodes.WAITING)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("INSERT INTO jobs (job_id, language, cache_mode, webhook_url, status_code, "
+                                   "status_message, total, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (job_id, language, cache_mode, webhook_url, status.code, status.message,
+                                    len(containers), now, now))
+                self._conn.executemany("INSERT INTO containers (job_id, idx, container) VALUES (?, ?, ?)",
+                                       ((job_id, idx, container) for idx, container in enumerate(containers)))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT language, cache_mode, webhook_url, status_code, status_message, total, "
+                                     "created, updated FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            processed, failed = self._conn.execute(
+                "SELECT COUNT(result), COALESCE(SUM(failed), 0) FROM containers WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+        language, cache_mode, webhook_url, status_code, status_message, total, created, updated = row
+        return JobRecord.construct(job_id=job_id,
+                                   language=language,
+                                   cache_mode=cache_mode,
+                                   webhook_url=webhook_url,
+                                   status=Status(code=status_code, message=status_message),
+                                   total=total,
+                                   processed=processed,
+                                   failed=failed,
+                                   created=created,
+                                   updated=updated)
+
+    def set_status(self, job_id: str, status: Status):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status_code = ?, status_message = ?, updated = ? WHERE job_id = ?",
+                               (status.code, status.message, time.time(), job_id))
+
+    def pending(self, job_id: str, limit: int) -> List[Tuple[int, bytes]]:
+        """ Контейнеры задания без результата: (номер, контейнер) """
+        with self._lock:
+            return self._conn.execute("SELECT idx, container FROM containers "
+                                      "WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?",
+                                      (job_id, limit)).fetchall()
+
+    def save_results(self, job_id: str, results: Iterable[Tuple[int, bytes, bool]]):
+        """
+        :param results: (номер контейнера, сериализованный результат, обработан ли с ошибкой)
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("UPDATE containers SET result = ?, failed = ? WHERE job_id = ? AND idx = ?",
+                                       ((result, int(failed), job_id, idx) for idx, result, failed in results))
+                self._conn.execute("UPDATE jobs SET updated = ? WHERE job_id = ?", (time.time(), job_id))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[bytes]:
+        """ Результаты обработанных контейнеров в порядке запроса """
+        with self._lock:
+            rows = self._conn.execute("SELECT result FROM containers WHERE job_id = ? AND result IS NOT NULL "
+                                      "ORDER BY idx LIMIT ? OFFSET ?", (job_id, limit, offset)).fetchall()
+        return [row[0] for row in rows]
+
+    def unfinished(self, created_before: float = float("inf")) -> List[str]:
+        """ Незавершенные задания, созданные до created_before """
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM jobs WHERE status_code IN (?, ?) AND created < ? "
+                                      "ORDER BY created", (*UNFINISHED_CODES, created_before)).fetchall()
+        return [row[0] for row in rows]
+
+    def unnotified(self, created_before: float = float("inf")) -> List[str]:
+        """ Завершенные задания (созданные до created_before), уведомление о которых еще не доставлено """
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM jobs WHERE webhook_url IS NOT NULL AND notified = 0 "
+                                      "AND status_code NOT IN (?, ?) AND created < ? ORDER BY created",
+                                      (*UNFINISHED_CODES, created_before)).fetchall()
+        return [row[0] for row in rows]
+
+    def set_notified(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET notified = 1 WHERE job_id = ?", (job_id,))
+
+    def purge(self, before: float) -> int:
+        """ Удалить завершенные задания, не изменявшиеся с момента before """
+        with self._lock:
+            job_ids = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM jobs WHERE updated < ? AND status_code NOT IN (?, ?)",
+                (before, *UNFINISHED_CODES)
+            ).fetchall()]
+            for job_id in job_ids:
+                self._conn.execute("DELETE FROM containers WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(job_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
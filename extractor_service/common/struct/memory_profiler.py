@@ -0,0 +1,112 @@
+import os
+import resource
+import tracemalloc
+from typing import Optional, List
+
+from pympler import muppy, summary
+
+from extractor_service.common.env.resources import MEMORY_TRACE_FRAMES
+from extractor_service.common.struct.model.diagnostics import MemorySnapshotData, MemoryStat, TypeStat
+
+# аллокации самого профилировщика в статистику не попадают
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryProfiler:
+    """ Снимки памяти процесса: аллокации (tracemalloc) и объекты по типам (Pympler) """
+
+    def __init__(self, frames: int = MEMORY_TRACE_FRAMES):
+        self._frames = frames
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._frames)
+
+    def stop(self):
+        self._last_snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def _trace_name(stat) -> str:
+        frame = stat.traceback[0]
+        return f"{frame.filename}:{frame.lineno}"
+
+    @classmethod
+    def _to_memory_stats(cls, stats) -> List[MemoryStat]:
+        return [
+            MemoryStat(trace=cls._trace_name(stat),
+                       size=stat.size,
+                       count=stat.count,
+                       size_diff=getattr(stat, "size_diff", 0),
+                       count_diff=getattr(stat, "count_diff", 0))
+            for stat in stats
+        ]
+
+    @staticmethod
+    def _type_stats(top: int) -> List[TypeStat]:
+        rows = summary.summarize(muppy.get_objects())
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return [TypeStat(type_name=type_name, count=count, size=size)
+                for type_name, count, size in rows[:top]]
+
+    @staticmethod
+    def _max_rss() -> Optional[int]:
+        try:
+            # в Linux ru_maxrss возвращается в килобайтах
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except (OSError, ValueError):
+            return None
+
+    def snapshot(self,
+                 resource_name: str,
+                 top: int = 20,
+                 key_type: str = "lineno",
+                 with_diff: bool = True,
+                 with_types: bool = False,
+                 stop: bool = False) -> MemorySnapshotData:
+        """ Снять снимок памяти и сравнить его с предыдущим
+
+        :param resource_name: название ресурса (для идентификации реплики в ответе)
+        :param top: количество строк в каждой из статистик
+        :param key_type: группировка аллокаций ('lineno', 'filename', 'traceback')
+        :param with_diff: сравнить с предыдущим снимком
+        :param with_types: добавить статистику объектов по типам (Pympler, медленно)
+        :param stop: остановить отслеживание аллокаций после снимка
+        :return: статистика памяти процесса
+        """
+        # при первом обращении отслеживание только начинается,
+        # поэтому первый снимок содержит лишь последующие аллокации
+        self.start()
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        top_stats = snapshot.statistics(key_type)[:top]
+
+        diff_stats = []
+        if with_diff and self._last_snapshot is not None:
+            diff_stats = snapshot.compare_to(self._last_snapshot, key_type)[:top]
+
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        result = MemorySnapshotData(resource=resource_name,
+                                    pid=os.getpid(),
+                                    max_rss=self._max_rss(),
+                                    traced_current=traced_current,
+                                    traced_peak=traced_peak,
+                                    top=self._to_memory_stats(top_stats),
+                                    diff=self._to_memory_stats(diff_stats),
+                                    types=self._type_stats(top) if with_types else [])
+        if stop:
+            self.stop()
+        else:
+            self._last_snapshot = snapshot
+        return result
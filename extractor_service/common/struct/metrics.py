@@ -0,0 +1,80 @@
+from itertools import chain
+from threading import Lock
+from typing import Dict, Union
+
+Number = Union[int, float]
+
+
+class Counter:
+    """ Монотонно возрастающий счетчик """
+
+    __slots__ = ("_value",)
+
+    def __init__(self):
+        self._value: Number = 0
+
+    @property
+    def value(self) -> Number:
+        return self._value
+
+    def inc(self, amount: Number = 1):
+        self._value += amount
+
+
+class Gauge:
+    """ Текущее значение величины """
+
+    __slots__ = ("_value",)
+
+    def __init__(self):
+        self._value: Number = 0
+
+    @property
+    def value(self) -> Number:
+        return self._value
+
+    def set(self, value: Number):
+        self._value = value
+
+    def set_max(self, value: Number):
+        """ Обновить значение, только если новое больше текущего (high-water mark) """
+        if value > self._value:
+            self._value = value
+
+
+class MetricsRegistry:
+    """ Метрики процесса
+
+    Каждая реплика ресурса работает в своем процессе со своим реестром,
+    снимок собирается командой Command.METRICS
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: Dict[str, Counter] = {}
+        self._gauges: Dict[str, Gauge] = {}
+
+    def counter(self, name: str) -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def gauge(self, name: str) -> Gauge:
+        gauge = self._gauges.get(name)
+        if gauge is None:
+            with self._lock:
+                gauge = self._gauges.setdefault(name, Gauge())
+        return gauge
+
+    def snapshot(self) -> Dict[str, Number]:
+        with self._lock:
+            return {name: metric.value
+                    for name, metric in chain(self._counters.items(), self._gauges.items())}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
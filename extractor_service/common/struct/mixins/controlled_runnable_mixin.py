@@ -1,5 +1,8 @@
 import asyncio
+import inspect
+import os
 from abc import abstractmethod, ABC
+from collections import deque
 from copy import copy
 from datetime import datetime
 from enum import Enum
@@ -7,7 +10,7 @@ from math import ceil
 from multiprocessing import get_context, Process, Value
 from threading import Thread
 from time import sleep
-from typing import Type, Tuple, Dict, Coroutine, Callable, List, Any
+from typing import Type, Tuple, Dict, Coroutine, Callable, List, Any, Optional
 from uuid import uuid4
 
 from utils.aes_utils.common import retry
@@ -16,14 +19,25 @@ from utils.aes_utils.models.base_model import BaseModel
 from utils.status import StatusCodes
 
 import extractor_service.common.globals as aes_globals
+from extractor_service.common.env.general import API_WORKERS
+from extractor_service.common.env.resources import MEMORY_TRACE_ON_START
 from extractor_service.common.env.tech.common import DROP_INACTIVE_MODEL_PERIOD
+from extractor_service.common.struct.memory_profiler import MemoryProfiler
 from extractor_service.common.struct.model.common import Status
+from extractor_service.common.struct.model.diagnostics import (
+    MemorySnapshotRequest,
+    MemorySnapshotData,
+    MetricsRequest,
+    MetricsData,
+)
+from extractor_service.common.struct.process_logger import summarize
 from extractor_service.common.struct.queue import (
     ProcessJoinableQueue,
     ProcessQueue,
     BaseInQueueMsg,
     BaseOutQueueMsg,
-    Command, BaseInData, BaseOutData
+    Command, BaseInData, BaseOutData,
+    Empty,
 )
 
 
@@ -70,6 +84,12 @@ class ProcessPool:
 
 
 class ControlledRunnableMixin(ABC):
+    # служебные команды, которые должна выполнить каждая реплика
+    _COMMAND_HANDLERS = {
+        Command.MEMORY_SNAPSHOT: "_handle_memory_snapshot",
+        Command.METRICS: "_handle_metrics",
+    }
+
     def __init__(self,
                  name: str,
                  in_msg_type: Type[InMsg] = InMsg,
@@ -95,9 +115,16 @@ class ControlledRunnableMixin(ABC):
         self._max_inactivity_period_sec = DROP_INACTIVE_MODEL_PERIOD
         self._usage_check_period_sec = 10
         self._new_msg_check_period_sec = 1
+        self._command_requeue_delay_sec = 0.05
+
+        self._handled_commands = deque(maxlen=128)
+        self._memory_profiler = MemoryProfiler()
 
         self._in_queue = ProcessJoinableQueue(data_type=in_msg_type, ctx=self._proc_ctx)
-        self._out_queue = ProcessQueue(data_type=out_msg_type, ctx=self._proc_ctx)
+        # очередь ответов на каждый процесс API: процесс читает только свои ответы,
+        # а не перекладывает обратно чужие. Канал 0 - также основной процесс и другие ресурсы
+        self._out_queues = [ProcessQueue(data_type=out_msg_type, ctx=self._proc_ctx) for _ in range(API_WORKERS)]
+        self._out_queue = self._out_queues[0]
 
     def _serializable_copy(self):
         obj = copy(self)
@@ -109,6 +136,36 @@ class ControlledRunnableMixin(ABC):
     def started(self):
         return self._pool.started()
 
+    @property
+    def replicas(self) -> int:
+        return self._replicas
+
+    @property
+    def in_msg_type(self) -> Type[InMsg]:
+        return self._in_msg_type
+
+    @property
+    def queues(self) -> Tuple[ProcessJoinableQueue[InMsg], ProcessQueue[OutMsg]]:
+        return self._in_queue, self._out_queue
+
+    def reply_queue(self, reply_to: int) -> ProcessQueue[OutMsg]:
+        """ Очередь ответов канала reply_to (номер процесса API) """
+        return self._out_queues[reply_to]
+
+    def drain_replies(self, reply_to: int) -> int:
+        """ Отбросить ответы канала reply_to, которые процесс API не прочитал до завершения
+
+        :return: число отброшенных ответов
+        """
+        queue = self._out_queues[reply_to]
+        dropped = 0
+        while True:
+            try:
+                queue.get_nowait()
+            except Empty:
+                return dropped
+            dropped += 1
+
     @abstractmethod
     def handle_data(self,
                     resources: BaseResources,
@@ -168,9 +225,49 @@ class ControlledRunnableMixin(ABC):
     def _on_stop(self):
         pass
 
+    def _handle_memory_snapshot(self, request: MemorySnapshotRequest) -> MemorySnapshotData:
+        return self._memory_profiler.snapshot(resource_name=self._name,
+                                              top=request.top,
+                                              key_type=request.key_type,
+                                              with_diff=request.with_diff,
+                                              with_types=request.with_types,
+                                              stop=request.stop)
+
+    def _handle_metrics(self, request: MetricsRequest) -> MetricsData:
+        return MetricsData(resource=self._name,
+                           pid=os.getpid(),
+                           metrics=aes_globals.metrics.snapshot())
+
+    def _handle_command(self, task: InMsg) -> Optional[OutMsg]:
+        """ Выполнить служебную команду
+
+        Команда рассылается по одной на каждую реплику через общую очередь,
+        поэтому реплика, уже ответившая на запрос, возвращает копию в очередь
+
+        :return: ответ реплики или None, если команда возвращена в очередь
+        """
+        if task.data.request_id in self._handled_commands:
+            self._in_queue.put(task)
+            self._in_queue.task_done()
+            return None
+        self._handled_commands.append(task.data.request_id)
+
+        handler = getattr(self, self._COMMAND_HANDLERS[task.cmd])
+        try:
+            out_data = handler(task.data)
+        except Exception:
+            self._logger.exception("Error [handle command '%s']", task.cmd.value)
+            status = Status.make_status(status=StatusCodes.INTERNAL_ERROR,
+                                        message="Error while processing command")
+            return self._out_msg_type.construct(uuid=task.uuid, status=status)
+        return self._out_msg_type.construct(uuid=task.uuid, data=out_data)
+
     def _process_routine(self):
         # TODO: exception check
 
+        if MEMORY_TRACE_ON_START:
+            self._memory_profiler.start()
+
         resources = self._init_resources()
         while True:
             task: InMsg = self._in_queue.get()
@@ -179,8 +276,18 @@ class ControlledRunnableMixin(ABC):
                 self._on_stop()
                 break
 
+            if task.cmd in self._COMMAND_HANDLERS:
+                out_msg = self._handle_command(task)
+                if out_msg is None:
+                    # даем остальным репликам забрать команду
+                    sleep(self._command_requeue_delay_sec)
+                    continue
+
+                self.reply_queue(task.reply_to).put(out_msg)
+                continue
+
             if task.data is None:
-                self._logger.warning(f"Task with no data: {task}")
+                self._logger.warning("Task with no data: %s", summarize(task))
                 continue
 
             # обновляем время последнего обращения
@@ -193,11 +300,11 @@ class ControlledRunnableMixin(ABC):
                 self._logger.exception("Error [handle data]")
                 status = Status.make_status(status=StatusCodes.INTERNAL_ERROR,
                                             message="Error while processing task")
-                self._out_queue.put(
+                self.reply_queue(task.reply_to).put(
                     self._out_msg_type(uuid=task.uuid, status=status)
                 )
             else:
-                self._out_queue.put(
+                self.reply_queue(task.reply_to).put(
                     self._out_msg_type(uuid=task.uuid, data=out_data)
                 )
 
@@ -211,7 +318,7 @@ class ControlledRunnableMixin(ABC):
             raise
 
     def _start_model_routine(self):
-        self._logger.info(f"Start model (replicas={self._replicas})...")
+        self._logger.info("Start model (replicas=%d)...", self._replicas)
         self._pool.start(target=self.main_process_routine,
                          args=(self._serializable_copy(),))
 
@@ -281,7 +388,7 @@ class AsyncControlledRunnableMixin(ControlledRunnableMixin, ABC):
                                    task_name, new_task_name)
                 task_name = new_task_name
 
-            self._logger.debug(f"Run task '%s'", task_name)
+            self._logger.debug("Run task '%s'", task_name)
             self._async_tasks[task_name] = task
             return task_name
 
@@ -289,7 +396,7 @@ class AsyncControlledRunnableMixin(ControlledRunnableMixin, ABC):
         task_name = task.get_name()
 
         async with self._async_task_access_lock:
-            self._logger.debug(f"Delete task '{task_name}'")
+            self._logger.debug("Delete task '%s'", task_name)
             del self._async_tasks[task_name]
 
     @property
@@ -305,34 +412,42 @@ class AsyncControlledRunnableMixin(ControlledRunnableMixin, ABC):
             await asyncio.wait(self._async_tasks.values(),
                                return_when=asyncio.ALL_COMPLETED)
 
-    async def _process_and_send_result(self, handle_coro: Coroutine, process_task_uuid: str):
+    async def _process_and_send_result(self, handle_coro: Coroutine, process_task_uuid: str, reply_to: int = 0):
         task = asyncio.current_task()
         task.set_name(process_task_uuid)
 
         # имя задачи может измениться в процессе вставки,
         # если задача с таким именем уже существует
         task_name = await self._add_task(task)
+        out_queue = self.reply_queue(reply_to)
 
         # выполняем полезную работу
         try:
             result = await handle_coro
+            if inspect.isasyncgen(result):
+                # потоковый результат: каждая часть отправляется сразу, последнее сообщение - без данных
+                async for chunk in result:
+                    await out_queue.aput(
+                        self._out_msg_type.construct(uuid=process_task_uuid, data=chunk, partial=True)
+                    )
+                result = None
         except Exception:
             self._logger.exception("Error [handle task] (%s)", task_name)
             status = Status.make_status(status=StatusCodes.INTERNAL_ERROR,
                                         message="Error while processing task")
 
             out_msg = self._out_msg_type.construct(uuid=process_task_uuid, status=status)
-            await self._out_queue.aput(out_msg)
+            await out_queue.aput(out_msg)
         else:
             out_msg = self._out_msg_type.construct(uuid=process_task_uuid, data=result)
-            await self._out_queue.aput(out_msg)
+            await out_queue.aput(out_msg)
         finally:
             await self._delete_task(task)
 
-    async def _run_async_task(self, task_data, task_uuid, resources):
+    async def _run_async_task(self, task_data, task_uuid, resources, reply_to: int = 0):
         handle_coro = self.handle_data(resources, task_data)
         asyncio.create_task(
-            self._process_and_send_result(handle_coro, task_uuid)
+            self._process_and_send_result(handle_coro, task_uuid, reply_to)
         )
 
     @abstractmethod
@@ -350,6 +465,9 @@ class AsyncControlledRunnableMixin(ControlledRunnableMixin, ABC):
     async def _process_routine(self):
         # TODO: exception check
 
+        if MEMORY_TRACE_ON_START:
+            self._memory_profiler.start()
+
         resources = await self._init_resources()
 
         while True:
@@ -365,15 +483,25 @@ class AsyncControlledRunnableMixin(ControlledRunnableMixin, ABC):
                 await self._on_stop()
                 break
 
+            if task.cmd in self._COMMAND_HANDLERS:
+                out_msg = self._handle_command(task)
+                if out_msg is None:
+                    # даем остальным репликам забрать команду
+                    await asyncio.sleep(self._command_requeue_delay_sec)
+                    continue
+
+                await self.reply_queue(task.reply_to).aput(out_msg)
+                continue
+
             if task.data is None:
-                self._logger.warning(f"Task with no data: {task}")
+                self._logger.warning("Task with no data: %s", summarize(task))
                 continue
 
             # обновляем время последнего обращения
             self._update_last_msg_dt()
 
             # ставим задачу на асинхронную обработку
-            await self._run_async_task(task.data, task.uuid, resources)
+            await self._run_async_task(task.data, task.uuid, resources, task.reply_to)
 
     @staticmethod
     @retry(delay=0.1, max_delay=5, jitter=(0.1, 1), backoff=2)
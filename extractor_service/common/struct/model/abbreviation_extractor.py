@@ -4,8 +4,9 @@ from typing import List, Union, Optional, Dict
 from pydantic import Field, validator
 
 from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.cache import CacheMode
 from extractor_service.common.struct.language import LanguageEnum
-from extractor_service.common.struct.model.common import S3ContainerInfo, BaseData
+from extractor_service.common.struct.model.common import S3ContainerInfo, BaseData, TextContainerInfo
 from utils.aes_utils.models.base_model import to_pascal, BaseModel
 
 
@@ -15,7 +16,12 @@ class TextContent(BaseData):
 
 class AbbreviationExtractorRequestData(BaseModel):
     language: Union[LanguageEnum, str] = Field(default=LanguageEnum.RUSSIAN)
-    s3_containers: List[S3ContainerInfo]
+    s3_containers: List[S3ContainerInfo] = Field(default_factory=list)
+    # тексты, переданные в запросе: обрабатываются без загрузки из S3 и выгрузки результата
+    text_containers: List[TextContainerInfo] = Field(default_factory=list)
+    cache_mode: Union[CacheMode, str] = Field(default=CacheMode.USE)
+    # выдавать результаты по мере готовности (потоковый ответ), а не списком после обработки всего запроса
+    stream: bool = False
 
     @validator('language', pre=True)
     def convert_language(cls, value):
@@ -26,6 +32,15 @@ class AbbreviationExtractorRequestData(BaseModel):
                 raise ValueError(f"Некорректное значение для language: {value}") from e
         return value
 
+    @validator('cache_mode', pre=True)
+    def convert_cache_mode(cls, value):
+        if isinstance(value, str):
+            try:
+                return CacheMode(value.lower())
+            except ValueError as e:
+                raise ValueError(f"Некорректное значение для cache_mode: {value}") from e
+        return value
+
     class Config:
         arbitrary_types_allowed = True
         allow_population_by_field_name = True
@@ -41,6 +56,9 @@ class ExpansionToSave(BaseData):
 class CreatedS3Object(BaseData):
     bucket_name: Optional[str]
     s3_key: Optional[str]
+    # положение результата в общем объекте JSONL (режим RESULT_UPLOAD_MODE=aggregated)
+    line_index: Optional[int]
+    offset: Optional[int]
 
 
 class AbbreviationExtractorS3Result(CreatedS3Object):
@@ -51,3 +69,18 @@ class AbbreviationExtractorS3Result(CreatedS3Object):
         arbitrary_types_allowed = True
         allow_population_by_field_name = True
         alias_generator = to_pascal
+
+
+class ExtractedExpansions(BaseData):
+    expansions: Dict[str, Dict[str, int]]
+
+
+class AbbreviationExtractorTextResult(BaseData):
+    container_id: str
+    user_data: Dict
+    expansions: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+
+    class Config:
+        arbitrary_types_allowed = True
+        allow_population_by_field_name = True
+        alias_generator = to_pascal
@@ -1,16 +1,17 @@
-from typing import Optional, List, Dict, Any, Union
-
-from pydantic import create_model
-from pydantic.fields import FieldInfo
+from typing import AbstractSet, Optional, List, Dict, Any, Union, Type
 
 from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
 from utils.aes_utils.models.base_message import Status
-from utils.aes_utils.models.base_model import BaseModel
+from utils.aes_utils.models.base_model import BaseModel, ModelType
 from utils.status import StatusCodes
 
-Content = Union[str, bytes, Dict]
+# текст объекта может быть разбит на части (TextChunks)
+Content = Union[str, bytes, Dict, List[str]]
 ContentList = List[Content]
 
+# поля, которые есть у каждого элемента пайплайна
+SERVICE_FIELDS = frozenset(("key_", "status"))
+
 
 class BaseData(BaseModel):
     key_: str
@@ -22,41 +23,98 @@ class BaseData(BaseModel):
         alias_generator = None
         by_alias = False
 
-    def merge(self, model: 'BaseData') -> 'BaseData':
-        new_model = super().merge(model)
+    def merge(self, model: 'BaseData', inplace: bool = False) -> 'BaseData':
+        new_model = super().merge(model, inplace=inplace)
         new_model.status = model.status
         return new_model
 
 
-class ExtendedBaseData(BaseData):
-    class ExtendedBaseDataBase(BaseModel):
-        class Config:
-            arbitrary_types_allowed = True
-            alias_generator = None
-            by_alias = False
+class DataRecord:
+    """ Легковесная запись данных внутри пайплайна
 
-        def merge(self, model: BaseData) -> BaseData:
-            new_model = super().merge(model)
-            new_model.status = model.status
-            return new_model
+    Поддерживает атрибутный доступ к полям, merge и status так же, как BaseData,
+    но не создает pydantic-модель на каждый элемент. В pydantic-модели записи
+    преобразуются только на границе пайплайна
+    """
 
-    @classmethod
-    def construct(cls, _fields_set=None, **values: Any):
-        fields = {name: (field.annotation, field.field_info)
-                  for name, field in cls.__fields__.items()}
-        fields.update(
-            {
-                name: (type(value), FieldInfo(None))
-                for name, value in values.items()
-                if name not in fields
-            }
-        )
-        new_model = create_model("ExtendedBaseData",
-                                 __module__=cls.__module__,
-                                 __base__=cls.ExtendedBaseDataBase,
-                                 **fields)
-        return new_model.construct(_fields_set=_fields_set, **values)
+    __slots__ = ("_fields",)
+
+    def __init__(self, **fields: Any):
+        if "status" not in fields:
+            fields["status"] = Status.make_status(status=StatusCodes.OK)
+        object.__setattr__(self, "_fields", fields)
 
+    @classmethod
+    def from_model(cls, model: Union[BaseModel, 'DataRecord', Dict[str, Any]]) -> 'DataRecord':
+        if isinstance(model, DataRecord):
+            return model
+        return cls(**fields_as_dict(model))
+
+    def __getattr__(self, name: str) -> Any:
+        # до инициализации (например, при копировании) слота еще нет
+        if name == "_fields":
+            raise AttributeError(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+    def __setattr__(self, name: str, value: Any):
+        self._fields[name] = value
+
+    def __getstate__(self):
+        return self._fields
+
+    def __setstate__(self, state: Dict[str, Any]):
+        object.__setattr__(self, "_fields", state)
+
+    def __repr__(self) -> str:
+        fields_repr = ", ".join(f"{name}={value!r}" for name, value in self._fields.items())
+        return f"{type(self).__name__}({fields_repr})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self._fields
+
+    def merge(self, model: Union[BaseModel, 'DataRecord'], inplace: bool = False) -> 'DataRecord':
+        """ Добавить недостающие поля из model (семантика BaseData.merge)
+
+        :param model: запись или модель, поля которой добавляются
+        :param inplace: изменить текущую запись вместо создания новой
+        :return: объединенная запись со статусом model
+        """
+        model_fields = fields_as_dict(model)
+        fields = self._fields if inplace else dict(self._fields)
+        for name, value in model_fields.items():
+            if name not in fields:
+                fields[name] = value
+        fields["status"] = model_fields.get("status", fields["status"])
+
+        if inplace:
+            return self
+        return DataRecord(**fields)
+
+    def retain(self, names: AbstractSet[str]) -> 'DataRecord':
+        """ Удалить из записи все поля, кроме перечисленных (и служебных) """
+        retain_fields(self._fields, names)
+        return self
+
+    def to_model(self, model_type: Type[ModelType]) -> ModelType:
+        return model_type.construct(**self._fields)
+
+
+def retain_fields(fields: Dict[str, Any], names: AbstractSet[str]) -> Dict[str, Any]:
+    """ Удалить из словаря полей все, кроме перечисленных и служебных (key_, status) """
+    for name in [name for name in fields if name not in names and name not in SERVICE_FIELDS]:
+        del fields[name]
+    return fields
+
+
+def fields_as_dict(item: Union[BaseModel, DataRecord, Dict[str, Any]]) -> Dict[str, Any]:
+    if isinstance(item, DataRecord):
+        return item.as_dict()
+    if isinstance(item, dict):
+        return item
+    return {f_name: getattr(item, f_name) for f_name in item.__fields__}
 
 
 class S3ContainerInfo(BaseData):
@@ -77,6 +135,24 @@ class S3ContainerInfo(BaseData):
         return super().construct(_fields_set=_fields_set, **values)
 
 
+class TextContainerInfo(BaseData):
+    """ Контейнер с текстом, переданным в самом запросе (без S3) """
+    container_id: str
+    text: str
+    user_data: Dict
+
+    def __init__(self, **data):
+        if 'key_' not in data:
+            data['key_'] = data['container_id']
+        super().__init__(**data)
+
+    @classmethod
+    def construct(cls, _fields_set=None, **values: Any):
+        if 'key_' not in values:
+            values['key_'] = values['container_id']
+        return super().construct(_fields_set=_fields_set, **values)
+
+
 class LoadedContainer(BaseData):
     container_contents: Optional[ContentList]
 
@@ -0,0 +1,53 @@
+from typing import Dict, List, Optional, Union
+
+from utils.aes_utils.models.base_message import Status
+from utils.aes_utils.models.base_model import BaseModel
+from utils.status import StatusCodes
+
+
+class MemorySnapshotRequest(BaseModel):
+    request_id: str
+    top: int = 20
+    key_type: str = "lineno"
+    with_diff: bool = True
+    with_types: bool = False
+    stop: bool = False
+
+
+class MemoryStat(BaseModel):
+    trace: str
+    size: int
+    count: int
+    size_diff: int = 0
+    count_diff: int = 0
+
+
+class TypeStat(BaseModel):
+    type_name: str
+    count: int
+    size: int
+
+
+class ReplicaData(BaseModel):
+    """ Ответ реплики на служебную команду """
+    resource: str
+    # None - реплика не ответила (status - ошибка)
+    pid: Optional[int]
+    status: Status = Status.make_status(status=StatusCodes.OK)
+
+
+class MemorySnapshotData(ReplicaData):
+    max_rss: Optional[int]
+    traced_current: int = 0
+    traced_peak: int = 0
+    top: List[MemoryStat] = []
+    diff: List[MemoryStat] = []
+    types: List[TypeStat] = []
+
+
+class MetricsRequest(BaseModel):
+    request_id: str
+
+
+class MetricsData(ReplicaData):
+    metrics: Dict[str, Union[int, float]] = {}
@@ -18,93 +18,165 @@ from typing import (
     Union,
     Optional,
     Generator,
-    AsyncGenerator
+    AsyncGenerator,
+    FrozenSet,
 )
 
-from aioitertools import tee
 from utils.aes_utils.common import async_grouper
 from utils.aes_utils.models.base_model import BaseModel
 from utils.status import StatusCodes
 
 import extractor_service.common.globals as aes_globals
-from extractor_service.common.struct.model.common import ExtendedBaseData, Status
-from extractor_service.common.struct.model.common import BaseData
+from extractor_service.common.env.general import PIPELINE_BROADCAST_BUFFER_SIZE
+from extractor_service.common.struct.broadcast import BoundedBroadcast
+from extractor_service.common.struct.cache import CacheMode, StepCache
+from extractor_service.common.struct.model.common import (
+    BaseData,
+    DataRecord,
+    Status,
+    fields_as_dict,
+    retain_fields,
+)
 
 InType = TypeVar('InType', bound=BaseModel)
 OutType = TypeVar('OutType', bound=BaseModel)
 
-Transformable = Union[BaseModel, dict]
+Transformable = Union[BaseModel, DataRecord, dict]
 TransformerType = Dict[Tuple[Type[InType], Type[OutType]], Callable[[InType], OutType]]
 AnyTransformerType = Dict[Type[OutType], Callable[[Dict], OutType]]
+# вызывается для каждого элемента, обработка которого завершена
+ItemCallback = Callable[[Union[BaseData, DataRecord]], None]
 
 
 ITEMS_META_KEY = "_items_meta"
 
+# типы динамических моделей (merge) не должны бесконечно копиться в таблице диспетчеризации
+_DISPATCH_CACHE_LIMIT = 1024
 
-def _dict_get_with_raise(obj: dict, key: str) -> Any:
-    if key not in obj:
-        raise AttributeError(f"Key '{key}' not found in dict")
-    return obj[key]
+_MISSING = object()
 
+# признак завершения обработки всех пачек pre-collected шага
+_BATCHES_DONE = object()
+# признак завершения обработки всех элементов пайплайна
+_PIPELINE_DONE = object()
 
-class StepProcessingMixin:
 
-    def __init__(self, transformer: BaseDataTransformer):
-        self._transformer = transformer
+def get_func_args(func: Callable) -> Dict[str, bool]:
+    arg_spec = getfullargspec(func)
+    args = arg_spec.args
+    default_count = 0 if arg_spec.defaults is None else len(arg_spec.defaults)
+    required_arg_count = len(args) - default_count
+    if args and args[0] == "self":
+        args.remove('self')
+        required_arg_count -= 1
 
-    @staticmethod
-    def _get_func_args(func: Callable) -> Dict[str, bool]:
-        arg_spec = getfullargspec(func)
-        args = arg_spec.args
-        default_count = 0 if arg_spec.defaults is None else len(arg_spec.defaults)
-        required_arg_count = len(args) - default_count
-        if args and args[0] == "self":
-            args.remove('self')
-            required_arg_count -= 1
-
-        pos_args = {arg_name: (arg_idx < required_arg_count)
-                    for arg_idx, arg_name in enumerate(args)}
-
-        kw_defaults = arg_spec.kwonlydefaults or {}
-        kw_args = {arg_name: (arg_name in kw_defaults)
-                   for arg_name in arg_spec.kwonlyargs}
-        return dict(**pos_args, **kw_args)
+    pos_args = {arg_name: (arg_idx < required_arg_count)
+                for arg_idx, arg_name in enumerate(args)}
 
-    @staticmethod
-    def _map_attribute(attr_name: str, mapping: Dict[str, str]) -> str:
-        return mapping[attr_name] if attr_name in mapping else attr_name
-
-    def _get_attributes(self,
-                        result_item: Union[Dict, BaseModel],
-                        attrs: Dict[str, bool],
-                        meta: Optional[Dict[str, Any]] = None,
-                        attr_mapping: Optional[Dict[str, str]] = None) -> dict:
-        if isinstance(result_item, dict):
-            getter = partial(_dict_get_with_raise, result_item)
-        elif isinstance(result_item, BaseModel):
-            getter = partial(getattr, result_item)
+    kw_defaults = arg_spec.kwonlydefaults or {}
+    kw_args = {arg_name: (arg_name in kw_defaults)
+               for arg_name in arg_spec.kwonlyargs}
+    return dict(**pos_args, **kw_args)
+
+
+class ArgBinding:
+    """ Привязка аргументов обработчика шага к атрибутам элемента
+
+    Разбор сигнатуры и разрешение attr_mapping выполняются один раз при компиляции плана
+    """
+
+    __slots__ = ("_args",)
+
+    def __init__(self, func: Callable, attr_mapping: Optional[Dict[str, str]] = None):
+        attr_mapping = attr_mapping or {}
+        self._args: Tuple[Tuple[str, str, bool], ...] = tuple(
+            (arg_name, attr_mapping.get(arg_name, arg_name), required)
+            for arg_name, required in get_func_args(func).items()
+        )
+
+    @property
+    def source_names(self) -> Tuple[str, ...]:
+        return tuple(source_name for _, source_name, _ in self._args)
+
+    def bind(self,
+             source: Union[Dict, BaseModel],
+             meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if isinstance(source, dict):
+            getter = source.get
         else:
-            raise ValueError("Result item must be of type 'dict' or 'pydantic.BaseModel'")
+            getter = partial(getattr, source)
 
         result_attributes = {}
-        for arg_name, required in attrs.items():
-            mapped_arg_name = arg_name
-            if attr_mapping:
-                mapped_arg_name = self._map_attribute(arg_name, attr_mapping)
-
-            try:
-                result_attributes[arg_name] = getter(mapped_arg_name)
-            except AttributeError:
-                if meta and arg_name in meta:
-                    result_attributes[arg_name] = meta[mapped_arg_name]
-                    continue
+        for arg_name, source_name, required in self._args:
+            value = getter(source_name, _MISSING)
+            if value is not _MISSING:
+                result_attributes[arg_name] = value
+                continue
 
-                if not required:
-                    continue
+            if meta and arg_name in meta:
+                result_attributes[arg_name] = meta[arg_name]
         return result_attributes
 
+
+class CompiledStep:
+    __slots__ = ("step", "binding")
+
+    def __init__(self, step: PipelineStep, binding: ArgBinding):
+        self.step = step
+        self.binding = binding
+
+
+class StepPlan:
+    """ Скомпилированный план запуска дочерних шагов
+
+    Кроме шагов план хранит время жизни полей элементов:
+    required_fields - поля, которые читают дочерние шаги (рекурсивно),
+    keep_fields - поля, которые читают шаги соседних ветвей (метаданные элемента у ветвей общие),
+    result_fields - поля результата пайплайна (None - нужны все поля).
+    Остальные поля удаляются из метаданных элемента сразу после шага
+    """
+
+    __slots__ = ("steps", "pre_collected_steps", "broadcast_buffer_size",
+                 "required_fields", "result_fields", "meta_fields", "done_fields", "record_fields")
+
+    def __init__(self,
+                 steps: Tuple[CompiledStep, ...] = (),
+                 pre_collected_steps: Tuple[CompiledStep, ...] = (),
+                 broadcast_buffer_size: int = PIPELINE_BROADCAST_BUFFER_SIZE,
+                 required_fields: FrozenSet[str] = frozenset(),
+                 result_fields: Optional[FrozenSet[str]] = None,
+                 keep_fields: FrozenSet[str] = frozenset()):
+        self.steps = steps
+        self.pre_collected_steps = pre_collected_steps
+        self.broadcast_buffer_size = broadcast_buffer_size
+        self.required_fields = required_fields
+        self.result_fields = result_fields
+
+        self.meta_fields: Optional[FrozenSet[str]] = None
+        self.done_fields: Optional[FrozenSet[str]] = None
+        self.record_fields: Optional[FrozenSet[str]] = None
+        if result_fields is not None:
+            # метаданные нужны дочерним шагам, пока они не вернут свои элементы, и соседним ветвям
+            self.meta_fields = result_fields | required_fields | keep_fields
+            # после завершения всех дочерних шагов элемента - только соседним ветвям
+            self.done_fields = result_fields | keep_fields
+            # запись элемента после запуска дочерних шагов дочитывают только pre_collected шаги
+            self.record_fields = result_fields.union(*(
+                compiled_step.step.in_item_type.__fields__ for compiled_step in pre_collected_steps
+            ))
+
+    @property
+    def empty(self) -> bool:
+        return not (self.steps or self.pre_collected_steps)
+
+
+class StepProcessingMixin:
+
+    def __init__(self, transformer: BaseDataTransformer):
+        self._transformer = transformer
+
     @staticmethod
-    def _merge_result_parts(parts: Tuple[Union[Exception, List[BaseData]]]) -> Optional[BaseData]:
+    def _merge_result_parts(parts: Tuple[Union[Exception, List[BaseData]]]) -> Optional[DataRecord]:
         if not parts:
             return None
 
@@ -116,10 +188,10 @@ class StepProcessingMixin:
             aes_globals.service_logger.exception("Error [parse result]", exc_info=merged_item)
             return None
 
-        merged_item = merged_item[0]
+        merged_item = DataRecord.from_model(merged_item[0])
         for item in parts[1:]:
-            if isinstance(merged_item, Exception):
-                aes_globals.service_logger.exception("Error [parse result]", exc_info=merged_item)
+            if isinstance(item, Exception):
+                aes_globals.service_logger.exception("Error [parse result]", exc_info=item)
                 return None
 
             # если встречаем ошибку, то сразу выходим,
@@ -127,18 +199,14 @@ class StepProcessingMixin:
             if merged_item.status.code != StatusCodes.OK.code:
                 return merged_item
 
-            merged_item = merged_item.merge(item[0])
+            merged_item = merged_item.merge(item[0], inplace=True)
         return merged_item
 
     @staticmethod
-    def get_fields_as_dict(item: BaseModel) -> Dict[str, Any]:
-        return {f_name: getattr(item, f_name) for f_name in item.__fields__}
-
-    def _update_item_meta(self, item: BaseData, meta: Dict[str, Any]) -> Dict[str, Any]:
+    def _update_item_meta(item: Union[BaseData, DataRecord], meta: Dict[str, Any]) -> Dict[str, Any]:
         item_meta = meta[ITEMS_META_KEY].get(item.key_, {})
 
-        item_field_dict = self.get_fields_as_dict(item)
-        item_meta.update(item_field_dict)
+        item_meta.update(fields_as_dict(item))
         meta[ITEMS_META_KEY][item.key_] = item_meta
         return item_meta
 
@@ -179,75 +247,133 @@ class StepProcessingMixin:
 
     async def _enrich_with_meta(self,
                                 data: AsyncGenerator[BaseData, None],
-                                meta: Optional[Dict[str, Any]]) -> AsyncGenerator[BaseData, None]:
+                                meta: Optional[Dict[str, Any]],
+                                plan: StepPlan) -> AsyncGenerator[DataRecord, None]:
         async for item in data:
             item_meta = self._update_item_meta(item, meta)
-            yield ExtendedBaseData.construct(**item_meta)
+            record = DataRecord(**item_meta)
+            if plan.meta_fields is not None:
+                # поля, которые не читает ни один из последующих шагов, освобождаются сразу
+                retain_fields(item_meta, plan.meta_fields)
+            yield record
+
+    async def _complete_item(self,
+                             record: DataRecord,
+                             coro_batch: List[asyncio.Task],
+                             on_item_done: Optional[ItemCallback],
+                             meta: Optional[Dict[str, Any]] = None,
+                             plan: StepPlan = StepPlan()) -> bool:
+        """ Дождаться дочерних шагов элемента и добавить их результаты к записи
+
+        :return: признак успешной обработки элемента
+        """
+        res_item_parts = await asyncio.gather(*coro_batch, return_exceptions=True)
+        if plan.done_fields is not None and not plan.pre_collected_steps:
+            # все ветви шага прочитали метаданные элемента: остаются поля для соседних ветвей и результата
+            item_meta = meta[ITEMS_META_KEY].get(record.key_)
+            if item_meta is not None:
+                retain_fields(item_meta, plan.done_fields)
+        item = self._merge_result_parts(res_item_parts)  # noqa
+        if item is None:
+            record.status = Status.make_status(status=StatusCodes.INTERNAL_ERROR)
+        else:
+            record.merge(item, inplace=True)
+
+        if on_item_done is not None:
+            on_item_done(record)
+        return item is not None
 
     async def _run_dependent_steps(self,
                                    data: AsyncGenerator[BaseData, None],
                                    meta: Optional[Dict[str, Any]] = None,
-                                   steps: List[PipelineStep] = None,
-                                   steps_with_pre_collection: List[PipelineStep] = None,
-                                   attr_mapping: Dict[str, str] = None) -> List[BaseData]:
+                                   plan: StepPlan = StepPlan(),
+                                   on_item_done: Optional[ItemCallback] = None) -> List[BaseData]:
         pre_collected_coro_batch = []
 
-        data = self._enrich_with_meta(data, meta)
-        if steps_with_pre_collection:
-            data_gens = tee(data, n=(len(steps_with_pre_collection)+1))
-            for idx, step in enumerate(steps_with_pre_collection):
-                attrs = self._get_func_args(step.processor)
-                attr_dict = self._get_attributes(meta, attrs, attr_mapping=attr_mapping)
+        # результаты pre-collected шагов известны только после обработки всех элементов,
+        # поэтому при их наличии элементы передаются в on_item_done в конце
+        stream = on_item_done if not plan.pre_collected_steps else None
+
+        data = self._enrich_with_meta(data, meta, plan)
+        broadcast = None
+        if plan.pre_collected_steps:
+            # источник читается не быстрее самого медленного из потребителей
+            broadcast = BoundedBroadcast(data,
+                                         consumers=len(plan.pre_collected_steps) + 1,
+                                         buffer_size=plan.broadcast_buffer_size)
+            data_gens = broadcast.start()
+            for idx, compiled_step in enumerate(plan.pre_collected_steps):
+                attr_dict = compiled_step.binding.bind(meta)
 
                 non_broken_data = self._non_broken_gen(data_gens[idx + 1])
-                pre_collected_coro_batch.append(
-                    asyncio.create_task(step.process(non_broken_data, meta=meta, **attr_dict))
-                )
+                task = asyncio.create_task(compiled_step.step.process(non_broken_data, meta=meta, **attr_dict))
+                # завершившийся шаг не должен блокировать раздачу остальным
+                task.add_done_callback(partial(broadcast.close_consumer, idx + 1))
+                pre_collected_coro_batch.append(task)
             data = data_gens[0]
 
-        item_task_batches = []
+        item_tasks = []
+        # задачи дочерних шагов всех элементов (в том числе элемента, для которого еще не созданы все)
+        step_tasks = []
         collected_items = OrderedDict()
         broken_items = []
-        async for result_item in data:
-            # объекты, на которых на предыдущем шаге возникла ошибка
-            # не отправляем на следующие шаги
-            if result_item.status.code != StatusCodes.OK.code:
-                broken_items.append(result_item)
-                continue
+        try:
+            async for result_item in data:
+                # объекты, на которых на предыдущем шаге возникла ошибка
+                # не отправляем на следующие шаги
+                if result_item.status.code != StatusCodes.OK.code:
+                    if stream is not None:
+                        stream(result_item)
+                    else:
+                        broken_items.append(result_item)
+                    continue
 
-            collected_items[result_item.key_] = result_item
-
-            item_coro_batch = []
-            for step in steps:
-                attrs = self._get_func_args(step.processor)
-                attr_dict = self._get_attributes(result_item=result_item,
-                                                 attrs=attrs,
-                                                 meta=meta,
-                                                 attr_mapping=attr_mapping)
-                item_coro_batch.append(
-                    asyncio.create_task(step.process(meta=meta, **attr_dict))
-                )
-
-            if item_coro_batch:
-                item_task_batches.append(item_coro_batch)
-
-        if not (steps or steps_with_pre_collection):
-            return list(chain(collected_items.values(), broken_items))
-
-        if not collected_items:
-            return list(chain(collected_items.values(), broken_items))
-
-        # собираем результаты
-        item_keys = list(collected_items.keys())
-        for key, coro_batch in zip(item_keys, item_task_batches):
-            res_item_parts = await asyncio.gather(*coro_batch, return_exceptions=True)
-            item = self._merge_result_parts(res_item_parts)  # noqa
-            if item is None:
-                collected_items[key].status = Status.make_status(status=StatusCodes.INTERNAL_ERROR)
-                broken_items.append(collected_items[key])
-                del collected_items[key]
-                continue
-            collected_items[key] = collected_items[key].merge(item)
+                item_coro_batch = []
+                for compiled_step in plan.steps:
+                    attr_dict = compiled_step.binding.bind(result_item, meta)
+
+                    # пока у шага нет свободных слотов, следующий элемент из предыдущего шага не запрашивается
+                    await compiled_step.step.acquire_slot()
+                    task = asyncio.create_task(compiled_step.step.process(meta=meta, **attr_dict))
+                    task.add_done_callback(compiled_step.step.release_slot)
+                    item_coro_batch.append(task)
+                    step_tasks.append(task)
+
+                if item_coro_batch:
+                    # элемент завершается, как только завершены его дочерние шаги, не дожидаясь остальных
+                    item_tasks.append((result_item.key_,
+                                       asyncio.create_task(self._complete_item(result_item, item_coro_batch, stream,
+                                                                               meta, plan))))
+                elif stream is not None:
+                    stream(result_item)
+
+                # выданные элементы не хранятся до конца обработки
+                if stream is None:
+                    collected_items[result_item.key_] = result_item
+
+                if plan.record_fields is not None:
+                    result_item.retain(plan.record_fields)
+
+            # собираем результаты
+            completed = await asyncio.gather(*(task for _, task in item_tasks))
+        except BaseException:
+            if broadcast is not None:
+                await broadcast.close()
+            # после ошибки запроса его задачи не должны занимать слоты шагов и выгружать результаты
+            tasks = [*pre_collected_coro_batch, *step_tasks, *(task for _, task in item_tasks)]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if stream is not None:
+            return []
+
+        for (key, _), ok in zip(item_tasks, completed):
+            if not ok:
+                broken_items.append(collected_items.pop(key))
+
+        if not plan.pre_collected_steps or not collected_items:
+            return self._notify_done(list(chain(collected_items.values(), broken_items)), on_item_done)
 
         pre_collected_steps_results = await asyncio.gather(*pre_collected_coro_batch,
                                                            return_exceptions=True)
@@ -258,7 +384,7 @@ class StepProcessingMixin:
 
                 for key, item in collected_items.items():
                     item.status = Status.make_status(status=StatusCodes.INTERNAL_ERROR)
-                return list(chain(collected_items.values(), broken_items))
+                return self._notify_done(list(chain(collected_items.values(), broken_items)), on_item_done)
 
         for item in chain(*pre_collected_steps_results):
             key = item.key_
@@ -266,8 +392,15 @@ class StepProcessingMixin:
             if collected_items[key].status.code != StatusCodes.OK.code:
                 continue
 
-            collected_items[key] = collected_items[key].merge(item)
-        return list(chain(collected_items.values(), broken_items))
+            collected_items[key] = collected_items[key].merge(item, inplace=True)
+        return self._notify_done(list(chain(collected_items.values(), broken_items)), on_item_done)
+
+    @staticmethod
+    def _notify_done(items: List[BaseData], on_item_done: Optional[ItemCallback]) -> List[BaseData]:
+        if on_item_done is not None:
+            for item in items:
+                on_item_done(item)
+        return items
 
 
 class BaseDataTransformer:
@@ -276,27 +409,41 @@ class BaseDataTransformer:
         self._transformers: TransformerType = {}
         self._from_any_transformers: AnyTransformerType = {}
 
+        # таблица диспетчеризации (тип входа, тип выхода) -> преобразователь
+        self._dispatch: Dict[Tuple[type, type], Callable[[Any], Any]] = {}
+
     @staticmethod
     def _default_transformer(data: Union[Transformable, BaseModel], out_type: Type[Transformable]) -> OutType:
         if isinstance(data, out_type):
             return data
 
+        if isinstance(data, DataRecord):
+            return data.to_model(out_type)
+
         if isinstance(data, BaseModel):
             data = data.dict()
         return out_type.construct(**data)
 
+    def _resolve(self, in_type: type, out_type: Type[OutType]) -> Callable[[Any], OutType]:
+        transformer = self._transformers.get((in_type, out_type))
+        if transformer is not None:
+            return transformer
+
+        transformer = self._from_any_transformers.get(out_type)
+        if transformer is not None:
+            return transformer
+        return partial(self._default_transformer, out_type=out_type)
+
     def transform(self, data: InType, out_type: Type[OutType]) -> OutType:
-        in_type_str = str(type(data))
-        out_type_str = str(out_type)
-        transformer_key = (in_type_str, out_type_str)
-        if transformer_key in self._transformers:
-            transformer = self._transformers[transformer_key]
-            return transformer(data)
-
-        if out_type_str in self._from_any_transformers:
-            transformer = self._from_any_transformers[out_type_str]
-            return transformer(data)
-        return self._default_transformer(data, out_type)
+        transformer_key = (type(data), out_type)
+        transformer = self._dispatch.get(transformer_key)
+        if transformer is None:
+            if len(self._dispatch) >= _DISPATCH_CACHE_LIMIT:
+                self._dispatch.clear()
+
+            transformer = self._resolve(*transformer_key)
+            self._dispatch[transformer_key] = transformer
+        return transformer(data)
 
     def transform_gen(self, data_items: typing.Iterable[BaseModel], item_type: Type[BaseModel]) -> Generator[BaseModel]:
         if not data_items:
@@ -313,11 +460,13 @@ class BaseDataTransformer:
         return list(self.transform_gen(data_items, item_type))
 
     def register(self, in_type: Any, out_type: Any, transformer: Callable):
+        self._dispatch.clear()
+
         if in_type == typing.Any:
-            self._from_any_transformers[str(out_type)] = transformer
+            self._from_any_transformers[out_type] = transformer
             return
 
-        self._transformers[(str(in_type), str(out_type))] = transformer
+        self._transformers[(in_type, out_type)] = transformer
 
 
 class PipelineStep(StepProcessingMixin):
@@ -328,20 +477,58 @@ class PipelineStep(StepProcessingMixin):
                  pre_collected_batch_size: Optional[int] = -1,
                  transformer: Optional[BaseDataTransformer] = BaseDataTransformer(),
                  attr_mapping: Optional[dict] = None,
-                 in_item_type: Optional[Type[BaseData]] = None):
+                 in_item_type: Optional[Type[BaseData]] = None,
+                 concurrency: Optional[int] = None,
+                 pre_collected_linger: Optional[float] = None,
+                 broadcast_buffer_size: int = PIPELINE_BROADCAST_BUFFER_SIZE,
+                 cache: Optional[StepCache] = None):
+        """
+        :param processor: обработчик шага
+        :param pre_collected: шаг обрабатывает элементы пачками
+        :param pre_collected_batch_size: размер пачки (-1 - все элементы)
+        :param transformer: преобразователь типов элементов
+        :param attr_mapping: соответствие аргументов обработчиков дочерних шагов полям элементов
+        :param in_item_type: тип входных элементов (обязателен для pre_collected шагов)
+        :param concurrency: максимальное число одновременных запусков шага
+                            (элементов вместе с дочерними шагами или пачек для pre_collected шагов);
+                            None - без ограничения
+        :param pre_collected_linger: максимальное время (с) ожидания заполнения пачки,
+                                     после которого неполная пачка отправляется на обработку
+        :param broadcast_buffer_size: размер буфера каждого потребителя при раздаче
+                                      результатов шага в дочерние pre_collected шаги
+        :param cache: мемоизация результатов шага (режим задается на запрос через meta[CACHE_MODE_KEY])
+        """
         super().__init__(transformer)
 
         if pre_collected and in_item_type is None:
             raise ValueError("Input item type must be defined for 'pre_collected' steps")
 
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("Step concurrency must be positive")
+
+        if broadcast_buffer_size < 1:
+            raise ValueError("Broadcast buffer size must be positive")
+
+        if pre_collected and cache is not None:
+            raise ValueError("Cache is not supported for 'pre_collected' steps")
+
         self._processor_func = processor
         self._pre_collected = pre_collected
         self._pre_collected_batch_size = pre_collected_batch_size
+        self._pre_collected_linger = pre_collected_linger
         self._attr_mapping = attr_mapping
         self._in_item_type = in_item_type
+        self._broadcast_buffer_size = broadcast_buffer_size
+        self._cache = cache
 
         self._steps: List[PipelineStep] = []
         self._steps_with_pre_collection: List[PipelineStep] = []
+        self._plan: Optional[StepPlan] = None
+        self._result_fields: Optional[FrozenSet[str]] = None
+        self._keep_fields: FrozenSet[str] = frozenset()
+
+        self._concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency) if concurrency else None
 
     @property
     def processor(self):
@@ -367,6 +554,71 @@ class PipelineStep(StepProcessingMixin):
     def in_item_type(self):
         return self._in_item_type
 
+    @property
+    def concurrency(self) -> Optional[int]:
+        return self._concurrency
+
+    async def acquire_slot(self):
+        if self._slots is not None:
+            await self._slots.acquire()
+
+    def release_slot(self, *_):
+        if self._slots is not None:
+            self._slots.release()
+
+    @property
+    def plan(self) -> StepPlan:
+        if self._plan is None:
+            self._plan = self.compile(self._result_fields, self._keep_fields)
+        return self._plan
+
+    def _compile_steps(self, steps: List[PipelineStep]) -> Tuple[CompiledStep, ...]:
+        return tuple(CompiledStep(step, ArgBinding(step.processor, self._attr_mapping))
+                     for step in steps)
+
+    def _branches(self) -> List[Tuple[CompiledStep, FrozenSet[str]]]:
+        """ Дочерние шаги и поля, которые читает ветвь каждого из них (рекурсивно) """
+        branches = []
+        for compiled_step in self._compile_steps(self._steps):
+            fields = frozenset(compiled_step.binding.source_names) | compiled_step.step.required_fields()
+            branches.append((compiled_step, fields))
+        for compiled_step in self._compile_steps(self._steps_with_pre_collection):
+            fields = frozenset(compiled_step.binding.source_names) | compiled_step.step.required_fields()
+            branches.append((compiled_step, fields | frozenset(compiled_step.step.in_item_type.__fields__)))
+        return branches
+
+    def required_fields(self) -> FrozenSet[str]:
+        """ Поля элементов, которые читают дочерние шаги (рекурсивно) """
+        return frozenset().union(*(fields for _, fields in self._branches()))
+
+    def compile(self,
+                result_fields: Optional[FrozenSet[str]] = None,
+                keep_fields: FrozenSet[str] = frozenset()) -> StepPlan:
+        """ Скомпилировать план запуска дочерних шагов (рекурсивно)
+
+        :param result_fields: поля результата пайплайна (None - сохранять все поля элементов)
+        :param keep_fields: поля, которые читают соседние ветви шага и ветви его предков
+        """
+        self._result_fields = result_fields
+        self._keep_fields = keep_fields
+        branches = self._branches()
+
+        for idx, (compiled_step, _) in enumerate(branches):
+            # метаданные элемента общие для всех ветвей: ветвь не удаляет поля, которые еще прочитают соседние
+            sibling_fields = frozenset().union(*(fields for other_idx, (_, fields) in enumerate(branches)
+                                                 if other_idx != idx))
+            compiled_step.step.compile(result_fields, keep_fields | sibling_fields)
+
+        self._plan = StepPlan(steps=tuple(compiled_step for compiled_step, _ in branches
+                                          if not compiled_step.step.pre_collected),
+                              pre_collected_steps=tuple(compiled_step for compiled_step, _ in branches
+                                                        if compiled_step.step.pre_collected),
+                              broadcast_buffer_size=self._broadcast_buffer_size,
+                              required_fields=frozenset().union(*(fields for _, fields in branches)),
+                              result_fields=result_fields,
+                              keep_fields=keep_fields)
+        return self._plan
+
     @staticmethod
     async def _make_async_gen(obj: Union[List, Generator, AsyncGenerator, BaseModel, Dict]) -> Any:
         if isasyncgen(obj):
@@ -392,41 +644,89 @@ class PipelineStep(StepProcessingMixin):
         # преобразуем в асинхронный генератор
         return self._make_async_gen(results)
 
+    async def _run_cached_processor_func(self, meta: Optional[Dict[str, Any]], **kwargs) -> AsyncGenerator:
+        cache_mode = CacheMode.from_meta(meta)
+        cache_key = None
+        if cache_mode != CacheMode.BYPASS:
+            cache_key = self._cache.key(kwargs)
+
+        if cache_key is None:
+            return await self._run_processor_func(**kwargs)
+
+        if cache_mode == CacheMode.USE:
+            items = await self._cache.load(cache_key, kwargs)
+            if items is not None:
+                return self._make_async_gen(items)
+
+        items = [item async for item in await self._run_processor_func(**kwargs)]
+        # результаты с ошибками не сохраняются
+        if all(item.status.code == StatusCodes.OK.code for item in items):
+            await self._cache.store(cache_key, items)
+        return self._make_async_gen(items)
+
+    async def _run_batch(self, data_batch: List[BaseData], results: asyncio.Queue, *args, **kwargs):
+        batch_results = await self._run_processor_func(data_batch, *args, **kwargs)
+        async for item in batch_results:
+            await results.put(item)
+
+    async def _dispatch_batches(self, data: AsyncGenerator, results: asyncio.Queue, *args, **kwargs):
+        tasks = set()
+        # исключения пачек, завершившихся до ожидания всех задач (их задачи уже удалены из tasks)
+        errors = []
+
+        def on_batch_done(task: asyncio.Task):
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        try:
+            data_batches = async_grouper(data, self._pre_collected_batch_size, self._pre_collected_linger)
+            async for data_batch in data_batches:
+                # пачка отправляется на обработку сразу после заполнения
+                await self.acquire_slot()
+                if errors:
+                    self.release_slot()
+                    raise errors[0]
+                task = asyncio.create_task(self._run_batch(data_batch, results, *args, **kwargs))
+                task.add_done_callback(self.release_slot)
+                task.add_done_callback(on_batch_done)
+                tasks.add(task)
+
+            await asyncio.gather(*tasks)
+            if errors:
+                raise errors[0]
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await results.put(_BATCHES_DONE)
+
     async def _run_processor_in_batch(self, data: AsyncGenerator, *args, **kwargs) -> AsyncGenerator:
-        tasks = []
-        data_batches_iter = async_grouper(data, self._pre_collected_batch_size).__aiter__()
-        cur_future = asyncio.ensure_future(data_batches_iter.__anext__())
-        while True:
-            try:
-                done, _ = await asyncio.wait([cur_future], timeout=0.05)
-                if not done:
-                    raise asyncio.TimeoutError()
-
-                data_batch = list(done)[0].result()
-                task = asyncio.create_task(self._run_processor_func(data_batch, *args[1:], **kwargs))
-                tasks.append(task)
-                cur_future = asyncio.ensure_future(data_batches_iter.__anext__())
-            except (asyncio.TimeoutError, StopAsyncIteration):
-                pass
-
-            if not tasks:
-                if cur_future.done():
+        results = asyncio.Queue()
+        dispatcher = asyncio.create_task(self._dispatch_batches(data, results, *args[1:], **kwargs))
+        try:
+            # результаты выдаются сразу, как только их вернул обработчик любой из пачек
+            while True:
+                item = await results.get()
+                if item is _BATCHES_DONE:
                     break
-                continue
-
-            # проверяем готовые результаты
-            done_tasks, pending_tasks = await asyncio.wait(tasks, timeout=0.05)
-            for finished_task in done_tasks:
-                batch_results = await finished_task
-                async for item in batch_results:
-                    yield item
+                yield item
 
-            tasks = list(pending_tasks)
+            # пробрасываем исключения обработки пачек
+            await dispatcher
+        finally:
+            dispatcher.cancel()
 
     async def process(self,
                       *args,
                       meta: Optional[Dict[str, Any]] = None,
+                      on_item_done: Optional[ItemCallback] = None,
                       **kwargs) -> List[BaseData]:
+        """
+        :param on_item_done: вызывается для каждого элемента, как только завершены все его дочерние шаги;
+                             такие элементы не возвращаются в общем списке
+        """
         if self._pre_collected:
             data = args[0]
             if not args or not (isinstance(data, list) or inspect.isasyncgen(data)):
@@ -436,18 +736,20 @@ class PipelineStep(StepProcessingMixin):
 
             data = self._transform_gen(data, self)
             results = self._run_processor_in_batch(data, *args, **kwargs)
+        elif self._cache is not None and not args:
+            results = await self._run_cached_processor_func(meta, **kwargs)
         else:
             results = await self._run_processor_func(*args, **kwargs)
 
         return await self._run_dependent_steps(
             data=results,
             meta=meta,
-            steps=self._steps,
-            steps_with_pre_collection=self._steps_with_pre_collection,
-            attr_mapping=self._attr_mapping
+            plan=self.plan,
+            on_item_done=on_item_done
         )
 
     def add_next_step(self, step: PipelineStep) -> PipelineStep:
+        self._plan = None
         if step._pre_collected:
             self._steps_with_pre_collection.append(step)
         else:
@@ -476,6 +778,20 @@ class Pipeline(StepProcessingMixin):
         self._in_item_type = in_item_type
         self._out_item_type = out_item_type
 
+        self._initial_binding = ArgBinding(initial_step.processor)
+        self.compile()
+
+    def compile(self) -> StepPlan:
+        """ Скомпилировать дерево шагов в план запуска
+
+        Если тип результата известен, поля элементов, не входящие в результат,
+        хранятся только до последнего шага, который их читает
+        """
+        result_fields = None
+        if self._out_item_type is not None:
+            result_fields = frozenset(self._out_item_type.__fields__)
+        return self._initial_step.compile(result_fields)
+
     @staticmethod
     def _merge_with_results(data_items: List[BaseData],
                             results: List[BaseData]) -> List[BaseData]:
@@ -491,7 +807,7 @@ class Pipeline(StepProcessingMixin):
         return new_items
 
     def _init_meta(self, meta: Dict[str, Any], data_items: List[BaseData]) -> Dict[str, Any]:
-        data_items_dict = {item.key_: self.get_fields_as_dict(item)
+        data_items_dict = {item.key_: dict(fields_as_dict(item))
                            for item in data_items}
 
         if meta is None:
@@ -506,16 +822,54 @@ class Pipeline(StepProcessingMixin):
             data_items = self._transformer.transform_list(data_items, self._in_item_type)
 
         meta = self._init_meta(meta, data_items)
-        attrs = self._get_func_args(self._initial_step.processor)
-        attr_dict = self._get_attributes(meta, attrs)
+        attr_dict = self._initial_binding.bind(meta)
         results = await self._initial_step.process(data_items, meta=meta, **attr_dict)
 
         if self._out_item_type is not None:
             results = self._transformer.transform_list(results, self._out_item_type)
         return results
 
+    async def start_gen(self,
+                        data_items: List[BaseModel],
+                        meta: Dict[str, Any] = None) -> AsyncGenerator[OutType, None]:
+        """ Запустить пайплайн и выдавать результаты по мере завершения обработки элементов
+
+        Результат выдается, как только завершена ветка шагов элемента, и после этого
+        не хранится в пайплайне. Порядок результатов - порядок завершения
+        """
+        if self._in_item_type is not None:
+            data_items = self._transformer.transform_list(data_items, self._in_item_type)
+
+        meta = self._init_meta(meta, data_items)
+        attr_dict = self._initial_binding.bind(meta)
+
+        done_items = asyncio.Queue()
+        task = asyncio.create_task(self._initial_step.process(data_items,
+                                                              meta=meta,
+                                                              on_item_done=done_items.put_nowait,
+                                                              **attr_dict))
+        task.add_done_callback(lambda _: done_items.put_nowait(_PIPELINE_DONE))
+        try:
+            while True:
+                item = await done_items.get()
+                if item is _PIPELINE_DONE:
+                    break
+
+                if self._out_item_type is not None:
+                    item = self._transformer.transform(item, self._out_item_type)
+                yield item
+
+            # пробрасываем исключения обработки
+            await task
+        finally:
+            task.cancel()
+
     def add_next_step(self, step: PipelineStep) -> PipelineStep:
-        return self._initial_step.add_next_step(step)
+        step = self._initial_step.add_next_step(step)
+        self.compile()
+        return step
 
     def add_branch(self, *steps: PipelineStep) -> PipelineStep:
-        return self._initial_step.add_branch(*steps)
+        step = self._initial_step.add_branch(*steps)
+        self.compile()
+        return step
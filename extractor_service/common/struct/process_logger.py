@@ -1,29 +1,230 @@
 import logging
+import os
+from itertools import islice
 from logging.handlers import QueueHandler as LoggingQueueHandler
 from multiprocessing import Process, get_context, current_process, Queue
 from queue import Empty, Full   # noqa
+from threading import Thread
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
 
+from pydantic import BaseModel as PydanticBaseModel
+
+from extractor_service.common.env.general import LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_SEC, LOG_QUEUE_MAX_BATCHES, \
+    LOG_DEBUG_SAMPLE_RATE, LOG_MAX_MESSAGE_LENGTH, LOG_SUMMARY_MAX_ITEMS
+from extractor_service.common.struct.metrics import Counter, MetricsRegistry
 from utils.aes_utils.common import set_logging
 
+# глубина вложенности и длина строк в summarize()
+SUMMARY_MAX_DEPTH = 5
+SUMMARY_MAX_STR_LENGTH = 200
+
+
+def _shorten(text: str, max_length: int) -> str:
+    if len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}... (+{len(text) - max_length} chars)"
+
+
+def _render(value: Any, max_items: int, depth: int = 0) -> str:
+    if isinstance(value, PydanticBaseModel):
+        if depth >= SUMMARY_MAX_DEPTH:
+            return f"{type(value).__name__}(...)"
+        fields = ", ".join(f"{name}={_render(field, max_items, depth + 1)}" for name, field in value.__dict__.items())
+        return f"{type(value).__name__}({fields})"
+
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        if depth >= SUMMARY_MAX_DEPTH:
+            return f"<{type(value).__name__} of {len(value)}>"
+        if isinstance(value, dict):
+            items = [f"{_render(key, max_items, depth + 1)}: {_render(item, max_items, depth + 1)}"
+                     for key, item in islice(value.items(), max_items)]
+        else:
+            items = [_render(item, max_items, depth + 1) for item in islice(value, max_items)]
+        if len(value) > max_items:
+            items.append(f"... (+{len(value) - max_items})")
+        brackets = "{}" if isinstance(value, (dict, set, frozenset)) else "[]"
+        return brackets[0] + ", ".join(items) + brackets[1]
+
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str):
+        return repr(_shorten(value, SUMMARY_MAX_STR_LENGTH))
+    return _shorten(repr(value), SUMMARY_MAX_STR_LENGTH)
+
+
+class Summary:
+    """ Краткое представление значения для лога: строится только при форматировании записи """
+
+    __slots__ = ("_value", "_max_items")
+
+    def __init__(self, value: Any, max_items: int):
+        self._value = value
+        self._max_items = max_items
+
+    def __str__(self) -> str:
+        return _render(self._value, self._max_items)
+
+
+def summarize(value: Any, max_items: int = LOG_SUMMARY_MAX_ITEMS) -> Summary:
+    """ Аргумент записи лога с большим значением (сообщение с тысячами контейнеров и т.п.)
+
+    Коллекции сокращаются до max_items элементов с числом остальных, длинные строки обрезаются,
+    bytes заменяются размером:
+
+        logger.debug("Msg: %s", summarize(msg))
+    """
+    return Summary(value, max_items)
+
+
+class SamplingFilter(logging.Filter):
+    """ Пропускает первую и далее каждую rate-ю из записей DEBUG одного логера с одним шаблоном сообщения
+
+    Шаблон - record.msg, поэтому выборка работает для отложенного форматирования ("... %s", arg)
+    """
+
+    # при большем числе шаблонов счетчики сбрасываются
+    MAX_KEYS = 10000
+
+    def __init__(self, rate: int, sampled_out: Optional[Counter] = None):
+        super().__init__()
+        self._rate = rate
+        self._sampled_out = sampled_out or Counter()
+        self._counts: Dict[Tuple[str, Any], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        count = self._counts.get(key, 0)
+        if not count and len(self._counts) >= self.MAX_KEYS:
+            self._counts.clear()
+        self._counts[key] = count + 1
+
+        if count % self._rate == 0:
+            return True
+        self._sampled_out.inc()
+        return False
+
 
 class QueueHandler(LoggingQueueHandler):
+    """ Передача записей в процесс логирования пачками
+
+    Записи копятся в буфере процесса и отправляются одним сообщением очереди: при заполнении пачки,
+    по таймеру потока отправки или сразу, если в пачке есть запись WARNING и выше. При заполненной
+    очереди пачка отбрасывается: число потерянных записей учитывается в метрике logging.dropped
+    и сообщается предупреждением в следующей пачке.
+
+    Метрики (в metrics): logging.batches, logging.dropped, logging.sampled_out
+    """
+
+    def __init__(self,
+                 queue: Queue,
+                 metrics: Optional[MetricsRegistry] = None,
+                 batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval_sec: float = LOG_FLUSH_INTERVAL_SEC,
+                 debug_sample_rate: int = LOG_DEBUG_SAMPLE_RATE,
+                 max_message_length: int = LOG_MAX_MESSAGE_LENGTH):
+        """
+        :param metrics: реестр метрик процесса (None - метрики не собираются)
+        :param debug_sample_rate: доля передаваемых повторяющихся записей DEBUG, 1/N (1 - все)
+        :param max_message_length: сообщения длиннее обрезаются (кроме записей с исключением)
+        """
+        super().__init__(queue)
+        metrics = metrics or MetricsRegistry()
+        self._batch_size = batch_size
+        self._flush_interval_sec = flush_interval_sec
+        self._max_message_length = max_message_length
+
+        self._batches = metrics.counter("logging.batches")
+        self._dropped = metrics.counter("logging.dropped")
+        if debug_sample_rate > 1:
+            self.addFilter(SamplingFilter(debug_sample_rate, metrics.counter("logging.sampled_out")))
+
+        self._buffer: List[logging.LogRecord] = []
+        self._unreported_drops = 0
+        self._closed = False
+        # процесс, в котором запущен поток отправки (обработчик наследуется процессами ресурсов при fork)
+        self._flusher_pid: Optional[int] = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        has_exc = record.exc_info is not None
+        record = super().prepare(record)
+        if not has_exc and len(record.msg) > self._max_message_length:
+            record.msg = record.message = _shorten(record.msg, self._max_message_length)
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # вызывается под self.lock (logging.Handler.handle)
+        try:
+            record = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._start_flusher()
+        self._buffer.append(record)
+        if len(self._buffer) >= self._batch_size or record.levelno >= logging.WARNING:
+            self._send()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._send()
+
+    def close(self) -> None:
+        self.flush()
+        self._closed = True
+        super().close()
+
+    def _start_flusher(self):
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        # в дочернем процессе буфер - копия записей родителя, их отправит родитель
+        self._buffer.clear()
+        self._unreported_drops = 0
+        self._flusher_pid = pid
+        Thread(target=self._flush_routine, name="log-flusher", daemon=True).start()
+
+    def _flush_routine(self):
+        while not self._closed:
+            sleep(self._flush_interval_sec)
+            self.flush()
+
+    def _send(self):
+        if not self._buffer:
+            return
 
-    def enqueue(self, record: logging.LogRecord) -> None:
+        batch, self._buffer = self._buffer, []
+        records = len(batch)
+        if self._unreported_drops:
+            batch.insert(0, logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": logging.getLevelName(logging.WARNING),
+                "msg": f"Dropped {self._unreported_drops} log records: logger queue is full",
+            }))
         try:
-            self.queue.put_nowait(record)
-        except Full:
-            pass
+            self.queue.put_nowait(batch)
+        except (Full, ValueError):
+            self._dropped.inc(records)
+            self._unreported_drops += records
+        else:
+            self._batches.inc()
+            self._unreported_drops = 0
 
 
 class ProcessLogger(Process):
 
-    def __init__(self, name: str, config: dict):
+    def __init__(self, name: str, config: dict, max_batches: int = LOG_QUEUE_MAX_BATCHES):
+        """
+        :param max_batches: размер очереди в пачках записей (QueueHandler)
+        """
         super().__init__(name=name, daemon=True)
         self.name = name
         self.config = config
 
         self._proc_ctx = get_context("forkserver")
-        self._queue = Queue()
+        self._queue = Queue(maxsize=max_batches)
 
         self.start()
 
@@ -36,7 +237,8 @@ class ProcessLogger(Process):
         logger = logging.getLogger(self.name)
 
         proc = current_process()
-        logger.debug(f"Start logger process: {proc.pid}")
+        logger.debug("Start logger process: %d", proc.pid)
         while True:
-            message: logging.LogRecord = self._queue.get()
-            logger.handle(message)
+            records: List[logging.LogRecord] = self._queue.get()
+            for record in records:
+                logger.handle(record)
@@ -18,6 +18,8 @@ from utils.status import StatusCodes
 class Command(str, Enum):
     PROCESS = "process"
     STOP = "stop"
+    MEMORY_SNAPSHOT = "memory_snapshot"
+    METRICS = "metrics"
 
 
 BaseInData = TypeVar("BaseInData", bound=BaseModel)
@@ -28,12 +30,16 @@ class BaseInQueueMsg(BaseModel):
     uuid: str = str(uuid4())
     cmd: Command = Command.PROCESS
     data: Optional[BaseInData]
+    # очередь ответов (канал) процесса-отправителя
+    reply_to: int = 0
 
 
 class BaseOutQueueMsg(BaseModel):
     uuid: str
     data: Optional[BaseOutData]
     status: Status = Status.make_status(status=StatusCodes.OK)
+    # часть потокового результата: за сообщением последуют другие с тем же uuid
+    partial: bool = False
 
 
 ModelType = TypeVar('ModelType')
@@ -1,6 +1,7 @@
-from typing import Dict, TypeVar, Tuple
+from typing import Dict, TypeVar, Tuple, List
 
-from extractor_service.resource_models.base_resource_model import BaseProxyModel, BaseResourceModel
+from extractor_service.common.env.resources import CONTROL_COMMAND_TIMEOUT_SEC
+from extractor_service.resource_models.base_resource_model import BaseProxyModel, BaseResourceModel, ControlProxy
 
 
 ProxyModel = TypeVar("ProxyModel", bound=BaseProxyModel)
@@ -10,6 +11,16 @@ class ResourceManager:
 
     def __init__(self):
         self._resource_models: Dict[str, BaseResourceModel] = {}
+        # канал ответов ресурсов для прокси этого процесса (номер процесса API)
+        self._reply_to = 0
+
+    def bind_reply_channel(self, reply_to: int):
+        """ Получать ответы ресурсов через очередь канала reply_to
+
+        Вызывается в процессе API, получившем копию менеджера: реплики ресурсов
+        по-прежнему принадлежат процессу, который их запустил
+        """
+        self._reply_to = reply_to
 
     def get_resource(self, name: str) -> ProxyModel:
         """ Зарегистрировать ресурс
@@ -19,7 +30,38 @@ class ResourceManager:
         """
         if name not in self._resource_models:
             raise ValueError(f"No resource registered with name '{name}'")
-        return self._resource_models[name].proxy
+        return self._resource_models[name].get_proxy(self._reply_to)
+
+    def get_control_proxy(self, name: str, timeout_sec: float = CONTROL_COMMAND_TIMEOUT_SEC) -> ControlProxy:
+        """ Получить прокси для служебных команд ресурса
+
+        :param name: название ресурса
+        :param timeout_sec: время ожидания ответов реплик
+        :return: прокси, рассылающий команды всем репликам ресурса
+        """
+        if name not in self._resource_models:
+            raise ValueError(f"No resource registered with name '{name}'")
+
+        resource_model = self._resource_models[name]
+        in_queue, _ = resource_model.queues
+        return ControlProxy(in_queue,
+                            resource_model.reply_queue(self._reply_to),
+                            resource_model.in_msg_type,
+                            resource_model.replicas,
+                            self._reply_to,
+                            name=name,
+                            timeout_sec=timeout_sec)
+
+    def drain_replies(self, reply_to: int) -> int:
+        """ Отбросить непрочитанные ответы всех ресурсов в канале reply_to (перед перезапуском процесса API)
+
+        :return: число отброшенных ответов
+        """
+        return sum(model.drain_replies(reply_to) for model in self._resource_models.values())
+
+    @property
+    def resource_names(self) -> List[str]:
+        return list(self._resource_models)
 
     def register(self, name, resource_model: BaseResourceModel):
         """ Зарегистрировать ресурс """
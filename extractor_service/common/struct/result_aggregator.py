@@ -0,0 +1,186 @@
+import asyncio
+import uuid
+from io import BytesIO
+from typing import Dict, List, Optional, Set
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.func.serialization import dumps
+from extractor_service.common.struct.data_storage.compression import COMPRESSION_NONE, COMPRESSIONS, ENCODING_GZIP, \
+    ENCODING_ZSTD
+from extractor_service.common.struct.model.abbreviation_extractor import CreatedS3Object
+from utils.status import StatusCodes
+
+# ключ метаданных запроса со сборщиком результатов
+RESULT_AGGREGATOR_KEY = "result_aggregator"
+
+_KEY_SUFFIXES = {
+    COMPRESSION_NONE: ".jsonl",
+    ENCODING_GZIP: ".jsonl.gz",
+    ENCODING_ZSTD: ".jsonl.zst",
+}
+
+
+class _Part:
+    """ Собираемый объект JSONL """
+
+    __slots__ = ("bucket_name", "s3_key", "lines", "keys", "size")
+
+    def __init__(self, bucket_name: str, s3_key: str):
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.lines: List[bytes] = []
+        self.keys: List[str] = []
+        self.size = 0
+
+    def append(self, key: str, line: bytes):
+        self.lines.append(line)
+        self.keys.append(key)
+        self.size += len(line)
+
+
+class ResultAggregator:
+    """ Сборка результатов запроса в общие объекты JSONL
+
+    Каждый результат - строка {"container_id": ..., "expansions": ...}. Объект выгружается,
+    когда в нем набирается max_items строк, остаток - при закрытии (close).
+    Результаты разных бакетов собираются в разные объекты.
+    Ключ и номер строки результату назначаются сразу, поэтому шаг выгрузки
+    не ждет, пока объект заполнится
+    """
+
+    def __init__(self,
+                 contents_loader,
+                 max_items: int,
+                 compression: str = COMPRESSION_NONE,
+                 key_prefix: str = ""):
+        """
+        :param contents_loader: загрузчик, через который выгружаются объекты (S3ContentsLoader)
+        :param max_items: максимальное число результатов в одном объекте
+        :param compression: сжатие объектов ('none', 'gzip', 'zstd')
+        :param key_prefix: префикс ключей объектов
+        """
+        if max_items < 1:
+            raise ValueError("Aggregated object must hold at least one item")
+
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported result compression: '{compression}'")
+
+        self._contents_loader = contents_loader
+        self._max_items = max_items
+        self._compression = compression
+        self._key_suffix = _KEY_SUFFIXES[compression]
+        self._key_prefix = f"{key_prefix}{uuid.uuid4()}"
+
+        self._parts: Dict[str, _Part] = {}
+        self._part_count = 0
+        self._uploads: Set[asyncio.Task] = set()
+        # ключи результатов, объекты которых выгрузить не удалось
+        self._failed_keys: Set[str] = set()
+
+        metrics = aes_globals.metrics
+        self._objects = metrics.counter("result_upload.aggregated.objects")
+        self._items = metrics.counter("result_upload.aggregated.items")
+        self._bytes = metrics.counter("result_upload.aggregated.bytes")
+
+    @property
+    def failed_keys(self) -> Set[str]:
+        return self._failed_keys
+
+    @staticmethod
+    def make_line(container_id: Optional[str], result: bytes) -> bytes:
+        # переводы строк в JSON могут быть только форматированием (в строках они экранируются),
+        # поэтому их удаление не меняет результат и делает его одной строкой
+        return b"".join((
+            b'{"container_id":', dumps(container_id),
+            b',"expansions":', result.replace(b"\n", b""), b"}\n"
+        ))
+
+    def _new_part(self, bucket_name: str) -> _Part:
+        self._part_count += 1
+        s3_key = f"{self._key_prefix}/{self._part_count:05d}{self._key_suffix}"
+        part = _Part(bucket_name, s3_key)
+        self._parts[bucket_name] = part
+        return part
+
+    async def add(self,
+                  content_id: str,
+                  file_data: BytesIO,
+                  bucket_name: str,
+                  container_id: Optional[str] = None) -> CreatedS3Object:
+        """ Добавить результат в объект JSONL
+
+        :param content_id: ключ элемента
+        :param file_data: результат (JSON)
+        :param bucket_name: бакет для выгрузки
+        :param container_id: идентификатор контейнера (сохраняется в строке результата)
+        :return: объект и положение в нем строки результата
+        """
+        line = self.make_line(container_id, file_data.getvalue())
+
+        part = self._parts.get(bucket_name)
+        if part is None:
+            part = self._new_part(bucket_name)
+
+        result = CreatedS3Object.construct(key_=content_id,
+                                           bucket_name=bucket_name,
+                                           s3_key=part.s3_key,
+                                           line_index=len(part.lines),
+                                           offset=part.size)
+        part.append(content_id, line)
+        self._items.inc()
+
+        if len(part.lines) >= self._max_items:
+            del self._parts[bucket_name]
+            # объект выгружается в фоне: результат уже не зависит от выгрузки,
+            # а ошибки собираются в failed_keys
+            task = asyncio.create_task(self._upload(part))
+            self._uploads.add(task)
+            task.add_done_callback(self._uploads.discard)
+        return result
+
+    async def _upload(self, part: _Part):
+        body = b"".join(part.lines)
+        part.lines.clear()
+
+        created = await self._contents_loader.put_content(content_id=part.s3_key,
+                                                          file_data=BytesIO(body),
+                                                          bucket_name=part.bucket_name,
+                                                          data_length=len(body),
+                                                          file_type=S3ContentType.JSON_LINES,
+                                                          compression=self._compression)
+        if created.status.code != StatusCodes.OK.code:
+            self._failed_keys.update(part.keys)
+            return
+
+        self._objects.inc()
+        self._bytes.inc(len(body))
+
+    async def close(self) -> Set[str]:
+        """ Выгрузить неполные объекты и дождаться всех выгрузок
+
+        :return: ключи результатов, которые выгрузить не удалось
+        """
+        parts = list(self._parts.values())
+        self._parts.clear()
+        await asyncio.gather(*self._uploads, *(self._upload(part) for part in parts))
+        return self._failed_keys
+
+    async def abort(self):
+        """ Отменить выгрузки (при ошибке обработки запроса) """
+        self._parts.clear()
+        for task in list(self._uploads):
+            task.cancel()
+        await asyncio.gather(*self._uploads, return_exceptions=True)
+
+
+async def aggregate_result(content_id: str,
+                           file_data: BytesIO,
+                           bucket_name: str,
+                           result_aggregator: ResultAggregator,
+                           container_id: Optional[str] = None) -> CreatedS3Object:
+    """ Шаг пайплайна: добавить результат в сборщик запроса (передается через meta[RESULT_AGGREGATOR_KEY]) """
+    return await result_aggregator.add(content_id=content_id,
+                                       file_data=file_data,
+                                       bucket_name=bucket_name,
+                                       container_id=container_id)
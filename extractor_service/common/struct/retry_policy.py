@@ -0,0 +1,200 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import extractor_service.common.globals as aes_globals
+from utils.aes_utils.exceptions import BaseAesException, CircuitOpenException
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+T = TypeVar("T")
+
+
+def is_transient(ex: BaseException) -> bool:
+    """ Может ли повторное обращение исправить ошибку
+
+    Повторяются только ошибки хранилища (код 5xx). Ошибки запроса (4xx, например, нет доступа),
+    содержимого (код >= 600, например, отсутствующий объект) и отказ разомкнутой цепи не повторяются
+    """
+    if isinstance(ex, CircuitOpenException):
+        return False
+    if isinstance(ex, BaseAesException):
+        return StatusCodes.INTERNAL_ERROR.code <= ex.status.code < StatusCodes.CONTENT_NOT_FOUND.code
+    return True
+
+
+class CircuitBreaker:
+    """ Размыкатель цепи
+
+    После failure_threshold неудач подряд цепь размыкается: обращения отклоняются
+    без попытки в течение reset_timeout_sec. Затем пропускается одна пробная попытка:
+    успех замыкает цепь, неудача снова размыкает
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self,
+                 failure_threshold: int,
+                 reset_timeout_sec: float,
+                 name: str,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param failure_threshold: число неудач подряд для размыкания (0 - цепь не размыкается)
+        :param reset_timeout_sec: время до пробной попытки, с
+        :param name: префикс метрик
+        :param clock: источник времени
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout_sec = reset_timeout_sec
+        self._clock = clock
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.
+        self._probe_in_flight = False
+
+        metrics = aes_globals.metrics
+        self._opened = metrics.counter(f"{name}.circuit.opened")
+        self._rejected = metrics.counter(f"{name}.circuit.rejected")
+        self._open_gauge = metrics.gauge(f"{name}.circuit.open")
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self._reset_timeout_sec:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """ Можно ли выполнить обращение (в полуоткрытом состоянии - только одно пробное) """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        self._rejected.inc()
+        return False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+        self._open_gauge.set(0)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._state == self.HALF_OPEN or 0 < self._failure_threshold <= self._failures:
+            self._open()
+
+    def release(self):
+        """ Обращение прервано без результата: пробную попытку можно повторить """
+        self._probe_in_flight = False
+
+    def _open(self):
+        if self._state != self.OPEN:
+            self._opened.inc()
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._open_gauge.set(1)
+
+
+class RetryPolicy:
+    """ Асинхронные повторы с экспоненциальной задержкой, бюджетом повторов и размыкателем цепи
+
+    Задержка перед n-й повторной попыткой выбирается случайно из [0, min(max_delay, base_delay * 2^n)),
+    чтобы клиенты не повторяли запросы одновременно. Бюджет - жетоны, общие для всех обращений:
+    неудача тратит жетон, успех возвращает budget_ratio жетона, и пока жетонов не больше половины,
+    повторы не выполняются. Так при массовом сбое повторы не умножают нагрузку на хранилище
+    """
+
+    def __init__(self,
+                 tries: int,
+                 base_delay: float,
+                 max_delay: float,
+                 budget_tokens: float,
+                 budget_ratio: float,
+                 name: str,
+                 circuit: Optional[CircuitBreaker] = None):
+        """
+        :param tries: максимальное число попыток
+        :param base_delay: задержка перед первой повторной попыткой, с
+        :param max_delay: максимальная задержка, с
+        :param budget_tokens: размер бюджета повторов, жетонов
+        :param budget_ratio: жетонов, возвращаемых успешным обращением
+        :param name: префикс метрик
+        :param circuit: размыкатель цепи (None - без него)
+        """
+        self._tries = max(tries, 1)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_tokens = budget_tokens
+        self._tokens = budget_tokens
+        self._budget_ratio = budget_ratio
+        self._circuit = circuit
+
+        metrics = aes_globals.metrics
+        self._retries = metrics.counter(f"{name}.retries")
+        self._throttled = metrics.counter(f"{name}.retries_throttled")
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    def _can_retry(self) -> bool:
+        return self._tokens > self._max_tokens / 2
+
+    def _on_success(self):
+        self._tokens = min(self._tokens + self._budget_ratio, self._max_tokens)
+        if self._circuit is not None:
+            self._circuit.record_success()
+
+    def _on_failure(self):
+        self._tokens = max(self._tokens - 1, 0)
+        if self._circuit is not None:
+            self._circuit.record_failure()
+
+    async def call(self,
+                   func: Callable[[], Awaitable[T]],
+                   retriable: Callable[[BaseException], bool] = is_transient) -> T:
+        """ Выполнить func, повторяя при ошибках, для которых retriable возвращает True
+
+        :raises CircuitOpenException: цепь разомкнута
+        :returns: результат func или последнее исключение
+        """
+        attempt = 0
+        while True:
+            if self._circuit is not None and not self._circuit.allow():
+                status = Status.make_status(status=StatusCodes.CONNECTION_ERROR,
+                                            message="Storage is unavailable, circuit is open")
+                raise CircuitOpenException(status=status)
+
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                if self._circuit is not None:
+                    self._circuit.release()
+                raise
+            except Exception as ex:
+                if not retriable(ex):
+                    # хранилище ответило, ошибка в самом запросе или содержимом
+                    if self._circuit is not None:
+                        self._circuit.record_success()
+                    raise
+
+                self._on_failure()
+                attempt += 1
+                if attempt >= self._tries:
+                    raise
+                if not self._can_retry():
+                    self._throttled.inc()
+                    raise
+            else:
+                self._on_success()
+                return result
+
+            self._retries.inc()
+            await asyncio.sleep(self._delay(attempt - 1))
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """ Объединение одновременных запросов с одинаковым ключом в один
+
+    Запрос выполняется отдельной задачей, поэтому отмена одного из ожидающих
+    не прерывает его для остальных
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    @staticmethod
+    def _consume_result(task: asyncio.Task):
+        # исключение забирается, даже если все ожидающие были отменены
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """ Выполнить func или дождаться уже выполняющегося запроса с тем же ключом
+
+        :return: результат и признак того, что использован чужой запрос
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            task.add_done_callback(self._consume_result)
+
+        return await asyncio.shield(task), shared
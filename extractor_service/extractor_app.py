@@ -1,4 +1,9 @@
+import asyncio
+import socket
+import time
 from contextlib import asynccontextmanager
+from multiprocessing import Process
+from typing import List, Optional
 
 import uvicorn
 from fastapi import FastAPI
@@ -8,14 +13,23 @@ import extractor_service.common.const.resources.tech_names as tech_names
 import extractor_service.common.globals as aes_globals
 import extractor_service.resource_models as rcm
 import extractor_service.technologies as tech
+from extractor_service.common.env.general import API_HOST, API_PORT, API_WORKERS, API_REUSE_PORT
 from extractor_service.common.env.tech.abbreviation_extraction import ABBREVIATION_DETECTOR_REPLICAS, \
-    EXPANSION_DETECTOR_REPLICAS, ABBREVIATION_DETECTION_TECH_REPLICAS
+    EXPANSION_DETECTOR_REPLICAS, ABBREVIATION_DETECTION_TECH_REPLICAS, JOB_STORE_PATH, JOBS_MAX_RUNNING, \
+    JOB_CHUNK_SIZE, JOB_PERSIST_BATCH_SIZE, JOB_RETENTION_SEC, JOB_WEBHOOK_TIMEOUT_SEC, JOB_WEBHOOK_TRIES, \
+    JOB_PURGE_PERIOD_SEC
+from extractor_service.common.struct.job_manager import JobManager
+from extractor_service.common.struct.job_store import JobStore, MEMORY_PATH
+from extractor_service.common.struct.resource_manager import ResourceManager
 from route import router
 from utils.aes_utils.async_service_app import run_async_service
 from utils.ut_logging import LOGGING_SECTION
 
 SERVICE_NAME = "extractor_service"
 
+# период проверки процессов API, с
+WORKERS_CHECK_PERIOD_SEC = 1
+
 app = None
 
 
@@ -35,11 +49,118 @@ def start_resource_manager():
     aes_globals.resource_manager.start()
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    yield  # Здесь можно добавить код инициализации перед запуском
-    aes_globals.service_logger.info("Shutting down resource manager...")
-    aes_globals.resource_manager.stop()
+def create_job_manager() -> JobManager:
+    return JobManager(aes_globals.resource_manager,
+                      store=JobStore(JOB_STORE_PATH or MEMORY_PATH),
+                      max_running=JOBS_MAX_RUNNING,
+                      chunk_size=JOB_CHUNK_SIZE,
+                      persist_batch_size=JOB_PERSIST_BATCH_SIZE,
+                      retention_sec=JOB_RETENTION_SEC,
+                      webhook_timeout_sec=JOB_WEBHOOK_TIMEOUT_SEC,
+                      webhook_tries=JOB_WEBHOOK_TRIES,
+                      purge_period_sec=JOB_PURGE_PERIOD_SEC)
+
+
+def create_app(owns_resources: bool = True, resume_jobs: bool = True, started_ts: Optional[float] = None) -> FastAPI:
+    """
+    :param owns_resources: процесс запустил реплики ресурсов и останавливает их при завершении
+    :param resume_jobs: возобновлять незавершенные задания
+    :param started_ts: время запуска сервиса (возобновляются задания, созданные до него)
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # незавершенные до перезапуска задания продолжаются
+        await aes_globals.job_manager.start(resume=resume_jobs, created_before=started_ts)
+        yield
+        aes_globals.service_logger.info("Stopping jobs...")
+        await aes_globals.job_manager.stop()
+        if owns_resources:
+            aes_globals.service_logger.info("Shutting down resource manager...")
+            aes_globals.resource_manager.stop()
+
+    fast_api_app = FastAPI(title=SERVICE_NAME, lifespan=lifespan)
+    fast_api_app.include_router(router, prefix="/api")
+    return fast_api_app
+
+
+def bind_reuse_port_socket(host: str, port: int) -> socket.socket:
+    """ Сокет процесса API: соединения между сокетами с SO_REUSEPORT распределяет ядро """
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(worker_idx: int,
+               config: dict,
+               resource_manager: ResourceManager,
+               log_queue,
+               started_ts: float,
+               shared_socket: Optional[socket.socket]):
+    """ Процесс API: свой цикл событий и сервер, ресурсы - общие, через унаследованный менеджер ресурсов
+
+    :param worker_idx: номер процесса (он же канал ответов ресурсов)
+    :param resource_manager: менеджер ресурсов основного процесса
+    :param log_queue: очередь процесса логирования
+    :param started_ts: время запуска сервиса
+    :param shared_socket: общий сокет (None - свой сокет с SO_REUSEPORT)
+    """
+    aes_globals.init_service_config(config)
+    aes_globals.init_service_logger(SERVICE_NAME, config, queue=log_queue)
+    aes_globals.service_logger.info("Start API worker %d", worker_idx)
+
+    resource_manager.bind_reply_channel(worker_idx)
+    aes_globals.resource_manager = resource_manager
+    aes_globals.job_manager = create_job_manager()
+
+    # задания, прерванные перезапуском, возобновляет один процесс
+    worker_app = create_app(owns_resources=False, resume_jobs=worker_idx == 0, started_ts=started_ts)
+    sock = shared_socket or bind_reuse_port_socket(API_HOST, API_PORT)
+    config_uvicorn = uvicorn.Config(app=worker_app, log_config=config[LOGGING_SECTION])
+    uvicorn.Server(config_uvicorn).run(sockets=[sock])
+
+
+async def serve_workers(config: dict, workers: int):
+    """ Запустить процессы API и перезапускать завершившиеся, пока сервис не остановлен """
+    started_ts = time.time()
+    shared_socket = None
+    if not API_REUSE_PORT:
+        shared_socket = uvicorn.Config(app=None, host=API_HOST, port=API_PORT).bind_socket()
+    if not JOB_STORE_PATH:
+        aes_globals.service_logger.warning("JOB_STORE_PATH is not set: jobs are visible only "
+                                           "in the API worker which accepted them")
+
+    def start_worker(worker_idx: int):
+        # процессы API, как и реплики ресурсов, создаются через fork: очереди ресурсов наследуются
+        proc = Process(target=run_worker,
+                       name=f"{SERVICE_NAME}.api.{worker_idx}",
+                       args=(worker_idx, config, aes_globals.resource_manager, aes_globals.log_queue,
+                             started_ts, shared_socket))
+        proc.start()
+        return proc
+
+    processes: List = [start_worker(worker_idx) for worker_idx in range(workers)]
+    aes_globals.service_logger.info("Started %d API workers on %s:%d", workers, API_HOST, API_PORT)
+    try:
+        while True:
+            await asyncio.sleep(WORKERS_CHECK_PERIOD_SEC)
+            for worker_idx, proc in enumerate(processes):
+                if proc.is_alive():
+                    continue
+                # ответы на запросы завершившегося процесса новому процессу не нужны
+                dropped = aes_globals.resource_manager.drain_replies(worker_idx)
+                aes_globals.service_logger.warning("API worker %d exited (code %s), restarting; "
+                                                   "dropped %d unread replies", worker_idx, proc.exitcode, dropped)
+                processes[worker_idx] = start_worker(worker_idx)
+    finally:
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.join()
+        aes_globals.resource_manager.stop()
 
 
 async def main(config: dict):
@@ -48,13 +169,19 @@ async def main(config: dict):
 
     start_resource_manager()
 
+    if API_WORKERS > 1:
+        # основной процесс только управляет репликами ресурсов и процессами API
+        await serve_workers(config, API_WORKERS)
+        return
+
+    aes_globals.job_manager = create_job_manager()
+
     global app
-    app = FastAPI(title=SERVICE_NAME, lifespan=lifespan)
-    app.include_router(router, prefix="/api")
+    app = create_app()
 
     config_uvicorn = uvicorn.Config(app=app,
-                                    host="0.0.0.0",
-                                    port=8080,
+                                    host=API_HOST,
+                                    port=API_PORT,
                                     log_config=config[LOGGING_SECTION])
 
     await uvicorn.Server(config_uvicorn).serve()
@@ -1,3 +1,6 @@
 # from .health_check import HealthCheckHandler
-from .abbreviation_extractor import AbbreviationsExtractorHandler
+from .abbreviation_extractor import AbbreviationsExtractorHandler, AbbreviationsTextExtractorHandler, \
+    AbbreviationsStreamExtractorHandler
+from .diagnostics import MemorySnapshotHandler, MetricsHandler
+from .jobs import AbbreviationsJobSubmitHandler, AbbreviationsJobStatusHandler
 
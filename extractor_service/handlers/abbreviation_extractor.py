@@ -1,16 +1,45 @@
 from time import time
-from typing import List
+from typing import AsyncGenerator, List
 
 import extractor_service.common.globals as aes_globals
 from extractor_service.common.const.resources.tech_names import ABBREVIATION_EXTRACTION
 from extractor_service.common.env.tech.abbreviation_extraction import ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE
-from extractor_service.common.struct.model.common import S3ContainerInfo as InternalS3ContainerInfo
+from extractor_service.common.func.serialization import dumps
+from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorS3Result, \
+    AbbreviationExtractorTextResult
+from extractor_service.common.struct.model.common import S3ContainerInfo as InternalS3ContainerInfo, \
+    TextContainerInfo as InternalTextContainerInfo
+from extractor_service.common.struct.process_logger import summarize
 from extractor_service.common.struct.resource_manager import ResourceManager
 from extractor_service.handlers.common import catch_internal_errors
 from extractor_service.technologies.abbreviation_extraction.abbreviation_extraction import Proxy as Extractor
+from utils.aes_utils.exceptions import BaseAesException
 from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionRequestMsg, S3ContainerInfo, \
-    AbbreviationExtractionResponseMsg, AbbreviationExtractionResultsData
-from utils.common import grouper
+    AbbreviationExtractionResponseMsg, AbbreviationExtractionResultsData, AbbreviationExtractionTextRequestMsg, \
+    AbbreviationExtractionTextResponseMsg, AbbreviationExtractionTextResultsData, TextContainerInfo, \
+    S3ObjectProcessed, TextProcessed, AbbreviationExtractionStreamSummary, ExtractionSummary
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+from utils.common import grouper, gc_paused
+
+
+def to_internal_containers(containers: List[S3ContainerInfo]) -> List[InternalS3ContainerInfo]:
+    """ Контейнеры запроса API как внутренние модели (бакет ответа по умолчанию - abbreviation_extractor) """
+    if not containers:
+        return []
+
+    default_bucket = "abbreviation_extractor"
+    if isinstance(containers[0], S3ContainerInfo):
+        # модели запроса уже провалидированы: поля переносятся как есть, без словарей и повторной валидации
+        with gc_paused():
+            return [
+                InternalS3ContainerInfo.from_model(item,
+                                                   key_=item.container_id,
+                                                   reply_bucket_name=item.reply_bucket_name or default_bucket)
+                for item in containers
+            ]
+    else:
+        raise ValueError()
 
 
 class AbbreviationsExtractorHandler:
@@ -18,43 +47,123 @@ class AbbreviationsExtractorHandler:
         self._tech: Extractor = resource_manager.get_resource(ABBREVIATION_EXTRACTION)
         self._logger = aes_globals.service_logger.getChild('handlers.abbreviation_extractor')
 
+    _transform_containers = staticmethod(to_internal_containers)
+
     @staticmethod
-    def _transform_containers(containers: List[S3ContainerInfo]) -> List[InternalS3ContainerInfo]:
-        if not containers:
-            return []
-
-        default_bucket = "abbreviation_extractor"
-        if isinstance(containers[0], S3ContainerInfo):
-            internal_containers = []
-            for item in containers:
-                if not item.reply_bucket_name:
-                    item.reply_bucket_name = default_bucket
-
-                internal_containers.append(
-                    InternalS3ContainerInfo.construct(**item.dict(by_alias=False))
+    def _transform_results(results: List[AbbreviationExtractorS3Result]) -> List[AbbreviationExtractionResponseMsg]:
+        with gc_paused():
+            return [
+                AbbreviationExtractionResponseMsg.construct_trusted(
+                    data=AbbreviationExtractionResultsData.construct_trusted(
+                        s3_objects=[S3ObjectProcessed.from_model(result) for result in batch]
+                    )
                 )
-            return internal_containers
-        else:
-            raise ValueError()
+                for batch in grouper(results, ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE)
+            ]
 
     @catch_internal_errors
     async def __call__(self, msg: AbbreviationExtractionRequestMsg) -> List[AbbreviationExtractionResponseMsg]:
-        self._logger.info(f"Msg: {msg}")
+        # сообщение с тысячами контейнеров - только в сокращенном виде и только для отладки
+        self._logger.info("Containers: %d", len(msg.data.s3_object_containers))
+        self._logger.debug("Msg: %s", summarize(msg))
         t0 = time()
 
         data = self._transform_containers(msg.data.s3_object_containers)
         results = await self._tech.handle(data=data,
-                                          language=msg.data.language)
-
-        resp_msg_list = [
-            AbbreviationExtractionResponseMsg(
-                data=AbbreviationExtractionResultsData(s3_objects=data)
-            )
-            for data in grouper(results, ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE)
-        ]
+                                          language=msg.data.language,
+                                          cache_mode=msg.data.cache_mode)
+
+        resp_msg_list = self._transform_results(results)
         t1 = time()
-        self._logger.info(f"Done ({(t1 - t0):.2f} s)")
+        self._logger.info("Done (%.2f s)", t1 - t0)
         return resp_msg_list
 
     async def func(self):
         await self()
+
+
+class AbbreviationsStreamExtractorHandler(AbbreviationsExtractorHandler):
+    """ Потоковый вариант /abbrev/extract: строка NDJSON на каждый контейнер по мере его обработки
+
+    Последняя строка - итог (AbbreviationExtractionStreamSummary). Код ответа отправляется до начала
+    обработки, поэтому ошибка запроса в целом передается в статусе итоговой строки
+    """
+
+    def __init__(self, resource_manager: ResourceManager):
+        super().__init__(resource_manager)
+        self._logger = aes_globals.service_logger.getChild('handlers.abbreviation_stream_extractor')
+
+    async def __call__(self, msg: AbbreviationExtractionRequestMsg) -> AsyncGenerator[bytes, None]:
+        self._logger.info("Containers: %d", len(msg.data.s3_object_containers))
+        self._logger.debug("Msg: %s", summarize(msg))
+        t0 = time()
+
+        summary = ExtractionSummary()
+        results = None
+        try:
+            data = self._transform_containers(msg.data.s3_object_containers)
+            results = self._tech.handle_stream(data=data,
+                                               language=msg.data.language,
+                                               cache_mode=msg.data.cache_mode)
+            async for result in results:
+                summary.total += 1
+                if result.status.code == StatusCodes.OK.code:
+                    summary.succeeded += 1
+                else:
+                    summary.failed += 1
+                yield dumps(S3ObjectProcessed.from_model(result).dict(by_alias=True)) + b"\n"
+        except Exception as e:
+            self._logger.exception("Error while streaming results")
+            if isinstance(e, BaseAesException):
+                summary.status = Status(**e.status.dict(by_alias=True))
+            else:
+                summary.status = Status.make_status(status=StatusCodes.INTERNAL_ERROR, message="Unknown error")
+        finally:
+            # при отключении клиента поток технологии закрывается сразу: ее оставшиеся результаты отбрасываются
+            if results is not None:
+                await results.aclose()
+
+        yield dumps(AbbreviationExtractionStreamSummary.construct_trusted(summary=summary).dict(by_alias=True)) + b"\n"
+        t1 = time()
+        self._logger.info("Done (%.2f s, %d containers)", t1 - t0, summary.total)
+
+
+class AbbreviationsTextExtractorHandler:
+    """ Расшифровка аббревиатур текстов, переданных в запросе: результат возвращается в ответе """
+
+    def __init__(self, resource_manager: ResourceManager):
+        self._tech: Extractor = resource_manager.get_resource(ABBREVIATION_EXTRACTION)
+        self._logger = aes_globals.service_logger.getChild('handlers.abbreviation_text_extractor')
+
+    @staticmethod
+    def _transform_containers(containers: List[TextContainerInfo]) -> List[InternalTextContainerInfo]:
+        with gc_paused():
+            return [InternalTextContainerInfo.from_model(item, key_=item.container_id) for item in containers]
+
+    @staticmethod
+    def _transform_results(results: List[AbbreviationExtractorTextResult]) \
+            -> List[AbbreviationExtractionTextResponseMsg]:
+        with gc_paused():
+            return [
+                AbbreviationExtractionTextResponseMsg.construct_trusted(
+                    data=AbbreviationExtractionTextResultsData.construct_trusted(
+                        texts=[TextProcessed.from_model(result) for result in batch]
+                    )
+                )
+                for batch in grouper(results, ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE)
+            ]
+
+    @catch_internal_errors
+    async def __call__(self, msg: AbbreviationExtractionTextRequestMsg) -> List[AbbreviationExtractionTextResponseMsg]:
+        self._logger.info("Texts: %d", len(msg.data.texts))
+        t0 = time()
+
+        data = self._transform_containers(msg.data.texts)
+        results = await self._tech.handle_texts(data=data,
+                                                language=msg.data.language,
+                                                cache_mode=msg.data.cache_mode)
+
+        resp_msg_list = self._transform_results(results)
+        t1 = time()
+        self._logger.info("Done (%.2f s)", t1 - t0)
+        return resp_msg_list
@@ -0,0 +1,48 @@
+import os
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.model.diagnostics import MemorySnapshotData, MetricsData
+from extractor_service.common.struct.resource_manager import ResourceManager
+
+
+class MemorySnapshotHandler:
+    def __init__(self, resource_manager: ResourceManager):
+        self._resource_manager = resource_manager
+        self._logger = aes_globals.service_logger.getChild('handlers.diagnostics')
+
+    async def __call__(self,
+                       resource_name: str,
+                       top: int = 20,
+                       key_type: str = "lineno",
+                       with_diff: bool = True,
+                       with_types: bool = False,
+                       stop: bool = False) -> List[MemorySnapshotData]:
+        if resource_name not in self._resource_manager.resource_names:
+            raise HTTPException(status_code=404, detail=f"Resource '{resource_name}' is not registered")
+
+        self._logger.info("Memory snapshot requested for '%s'", resource_name)
+        control = self._resource_manager.get_control_proxy(resource_name)
+        return await control.memory_snapshot(top=top,
+                                             key_type=key_type,
+                                             with_diff=with_diff,
+                                             with_types=with_types,
+                                             stop=stop)
+
+
+class MetricsHandler:
+    def __init__(self, resource_manager: ResourceManager):
+        self._resource_manager = resource_manager
+
+    async def __call__(self, resource_name: Optional[str] = None) -> List[MetricsData]:
+        if resource_name is None:
+            # метрики процесса API
+            return [MetricsData(resource="api", pid=os.getpid(), metrics=aes_globals.metrics.snapshot())]
+
+        if resource_name not in self._resource_manager.resource_names:
+            raise HTTPException(status_code=404, detail=f"Resource '{resource_name}' is not registered")
+
+        control = self._resource_manager.get_control_proxy(resource_name)
+        return await control.metrics()
@@ -0,0 +1,46 @@
+from fastapi import HTTPException
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.env.tech.abbreviation_extraction import ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE
+from extractor_service.common.struct.job_manager import JobManager
+from extractor_service.handlers.abbreviation_extractor import to_internal_containers
+from extractor_service.handlers.common import catch_internal_errors
+from extractor_service.technologies.abbreviation_extraction.abbreviation_extraction import validate_request_params
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionJobRequestMsg, \
+    AbbreviationExtractionJobResponseMsg
+
+
+class AbbreviationsJobSubmitHandler:
+    """ Запуск асинхронного задания: ответ с идентификатором задания отправляется сразу """
+
+    def __init__(self, job_manager: JobManager):
+        self._job_manager = job_manager
+        self._logger = aes_globals.service_logger.getChild('handlers.abbreviation_job')
+
+    @catch_internal_errors
+    async def __call__(self, msg: AbbreviationExtractionJobRequestMsg) -> AbbreviationExtractionJobResponseMsg:
+        self._logger.info("Job containers: %d", len(msg.data.s3_object_containers))
+
+        # параметры проверяются при запуске, а не при выполнении задания
+        validate_request_params(msg.data.language, msg.data.cache_mode)
+        data = to_internal_containers(msg.data.s3_object_containers)
+        job = await self._job_manager.submit(containers=data,
+                                             language=msg.data.language,
+                                             cache_mode=msg.data.cache_mode,
+                                             webhook_url=msg.data.webhook_url)
+        return AbbreviationExtractionJobResponseMsg(data=job)
+
+
+class AbbreviationsJobStatusHandler:
+    """ Состояние задания и часть результатов обработанных контейнеров """
+
+    def __init__(self, job_manager: JobManager):
+        self._job_manager = job_manager
+
+    async def __call__(self, job_id: str, offset: int = 0, limit: int = 0) -> AbbreviationExtractionJobResponseMsg:
+        # за один запрос - не больше результатов, чем в одном ответе /abbrev/extract
+        limit = min(max(limit, 0), ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE)
+        job = await self._job_manager.get(job_id, offset=max(offset, 0), limit=limit)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' is not found")
+        return AbbreviationExtractionJobResponseMsg(data=job)
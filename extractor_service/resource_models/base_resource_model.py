@@ -1,8 +1,17 @@
+import asyncio
 from abc import ABC
-from typing import Type, TypeVar, Union, List
+from typing import AsyncGenerator, Dict, Optional, Type, TypeVar, Union, List
 from uuid import uuid4
 
+from extractor_service.common.env.resources import CONTROL_COMMAND_TIMEOUT_SEC
 from extractor_service.common.struct.mixins.controlled_runnable_mixin import ControlledRunnableMixin, InMsg, OutMsg
+from extractor_service.common.struct.model.diagnostics import (
+    MemorySnapshotRequest,
+    MemorySnapshotData,
+    MetricsRequest,
+    MetricsData,
+    ReplicaData,
+)
 from extractor_service.common.struct.queue import (
     ProcessQueue,
     BaseInQueueMsg,
@@ -10,34 +19,108 @@ from extractor_service.common.struct.queue import (
     BaseOutQueueMsg,
     BaseInData,
     BaseOutData,
+    Command,
 )
 from utils.aes_utils.exceptions import TechHandleException
+from utils.aes_utils.models.base_message import Status
 from utils.status import StatusCodes
 
 BaseOutMsg = TypeVar("BaseOutMsg", bound=BaseOutQueueMsg)
 
 
+class _ReplyRouter:
+    """ Разбор очереди ответов канала по запросам
+
+    Очередь читает одна задача на процесс и очередь ответов и передает сообщения в очереди запросов
+    по uuid. Сообщения незарегистрированных запросов (например, прерванного потока) отбрасываются
+    """
+
+    def __init__(self, out_queue: ProcessQueue, loop: asyncio.AbstractEventLoop):
+        self.out_queue = out_queue
+        self.loop = loop
+        self._waiters: Dict[str, asyncio.Queue] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, uuid: str) -> asyncio.Queue:
+        """ Очередь ответов запроса: регистрируется до отправки задачи """
+        replies = self._waiters[uuid] = asyncio.Queue()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._route())
+        return replies
+
+    def unregister(self, uuid: str):
+        self._waiters.pop(uuid, None)
+        if not self._waiters and self._task is not None:
+            # чтение прерывается только на ожидании, полученное сообщение не теряется
+            self._task.cancel()
+            self._task = None
+
+    async def _route(self):
+        while True:
+            out_msg = await self.out_queue.aget()
+            replies = self._waiters.get(out_msg.uuid)
+            if replies is None:
+                continue
+            if not out_msg.partial:
+                del self._waiters[out_msg.uuid]
+            replies.put_nowait(out_msg)
+
+
+# id очереди ответов -> разбор ответов в цикле событий процесса
+# (прокси создается на каждый запрос, а очередь ответов общая)
+_routers: Dict[int, _ReplyRouter] = {}
+
+
+def _reply_router(out_queue: ProcessQueue) -> _ReplyRouter:
+    loop = asyncio.get_running_loop()
+    router = _routers.get(id(out_queue))
+    if router is None or router.out_queue is not out_queue or router.loop is not loop:
+        router = _routers[id(out_queue)] = _ReplyRouter(out_queue, loop)
+    return router
+
+
 class BaseProxyModel:
     def __init__(self,
                  in_queue: ProcessJoinableQueue,
                  out_queue: ProcessQueue,
-                 msg_data_type: Type[InMsg]):
+                 msg_data_type: Type[InMsg],
+                 reply_to: int = 0):
+        """
+        :param out_queue: очередь ответов канала reply_to
+        :param reply_to: канал ответов процесса (номер процесса API)
+        """
         self._in_queue = in_queue
         self._out_queue = out_queue
         self._msg_data_type = msg_data_type
+        self._reply_to = reply_to
 
     async def _send_task(self, msg: BaseInQueueMsg) -> BaseOutMsg:
+        msg.reply_to = self._reply_to
+        router = _reply_router(self._out_queue)
+        replies = router.register(msg.uuid)
         self._in_queue.put(msg)
-        while True:
-            out_msg = await self._out_queue.aget()
-
-            if out_msg.uuid != msg.uuid:
-                await self._out_queue.aput(out_msg)
-                continue
-            break
+        try:
+            return await replies.get()
+        finally:
+            router.unregister(msg.uuid)
+            self._in_queue.task_done()
 
-        self._in_queue.task_done()
-        return out_msg
+    async def _stream_task(self, msg: BaseInQueueMsg) -> AsyncGenerator[BaseOutMsg, None]:
+        """ Отправить задачу с потоковым результатом и выдавать сообщения по мере получения """
+        msg.reply_to = self._reply_to
+        router = _reply_router(self._out_queue)
+        replies = router.register(msg.uuid)
+        self._in_queue.put(msg)
+        try:
+            while True:
+                out_msg = await replies.get()
+                yield out_msg
+                if not out_msg.partial:
+                    break
+        finally:
+            # оставшиеся сообщения прерванного потока отбрасываются
+            router.unregister(msg.uuid)
+            self._in_queue.task_done()
 
     async def request(self, data: Union[BaseInData, List[BaseInData]]) -> Union[BaseOutData, List[BaseOutData]]:
         out_msg: OutMsg = await self._send_task(
@@ -47,6 +130,90 @@ class BaseProxyModel:
             raise TechHandleException(status=out_msg.status)
         return out_msg.data
 
+    async def request_stream(self, data: BaseInData) -> AsyncGenerator[BaseOutData, None]:
+        """ Запрос с потоковым результатом: части выдаются по мере их готовности в ресурсе """
+        out_msgs = self._stream_task(self._msg_data_type.construct(uuid=str(uuid4()), data=data))
+        try:
+            async for out_msg in out_msgs:
+                if out_msg.status.code != StatusCodes.OK.code:
+                    raise TechHandleException(status=out_msg.status)
+                if out_msg.partial:
+                    yield out_msg.data
+        finally:
+            # поток, прерванный клиентом, закрывается сразу, а не при сборке мусора
+            await out_msgs.aclose()
+
+
+class ControlProxy(BaseProxyModel):
+    """ Прокси для служебных команд, выполняемых каждой репликой ресурса """
+
+    def __init__(self,
+                 in_queue: ProcessJoinableQueue,
+                 out_queue: ProcessQueue,
+                 msg_data_type: Type[InMsg],
+                 replicas: int,
+                 reply_to: int = 0,
+                 name: str = "",
+                 timeout_sec: float = CONTROL_COMMAND_TIMEOUT_SEC):
+        """
+        :param name: название ресурса (для ответов не ответивших реплик)
+        :param timeout_sec: время ожидания ответов реплик
+        """
+        super().__init__(in_queue, out_queue, msg_data_type, reply_to)
+        self._replicas = replicas
+        self._name = name
+        self._timeout_sec = timeout_sec
+
+    async def _broadcast(self, cmd: Command, data: BaseInData, data_type: Type[ReplicaData]) -> List[ReplicaData]:
+        """ Разослать команду всем репликам
+
+        Реплика, не ответившая за timeout_sec (например, занятая долгой задачей), представлена
+        в результате ответом data_type со статусом ошибки; ее поздний ответ отбрасывается
+        """
+        msgs = [self._msg_data_type.construct(uuid=str(uuid4()), cmd=cmd, data=data) for _ in range(self._replicas)]
+        tasks = [asyncio.ensure_future(self._send_task(msg)) for msg in msgs]
+        _, pending = await asyncio.wait(tasks, timeout=self._timeout_sec)
+        for task in pending:
+            task.cancel()
+
+        result = []
+        for task in tasks:
+            if task in pending:
+                status = Status.make_status(status=StatusCodes.INTERNAL_ERROR,
+                                            message=f"Replica did not answer in {self._timeout_sec} s")
+                result.append(data_type.construct(resource=self._name, pid=None, status=status))
+                continue
+
+            out_msg: OutMsg = task.result()
+            if out_msg.status.code != StatusCodes.OK.code:
+                raise TechHandleException(status=out_msg.status)
+            result.append(out_msg.data)
+        return result
+
+    async def memory_snapshot(self,
+                              top: int = 20,
+                              key_type: str = "lineno",
+                              with_diff: bool = True,
+                              with_types: bool = False,
+                              stop: bool = False) -> List[MemorySnapshotData]:
+        return await self._broadcast(
+            Command.MEMORY_SNAPSHOT,
+            MemorySnapshotRequest(request_id=str(uuid4()),
+                                  top=top,
+                                  key_type=key_type,
+                                  with_diff=with_diff,
+                                  with_types=with_types,
+                                  stop=stop),
+            MemorySnapshotData
+        )
+
+    async def metrics(self) -> List[MetricsData]:
+        return await self._broadcast(
+            Command.METRICS,
+            MetricsRequest(request_id=str(uuid4())),
+            MetricsData
+        )
+
 
 class BaseResourceModel(ControlledRunnableMixin, ABC):
     def __init__(self,
@@ -60,12 +227,12 @@ class BaseResourceModel(ControlledRunnableMixin, ABC):
         self._proxy_model = proxy_type
         self._link_counter = 0
 
-    @property
-    def proxy(self) -> BaseProxyModel:
+    def get_proxy(self, reply_to: int = 0) -> BaseProxyModel:
         self._link_counter += 1
         return self._proxy_model(self._in_queue,
-                                 self._out_queue,
-                                 self._in_msg_type)
+                                 self.reply_queue(reply_to),
+                                 self._in_msg_type,
+                                 reply_to)
 
     def unlink(self):
         self._link_counter -= 1
@@ -1,8 +1,13 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from utils.aes_utils.models.abbreviation_extractor import (
     AbbreviationExtractionRequestMsg,
+    AbbreviationExtractionTextRequestMsg,
+    AbbreviationExtractionJobRequestMsg,
 )
 import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.func.serialization import models_response
 import extractor_service.handlers as hdl
 
 router = APIRouter()
@@ -12,4 +17,65 @@ router = APIRouter()
 async def handle_abbrev_extract(req: AbbreviationExtractionRequestMsg):
     handler = hdl.AbbreviationsExtractorHandler(aes_globals.resource_manager)
 
-    return await handler(req)
+    # ответ сериализуется сразу, без повторного обхода моделей в jsonable_encoder
+    return models_response(await handler(req))
+
+
+@router.post("/abbrev/extract_stream")
+async def handle_abbrev_extract_stream(req: AbbreviationExtractionRequestMsg):
+    handler = hdl.AbbreviationsStreamExtractorHandler(aes_globals.resource_manager)
+
+    # по строке NDJSON на контейнер по мере готовности, последняя строка - итог
+    return StreamingResponse(handler(req), media_type=S3ContentType.JSON_LINES.value)
+
+
+@router.post("/abbrev/extract_text")
+async def handle_abbrev_extract_text(req: AbbreviationExtractionTextRequestMsg):
+    handler = hdl.AbbreviationsTextExtractorHandler(aes_globals.resource_manager)
+
+    return models_response(await handler(req))
+
+
+@router.post("/abbrev/jobs")
+async def handle_abbrev_job_submit(req: AbbreviationExtractionJobRequestMsg):
+    handler = hdl.AbbreviationsJobSubmitHandler(aes_globals.job_manager)
+
+    return models_response([await handler(req)], status_code=202)
+
+
+@router.get("/abbrev/jobs/{job_id}")
+async def handle_abbrev_job_status(job_id: str, offset: int = 0, limit: int = 0):
+    handler = hdl.AbbreviationsJobStatusHandler(aes_globals.job_manager)
+
+    return models_response([await handler(job_id, offset=offset, limit=limit)])
+
+
+@router.get("/debug/memory/{resource_name}")
+async def handle_memory_snapshot(resource_name: str,
+                                 top: int = 20,
+                                 key_type: str = "lineno",
+                                 with_diff: bool = True,
+                                 with_types: bool = False,
+                                 stop: bool = False):
+    handler = hdl.MemorySnapshotHandler(aes_globals.resource_manager)
+
+    return await handler(resource_name,
+                         top=top,
+                         key_type=key_type,
+                         with_diff=with_diff,
+                         with_types=with_types,
+                         stop=stop)
+
+
+@router.get("/debug/metrics")
+async def handle_api_metrics():
+    handler = hdl.MetricsHandler(aes_globals.resource_manager)
+
+    return await handler()
+
+
+@router.get("/debug/metrics/{resource_name}")
+async def handle_resource_metrics(resource_name: str):
+    handler = hdl.MetricsHandler(aes_globals.resource_manager)
+
+    return await handler(resource_name)
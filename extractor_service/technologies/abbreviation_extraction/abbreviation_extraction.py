@@ -1,19 +1,34 @@
 from functools import partial
-from typing import Optional, List
+from typing import AsyncGenerator, Optional, List, Set, Union
 
 from extractor_service.common.const.resources.model_names import ABBREVIATION_DETECTOR, EXPANSION_DETECTOR
+from extractor_service.common.env.tech.abbreviation_extraction import CONTENT_MERGE_CONCURRENCY, \
+    ABBREVIATION_EXTRACTION_CONCURRENCY, RESULT_UPLOAD_CONCURRENCY, RESULT_CACHE_ENABLED, RESULT_CACHE_MEMORY_BYTES, \
+    RESULT_CACHE_DISK_PATH, RESULT_CACHE_DISK_BYTES, RESULT_UPLOAD_MODE, RESULT_AGGREGATE_MAX_ITEMS, \
+    RESULT_COMPRESSION, RESULT_AGGREGATE_KEY_PREFIX, INLINE_TEXT_MAX_LENGTH
+from extractor_service.common.struct.cache import ResultCache, CacheMode, CACHE_MODE_KEY
 from extractor_service.common.struct.content_loader import S3ContentsLoader
+from extractor_service.common.struct.data_storage.compression import encoding_header
 from extractor_service.common.struct.mixins.controlled_runnable_mixin import BaseResources
 from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorRequestData, \
-    AbbreviationExtractorS3Result
-from extractor_service.common.struct.model.common import S3ContainerInfo
+    AbbreviationExtractorS3Result, AbbreviationExtractorTextResult
+from extractor_service.common.struct.model.common import S3ContainerInfo, TextContainerInfo
 from extractor_service.common.struct.pipeline import Pipeline, PipelineStep
+from extractor_service.common.struct.process_logger import summarize
 from extractor_service.common.struct.queue import BaseInQueueMsg, BaseOutQueueMsg
+from extractor_service.common.struct.result_aggregator import ResultAggregator, RESULT_AGGREGATOR_KEY, \
+    aggregate_result
 from extractor_service.resource_models.base_resource_model import BaseProxyModel
 from extractor_service.technologies.abbreviation_extraction.utils.abbreviation_extraction import extract
+from extractor_service.technologies.abbreviation_extraction.utils.inline import load_texts, load_expansions
 from extractor_service.technologies.abbreviation_extraction.utils.merge import merge_contents
 from extractor_service.technologies.base_technology import BaseTechnology
 from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionResultsData
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+RESULT_UPLOAD_MODE_OBJECT = "object"
+RESULT_UPLOAD_MODE_AGGREGATED = "aggregated"
 
 
 class InMsg(BaseInQueueMsg):
@@ -26,15 +41,54 @@ class OutMsg(BaseOutQueueMsg):
 
 class Resources(BaseResources):
     pipeline: Pipeline
+    # обработка текстов из запроса: без загрузки из S3 и выгрузки результатов
+    text_pipeline: Pipeline
+
+
+def make_request(language: str, cache_mode: str, **containers) -> AbbreviationExtractorRequestData:
+    """ Запрос к технологии
+
+    Валидируются только параметры запроса: контейнеры уже внутренние модели,
+    повторная проверка (и копирование) каждого из них не нужна
+
+    :raises ValueError: неверный язык или режим кэша
+    """
+    request = AbbreviationExtractorRequestData(language=language, cache_mode=cache_mode)
+    for name, value in containers.items():
+        setattr(request, name, value)
+    return request
+
+
+def validate_request_params(language: str, cache_mode: str):
+    """ Проверить параметры запроса до его отправки технологии (например, при запуске задания)
+
+    :raises ValueError: неверный язык или режим кэша
+    """
+    make_request(language, cache_mode)
 
 
 class Proxy(BaseProxyModel):
+
     async def handle(self,
                      data: List[S3ContainerInfo],
-                     language: str):
-        return await self.request(
-            AbbreviationExtractorRequestData(language=language, s3_containers=data)
-        )
+                     language: str,
+                     cache_mode: str = CacheMode.USE):
+        return await self.request(make_request(language, cache_mode, s3_containers=data))
+
+    async def handle_texts(self,
+                           data: List[TextContainerInfo],
+                           language: str,
+                           cache_mode: str = CacheMode.USE):
+        return await self.request(make_request(language, cache_mode, text_containers=data))
+
+    def handle_stream(self,
+                      data: List[S3ContainerInfo],
+                      language: str,
+                      cache_mode: str = CacheMode.USE) -> AsyncGenerator[AbbreviationExtractorS3Result, None]:
+        """ Результаты выдаются по одному, по мере завершения обработки контейнеров """
+        request = make_request(language, cache_mode, s3_containers=data)
+        request.stream = True
+        return self.request_stream(request)
 
 
 class AbbreviationExtractionTechnology(BaseTechnology):
@@ -50,11 +104,21 @@ class AbbreviationExtractionTechnology(BaseTechnology):
                          resource_manager=resource_manager,
                          replicas=replicas)
         self._contents_loader: Optional[S3ContentsLoader] = None
+        self._result_cache: Optional[ResultCache] = None
+
+        if RESULT_UPLOAD_MODE not in (RESULT_UPLOAD_MODE_OBJECT, RESULT_UPLOAD_MODE_AGGREGATED):
+            raise ValueError(f"Unsupported result upload mode: '{RESULT_UPLOAD_MODE}'")
+        self._aggregate_results = RESULT_UPLOAD_MODE == RESULT_UPLOAD_MODE_AGGREGATED
+        # проверка настройки при запуске, а не при первой выгрузке
+        encoding_header(RESULT_COMPRESSION)
 
     async def _on_stop(self):
         if self._contents_loader:
             await self._contents_loader.close()
 
+        if self._result_cache:
+            self._result_cache.close()
+
         self._resource_manager.unlink(ABBREVIATION_DETECTOR)
         self._resource_manager.unlink(EXPANSION_DETECTOR)
 
@@ -65,27 +129,39 @@ class AbbreviationExtractionTechnology(BaseTechnology):
             Proxy as ExpansionDetectorProxy
 
         self._contents_loader = S3ContentsLoader()
+        if RESULT_CACHE_ENABLED:
+            self._result_cache = ResultCache(name=f"{self._name}.result_cache",
+                                             memory_max_bytes=RESULT_CACHE_MEMORY_BYTES,
+                                             disk_path=RESULT_CACHE_DISK_PATH,
+                                             disk_max_bytes=RESULT_CACHE_DISK_BYTES)
 
         abbreviation_detector: AbbreviationDetectorProxy = self._resource_manager.get_resource(ABBREVIATION_DETECTOR)
         expansion_detector: ExpansionDetectorProxy = self._resource_manager.get_resource(EXPANSION_DETECTOR)
 
+        extract_func = partial(extract,
+                               abbreviation_detector_model=abbreviation_detector,
+                               expansion_detector_model=expansion_detector,
+                               result_cache=self._result_cache)
+
         attr_mapping = {"content_id": "key_"}
         content_download_step = PipelineStep(
             partial(self._contents_loader.get_contents_gen, merge_contents=False),
             attr_mapping=attr_mapping
         )
         container_transform_step = PipelineStep(merge_contents,
-                                                attr_mapping=attr_mapping)
-        abbreviation_extraction_step = PipelineStep(
-            partial(extract,
-                    abbreviation_detector_model=abbreviation_detector,
-                    expansion_detector_model=expansion_detector),
-            attr_mapping=attr_mapping
-        )
+                                                attr_mapping=attr_mapping,
+                                                concurrency=CONTENT_MERGE_CONCURRENCY)
+        abbreviation_extraction_step = PipelineStep(extract_func,
+                                                    attr_mapping=attr_mapping,
+                                                    concurrency=ABBREVIATION_EXTRACTION_CONCURRENCY)
 
         attr_mapping['bucket_name'] = 'reply_bucket_name'
-        result_upload_step = PipelineStep(self._contents_loader.put_content,
-                                          attr_mapping=attr_mapping)
+        upload_func = partial(self._contents_loader.put_content, compression=RESULT_COMPRESSION)
+        if self._aggregate_results:
+            upload_func = aggregate_result
+        result_upload_step = PipelineStep(upload_func,
+                                          attr_mapping=attr_mapping,
+                                          concurrency=RESULT_UPLOAD_CONCURRENCY)
 
         pipeline = Pipeline(initial_step=content_download_step,
                             in_item_type=S3ContainerInfo,
@@ -95,15 +171,92 @@ class AbbreviationExtractionTechnology(BaseTechnology):
             abbreviation_extraction_step,
             result_upload_step,
         )
-        return Resources.construct(pipeline=pipeline)
 
-    async def handle_data(self, resources: Resources, data: AbbreviationExtractorRequestData) -> List[AbbreviationExtractorS3Result]:
-        self._logger.debug(f"Msg data: {data}")
+        text_attr_mapping = {"content_id": "key_"}
+        text_pipeline = Pipeline(initial_step=PipelineStep(partial(load_texts, max_length=INLINE_TEXT_MAX_LENGTH),
+                                                           attr_mapping=text_attr_mapping),
+                                 in_item_type=TextContainerInfo,
+                                 out_item_type=AbbreviationExtractorTextResult)
+        text_pipeline.add_branch(
+            PipelineStep(merge_contents,
+                         attr_mapping=text_attr_mapping,
+                         concurrency=CONTENT_MERGE_CONCURRENCY),
+            PipelineStep(extract_func,
+                         attr_mapping=text_attr_mapping,
+                         concurrency=ABBREVIATION_EXTRACTION_CONCURRENCY),
+            PipelineStep(load_expansions, attr_mapping=text_attr_mapping),
+        )
+        return Resources.construct(pipeline=pipeline, text_pipeline=text_pipeline)
+
+    async def handle_data(self,
+                          resources: Resources,
+                          data: AbbreviationExtractorRequestData) -> Union[List[AbbreviationExtractorS3Result],
+                                                                           List[AbbreviationExtractorTextResult]]:
+        self._logger.debug("Msg data: %s", summarize(data))
 
         meta = {
             "language": data.language,
+            CACHE_MODE_KEY: data.cache_mode,
         }
-        result = await resources.pipeline.start(data.s3_containers, meta=meta)
+        if data.text_containers:
+            result = await resources.text_pipeline.start(data.text_containers, meta=meta)
+            self._logger.debug("Done")
+            return result
+
+        if data.stream:
+            return self._handle_stream(resources, data, meta)
 
-        self._logger.debug(f"Done")
+        if not self._aggregate_results:
+            result = await resources.pipeline.start(data.s3_containers, meta=meta)
+        else:
+            result = await self._start_aggregated(resources, data.s3_containers, meta)
+        self._logger.debug("Done")
         return result
+
+    async def _start_aggregated(self,
+                                resources: Resources,
+                                containers: List[S3ContainerInfo],
+                                meta: dict) -> List[AbbreviationExtractorS3Result]:
+        aggregator = ResultAggregator(contents_loader=self._contents_loader,
+                                      max_items=RESULT_AGGREGATE_MAX_ITEMS,
+                                      compression=RESULT_COMPRESSION,
+                                      key_prefix=RESULT_AGGREGATE_KEY_PREFIX)
+        meta[RESULT_AGGREGATOR_KEY] = aggregator
+        try:
+            result = await resources.pipeline.start(containers, meta=meta)
+        except BaseException:
+            await aggregator.abort()
+            raise
+
+        failed_keys = await aggregator.close()
+        self._mark_failed_uploads(result, failed_keys)
+        return result
+
+    async def _handle_stream(self,
+                             resources: Resources,
+                             data: AbbreviationExtractorRequestData,
+                             meta: dict) -> AsyncGenerator[AbbreviationExtractorS3Result, None]:
+        if not self._aggregate_results:
+            async for result in resources.pipeline.start_gen(data.s3_containers, meta=meta):
+                yield result
+        else:
+            # общий объект выгружается при закрытии агрегатора: результаты выдаются после этого,
+            # чтобы не сообщать клиенту о положении еще не записанных данных
+            for result in await self._start_aggregated(resources, data.s3_containers, meta):
+                yield result
+        self._logger.debug("Done")
+
+    @staticmethod
+    def _mark_failed_uploads(result: List[AbbreviationExtractorS3Result], failed_keys: Set[str]):
+        if not failed_keys:
+            return
+
+        status = Status.make_status(status=StatusCodes.CONNECTION_ERROR,
+                                    message="Can't push content to S3")
+        for item in result:
+            if item.key_ not in failed_keys:
+                continue
+            item.status = status
+            item.s3_key = None
+            item.line_index = None
+            item.offset = None
@@ -1,30 +1,65 @@
-import json
 from io import BytesIO
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
+from extractor_service.common.env.tech.abbreviation_extraction import RESULT_JSON_INDENT
 from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.func.serialization import dumps
+from extractor_service.common.struct.cache import CacheMode, ResultCache, make_cache_key
 from extractor_service.common.struct.language import LanguageEnum
 from extractor_service.common.struct.model.abbreviation_extractor import ExpansionToSave
 from extractor_service.resource_models.abbreviation_extraction.abbreviation_detector import \
     Proxy as AbbreviationDetectorModel
 from extractor_service.resource_models.abbreviation_extraction.expansion_detector import Proxy as ExpansionDetectorModel
 
+# версия алгоритмов детекции: входит в ключ кэша результатов,
+# поэтому должна меняться при любом изменении результата извлечения
+ALGORITHM_VERSION = "1"
+
+
+def result_cache_key(text: str, language: LanguageEnum, indent: Optional[bool] = None) -> str:
+    """
+    :param indent: форматирование кэшируемого JSON (None - RESULT_JSON_INDENT): кэш на диске переживает
+                   перезапуск, и после смены настройки прежние результаты не должны выдаваться
+    """
+    language = language.value if isinstance(language, LanguageEnum) else str(language)
+    indent = RESULT_JSON_INDENT if indent is None else indent
+    return make_cache_key(language, text, ALGORITHM_VERSION, "indent" if indent else "compact")
+
 
 async def extract(content_id: str,
                   text: str,
                   abbreviation_detector_model: AbbreviationDetectorModel,
                   expansion_detector_model: ExpansionDetectorModel,
-                  language: LanguageEnum.RUSSIAN) -> AsyncGenerator[ExpansionToSave, None]:
-    abbreviations = (await abbreviation_detector_model.detect_abbreviations(content_id=content_id,
-                                                                            text=text,
-                                                                            language=language)).abbreviations
-    expansions = (await expansion_detector_model.detect_expansions(content_id=content_id,
-                                                                   text=text,
-                                                                   language=language,
-                                                                   abbreviations=abbreviations)).expansions
-
-    json_content = json.dumps(expansions, ensure_ascii=False, indent=2)
-    byte_file_content = json_content.encode("utf-8")
+                  language: LanguageEnum.RUSSIAN,
+                  result_cache: Optional[ResultCache] = None,
+                  cache_mode: CacheMode = CacheMode.USE) -> AsyncGenerator[ExpansionToSave, None]:
+    cache_mode = CacheMode(cache_mode)
+    if cache_mode == CacheMode.BYPASS:
+        result_cache = None
+
+    indent = RESULT_JSON_INDENT
+    cache_key = None
+    byte_file_content = None
+    if result_cache is not None:
+        cache_key = result_cache_key(text, language, indent)
+        if cache_mode == CacheMode.USE:
+            # при попадании в кэш детекторы не вызываются
+            byte_file_content = await result_cache.get(cache_key)
+
+    if byte_file_content is None:
+        abbreviations = (await abbreviation_detector_model.detect_abbreviations(content_id=content_id,
+                                                                                text=text,
+                                                                                language=language)).abbreviations
+        expansions = (await expansion_detector_model.detect_expansions(content_id=content_id,
+                                                                       text=text,
+                                                                       language=language,
+                                                                       abbreviations=abbreviations)).expansions
+
+        # сразу байты UTF-8: без промежуточной строки и ее копии при кодировании
+        byte_file_content = dumps(expansions, indent=indent)
+
+        if result_cache is not None:
+            await result_cache.put(cache_key, byte_file_content)
 
     yield ExpansionToSave(
         key_=content_id,
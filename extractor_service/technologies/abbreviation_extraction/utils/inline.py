@@ -0,0 +1,29 @@
+from io import BytesIO
+from typing import AsyncGenerator, List
+
+from extractor_service.common.func.serialization import loads
+from extractor_service.common.struct.model.abbreviation_extractor import ExtractedExpansions
+from extractor_service.common.struct.model.common import LoadedContainer, TextContainerInfo
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+async def load_texts(data: List[TextContainerInfo], max_length: int) -> AsyncGenerator[LoadedContainer, None]:
+    """ Начальный шаг вместо загрузки из S3: текст запроса - единственный объект контейнера
+
+    Дальше текст проходит тот же шаг merge_contents, поэтому результат и ключ кэша
+    совпадают с результатом для того же текста, загруженного в S3
+    """
+    for container in data:
+        if len(container.text) > max_length:
+            status = Status.make_status(status=StatusCodes.BROKEN_CONTENT_ERROR,
+                                        message=f"Text is too long ({len(container.text)} > {max_length} chars)")
+            yield LoadedContainer.construct(key_=container.key_, status=status)
+            continue
+
+        yield LoadedContainer.construct(key_=container.key_, container_contents=[container.text])
+
+
+async def load_expansions(content_id: str, file_data: BytesIO) -> ExtractedExpansions:
+    """ Последний шаг вместо выгрузки в S3: результат возвращается в ответе """
+    return ExtractedExpansions.construct(key_=content_id, expansions=loads(file_data.getbuffer()))
@@ -1,8 +1,28 @@
+from typing import List
+
 from extractor_service.common.struct.model.abbreviation_extractor import TextContent
 from extractor_service.common.struct.model.common import ContentList, LoadedContent
 
 
+def _content_parts(container_contents: ContentList) -> List[str]:
+    parts = []
+    for item in container_contents:
+        # объект может быть загружен частями (TextChunks)
+        chunks = item if isinstance(item, list) else [item]
+        if not any(chunks):
+            continue
+
+        parts.extend(chunks)
+        parts.append(". ")
+
+    if parts:
+        # завершающий пробел все равно был бы удален strip
+        parts[-1] = "."
+    return parts
+
+
 async def merge_contents(content_id: str, container_contents: ContentList) -> LoadedContent:
-    text = "".join(f"{item}. " for item in container_contents if item).strip()
+    # текст собирается одним join, без промежуточных копий каждого объекта
+    text = "".join(_content_parts(container_contents)).strip()
     return TextContent.construct(key_=content_id,
                                  text=text)
@@ -35,6 +35,5 @@ class BaseTechnology(AsyncControlledRunnableMixin):
         self._resource_manager = resource_manager
         self._proxy_model = proxy_type
 
-    @property
-    def proxy(self) -> BaseProxyModel:
-        return self._proxy_model(self._in_queue, self._out_queue, self._in_msg_type)
+    def get_proxy(self, reply_to: int = 0) -> BaseProxyModel:
+        return self._proxy_model(self._in_queue, self.reply_queue(reply_to), self._in_msg_type, reply_to)
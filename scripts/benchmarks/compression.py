@@ -0,0 +1,114 @@
+"""
+Бенчмарк сжатия объектов S3: объем хранимых/передаваемых данных и время чтения
+объектов пачки без сжатия, с gzip и с zstd.
+
+Нужен локальный S3-совместимый сервер, например:
+    python -m moto.server -p 5000
+    docker run -p 9000:9000 minio/minio server /data
+
+Локальный сервер передает данные почти мгновенно, поэтому кроме измеренного времени
+выводится оценка времени чтения при пропускной способности сети --bandwidth
+"""
+import asyncio
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+WORDS = ("информационные", "технологии", "ИТ", "система", "управления", "базы", "данных", "СУБД",
+         "обработки", "естественного", "языка", "аббревиатура", "расшифровка", "документ", "отдел",
+         "разработка", "программного", "обеспечения", "ПО", "сети", "передачи", "вычислительные")
+
+
+def make_text(size: int, rnd: random.Random) -> bytes:
+    words = []
+    length = 0
+    while length < size:
+        word = rnd.choice(WORDS)
+        words.append(word)
+        length += len(word.encode("utf-8")) + 1
+    # обрезка не должна разрывать многобайтовый символ
+    return " ".join(words).encode("utf-8")[:size].decode("utf-8", errors="ignore").encode("utf-8")
+
+
+async def create_objects(storage, bucket_name: str, objects: int, size: int, compression: str) -> int:
+    from extractor_service.common.struct.data_storage.compression import COMPRESSION_NONE, compress
+
+    client = storage._client
+    try:
+        await client.create_bucket(Bucket=bucket_name)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    rnd = random.Random(0)
+    stored_bytes = 0
+    for idx in range(objects):
+        body = make_text(size, rnd)
+        params = {}
+        if compression != COMPRESSION_NONE:
+            body = compress(body, compression)
+            params["ContentEncoding"] = compression
+        await client.put_object(Bucket=bucket_name, Key=f"{compression}/object_{idx}", Body=body, **params)
+        stored_bytes += len(body)
+    return stored_bytes
+
+
+async def measure(storage, s3_objects, rounds: int) -> float:
+    await storage.get_s3_objects(s3_objects)
+
+    t0 = perf_counter()
+    for _ in range(rounds):
+        await storage.get_s3_objects(s3_objects)
+    return (perf_counter() - t0) / rounds
+
+
+async def run(args):
+    from extractor_service.common.struct.data_storage.s3 import S3Storage
+    from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+
+    raw_bytes = args.objects * args.size
+    print(f"{args.objects} objects x {args.size:,} bytes, bandwidth {args.bandwidth} MB/s")
+    print(f"{'compression':>12} {'S3 bytes':>14} {'ratio':>7} {'read, s':>9} {'est. read, s':>13}")
+
+    for compression in args.compressions:
+        storage = S3Storage(disk_cache_dir=None)
+        await storage.init()
+        stored_bytes = await create_objects(storage, args.bucket, args.objects, args.size, compression)
+
+        s3_objects = [S3ObjectId(bucket_name=args.bucket, s3_key=f"{compression}/object_{idx}")
+                      for idx in range(args.objects)]
+        elapsed = await measure(storage, s3_objects, args.rounds)
+        await storage.close()
+
+        transfer = stored_bytes / (args.bandwidth * 1024 * 1024)
+        print(f"{compression:>12} {stored_bytes:>14,} {raw_bytes / stored_bytes:>7.1f} "
+              f"{elapsed:>9.3f} {elapsed + transfer:>13.3f}")
+
+
+def main():
+    parser = ArgumentParser(description="S3 object compression: size and read time")
+    parser.add_argument("--endpoint-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--bucket", default="benchmark")
+    parser.add_argument("--objects", type=int, default=20, help="объектов в пачке")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="размер текста объекта, байт")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--bandwidth", type=float, default=100, help="пропускная способность сети, МБ/с")
+    parser.add_argument("--compressions", nargs="+", default=["none", "gzip", "zstd"])
+    args = parser.parse_args()
+
+    # настройки клиента читаются из переменных среды при импорте
+    os.environ.setdefault("S3_ENDPOINT_URL", args.endpoint_url)
+    os.environ.setdefault("S3_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("S3_SECRET_KEY", "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Бенчмарк накладных расходов обработчика /abbrev/extract: преобразование моделей запроса во внутренние,
+создание запроса к технологии и сборка ответных сообщений - прежний путь (dict + construct, полная
+валидация ответа) против преобразования без валидации.
+
+Технология заменена заглушкой: она только передает запрос и результаты через pickle, как очереди
+процессов, поэтому доля обработчика считается от времени без самого извлечения (оценка сверху).
+"""
+import asyncio
+import logging
+import pickle
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorRequestData, \
+    AbbreviationExtractorS3Result
+from extractor_service.common.struct.model.common import S3ContainerInfo as InternalS3ContainerInfo
+from extractor_service.handlers.abbreviation_extractor import AbbreviationsExtractorHandler
+from extractor_service.technologies.abbreviation_extraction.abbreviation_extraction import make_request
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionRequestMsg, \
+    AbbreviationExtractionResponseMsg, AbbreviationExtractionResultsData
+from utils.common import grouper
+
+
+class FakeTech:
+    """ Технология без извлечения: передача запроса и результатов между процессами """
+
+    def __init__(self, legacy: bool):
+        self.legacy = legacy
+        self.elapsed = 0.
+
+    def make_request(self, data, language, cache_mode):
+        if self.legacy:
+            return AbbreviationExtractorRequestData(language=language, s3_containers=data, cache_mode=cache_mode)
+        return make_request(language, cache_mode, s3_containers=data)
+
+    async def handle(self, data, language, cache_mode):
+        request = self.make_request(data, language, cache_mode)
+
+        t0 = perf_counter()
+        request = pickle.loads(pickle.dumps(request, protocol=pickle.HIGHEST_PROTOCOL))
+        results = [
+            AbbreviationExtractorS3Result.construct(key_=item.key_, container_id=item.container_id,
+                                                    user_data=item.user_data, bucket_name=item.reply_bucket_name,
+                                                    s3_key=f"results/{item.container_id}.json")
+            for item in request.s3_containers
+        ]
+        results = pickle.loads(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+        self.elapsed += perf_counter() - t0
+        return results
+
+
+class FakeResourceManager:
+    def __init__(self, tech: FakeTech):
+        self.tech = tech
+
+    def get_resource(self, name):
+        return self.tech
+
+
+class LegacyHandler(AbbreviationsExtractorHandler):
+    """ Преобразования до введения пути без валидации """
+
+    @staticmethod
+    def _transform_containers(containers):
+        internal_containers = []
+        for item in containers:
+            if not item.reply_bucket_name:
+                item.reply_bucket_name = "abbreviation_extractor"
+            internal_containers.append(InternalS3ContainerInfo.construct(**item.dict(by_alias=False)))
+        return internal_containers
+
+    @staticmethod
+    def _transform_results(results):
+        return [
+            AbbreviationExtractionResponseMsg(data=AbbreviationExtractionResultsData(s3_objects=data))
+            for data in grouper(results, 500)
+        ]
+
+
+def make_msg(containers: int) -> AbbreviationExtractionRequestMsg:
+    return AbbreviationExtractionRequestMsg.parse_obj({
+        "Data": {
+            "Language": "ru",
+            "S3ObjectContainers": [
+                {"ContainerId": str(idx),
+                 "S3Object": [{"BucketName": "bucket", "S3Key": f"texts/{idx}/{part}.txt"} for part in range(2)],
+                 "UserData": {"source": "benchmark", "idx": idx}}
+                for idx in range(containers)
+            ]
+        }
+    })
+
+
+async def measure(name: str, handler_type, legacy: bool, containers: int, rounds: int):
+    handler_time = tech_time = 0.
+    for _ in range(rounds):
+        msg = make_msg(containers)
+        tech = FakeTech(legacy)
+        handler = handler_type(FakeResourceManager(tech))
+
+        t0 = perf_counter()
+        await handler(msg)
+        handler_time += perf_counter() - t0
+        tech_time += tech.elapsed
+
+    overhead = (handler_time - tech_time) / rounds
+    total = handler_time / rounds
+    print(f"{name:>10}: handler {overhead * 1000:>8.1f} ms, IPC {(total - overhead) * 1000:>8.1f} ms, "
+          f"handler share {overhead / total:>6.1%}")
+
+
+def main():
+    parser = ArgumentParser(description="API handler model conversion overhead")
+    parser.add_argument("--containers", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    aes_globals.service_logger = logging.getLogger("benchmark")
+    asyncio.run(measure("legacy", LegacyHandler, True, args.containers, args.rounds))
+    asyncio.run(measure("trusted", AbbreviationsExtractorHandler, False, args.containers, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Бенчмарк накладных расходов логирования на запрос /abbrev/extract: прежний путь (запись за записью
+в очередь процесса логирования, полное сообщение запроса в DEBUG, сообщения через f-строки) против
+пачек записей, сокращенного сообщения (summarize) и выборки повторяющихся записей DEBUG.
+
+Записи, которые пишет запрос: число контейнеров и время (INFO), сообщение запроса и данные технологии
+(DEBUG), запуск и удаление задачи на каждый контейнер (DEBUG). Процесс логирования только читает очередь,
+поэтому считается время вызовов логера в процессе API и время, пока процесс логирования
+не получит все записи.
+"""
+import logging
+import sys
+from argparse import ArgumentParser
+from logging.handlers import QueueHandler as LoggingQueueHandler
+from multiprocessing import Process, Queue
+from pathlib import Path
+from queue import Full
+from time import perf_counter
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.process_logger import QueueHandler, summarize
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionRequestMsg
+
+DONE = "done"
+
+
+class LegacyQueueHandler(LoggingQueueHandler):
+    """ Обработчик до введения пачек: запись за записью, при заполненной очереди запись теряется """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            pass
+
+
+def consume(queue: Queue, done: Queue):
+    """ Процесс логирования без вывода: считает полученные записи """
+    records = 0
+    while True:
+        item = queue.get()
+        if isinstance(item, logging.LogRecord):
+            if item.msg == DONE:
+                done.put(records)
+                records = 0
+                continue
+            records += 1
+            continue
+        for record in item:
+            if record.msg == DONE:
+                done.put(records)
+                records = 0
+                continue
+            records += 1
+
+
+def make_msg(containers: int) -> AbbreviationExtractionRequestMsg:
+    return AbbreviationExtractionRequestMsg.parse_obj({
+        "Data": {
+            "Language": "ru",
+            "S3ObjectContainers": [
+                {"ContainerId": str(idx),
+                 "S3Object": [{"BucketName": "bucket", "S3Key": f"texts/{idx}/{part}.txt"} for part in range(2)],
+                 "UserData": {"source": "benchmark", "idx": idx}}
+                for idx in range(containers)
+            ]
+        }
+    })
+
+
+def log_request_legacy(logger: logging.Logger, msg: AbbreviationExtractionRequestMsg):
+    containers = msg.data.s3_object_containers
+    logger.info(f"Containers: {len(containers)}")
+    logger.debug("Msg: %s", msg)
+    logger.debug(f"Msg data: {containers}")
+    for idx in range(len(containers)):
+        logger.debug(f"Run task '%s'", idx)
+        logger.debug(f"Delete task '{idx}'")
+    logger.info(f"Done ({0.5:.2f} s)")
+
+
+def log_request(logger: logging.Logger, msg: AbbreviationExtractionRequestMsg):
+    containers = msg.data.s3_object_containers
+    logger.info("Containers: %d", len(containers))
+    logger.debug("Msg: %s", summarize(msg))
+    logger.debug("Msg data: %s", summarize(containers))
+    for idx in range(len(containers)):
+        logger.debug("Run task '%s'", idx)
+        logger.debug("Delete task '%s'", idx)
+    logger.info("Done (%.2f s)", 0.5)
+
+
+def measure(name: str, handler: logging.Handler, log_request_func, level: int, containers: int, rounds: int,
+            done: Queue):
+    logger = logging.getLogger(f"benchmark.{name}.{logging.getLevelName(level)}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(level)
+
+    msg = make_msg(containers)
+    calls_time = total_time = 0.
+    records = 0
+    for _ in range(rounds):
+        t0 = perf_counter()
+        log_request_func(logger, msg)
+        calls_time += perf_counter() - t0
+        logger.critical(DONE)
+        records += done.get()
+        total_time += perf_counter() - t0
+
+    print(f"{name:>8} {logging.getLevelName(level):>5}: logger calls {calls_time / rounds * 1000:>8.2f} ms, "
+          f"delivered {total_time / rounds * 1000:>8.2f} ms, records {records / rounds:>7.0f} per request")
+
+
+def main():
+    parser = ArgumentParser(description="Per-request logging overhead")
+    parser.add_argument("--containers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample-rate", type=int, default=100, help="выборка повторяющихся записей DEBUG")
+    args = parser.parse_args()
+
+    queue, done = Queue(), Queue()
+    consumer = Process(target=consume, args=(queue, done), daemon=True)
+    consumer.start()
+
+    for level in (logging.INFO, logging.DEBUG):
+        measure("legacy", LegacyQueueHandler(queue), log_request_legacy, level, args.containers, args.rounds, done)
+        measure("batched", QueueHandler(queue, metrics=MetricsRegistry()), log_request, level,
+                args.containers, args.rounds, done)
+        measure("sampled", QueueHandler(queue, metrics=MetricsRegistry(), debug_sample_rate=args.sample_rate),
+                log_request, level, args.containers, args.rounds, done)
+
+    consumer.terminate()
+
+
+if __name__ == "__main__":
+    main()
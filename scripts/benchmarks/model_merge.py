@@ -0,0 +1,64 @@
+"""
+Бенчмарк BaseModel.merge: слияний в секунду без кэша типов, с кэшем и с in-place слиянием.
+"""
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from extractor_service.common.struct.model.common import BaseData
+
+
+class Container(BaseData):
+    container_id: str
+    user_data: dict
+
+
+class Uploaded(BaseData):
+    bucket_name: str
+    s3_key: str
+
+
+def merge_uncached(left: BaseData, right: BaseData) -> BaseData:
+    # поведение до введения реестра: новый тип на каждое слияние
+    merged_type, added_fields = type(left)._create_merged_type(type(right))
+    values = left.get_fields_as_dict(left)
+    values.update({f_name: getattr(right, f_name) for f_name in added_fields})
+    return merged_type.construct(**values)
+
+
+def merge_cached(left: BaseData, right: BaseData) -> BaseData:
+    return left.merge(right)
+
+
+def merge_inplace(left: BaseData, right: BaseData) -> BaseData:
+    return left.merge(right, inplace=True)
+
+
+def measure(name: str, merge_func: Callable, merges: int):
+    right = Uploaded(key_="1", bucket_name="bucket", s3_key="key")
+    lefts = [Container(key_=str(idx), container_id=str(idx), user_data={}) for idx in range(merges)]
+
+    t0 = perf_counter()
+    for left in lefts:
+        merge_func(left, right)
+    elapsed = perf_counter() - t0
+    print(f"{name:>10}: {merges / elapsed:>12,.0f} merges/s ({elapsed:.3f} s)")
+
+
+def main():
+    parser = ArgumentParser(description="BaseModel.merge throughput")
+    parser.add_argument("--merges", type=int, default=5000)
+    args = parser.parse_args()
+
+    measure("uncached", merge_uncached, args.merges)
+    measure("cached", merge_cached, args.merges)
+    measure("inplace", merge_inplace, args.merges)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Микробенчмарк накладных расходов пайплайна: элементов в секунду через "пустой" пайплайн.
+
+Обработчики шагов ничего не делают, поэтому измеряется только стоимость
+привязки аргументов, обогащения метаданными, преобразования типов и слияния результатов.
+"""
+import asyncio
+import logging
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import List
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.model.common import BaseData, S3ContainerInfo
+from extractor_service.common.struct.pipeline import Pipeline, PipelineStep
+
+
+class EmptyResult(BaseData):
+    ...
+
+
+async def emit(data: List[S3ContainerInfo]):
+    for item in data:
+        yield item
+
+
+async def noop(content_id: str, user_data: dict) -> EmptyResult:
+    return EmptyResult.construct(key_=content_id)
+
+
+def build_pipeline(depth: int) -> Pipeline:
+    attr_mapping = {"content_id": "key_"}
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=S3ContainerInfo,
+                        out_item_type=BaseData)
+    pipeline.add_branch(*(PipelineStep(noop, attr_mapping=attr_mapping) for _ in range(depth)))
+    return pipeline
+
+
+async def run(items: int, depth: int, repeats: int):
+    pipeline = build_pipeline(depth)
+    data = [
+        S3ContainerInfo.construct(container_id=str(idx), s3_object=[], user_data={}, reply_bucket_name="bucket")
+        for idx in range(items)
+    ]
+
+    for repeat in range(repeats):
+        t0 = perf_counter()
+        results = await pipeline.start(data, meta={})
+        elapsed = perf_counter() - t0
+        assert len(results) == items
+        print(f"[{repeat}] items={items} depth={depth}: {items / elapsed:,.0f} items/s ({elapsed:.3f} s)")
+
+
+def main():
+    parser = ArgumentParser(description="Empty pipeline throughput")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--depth", type=int, default=3, help="Number of chained no-op steps")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    aes_globals.service_logger = logging.getLogger("benchmark")
+    asyncio.run(run(args.items, args.depth, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
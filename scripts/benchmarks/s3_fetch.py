@@ -0,0 +1,104 @@
+"""
+Бенчмарк чтения объектов S3 внутри одной пачки: последовательно и параллельно
+с разным размером пула соединений клиента (S3_MAX_POOL_CONNECTIONS).
+
+Нужен локальный S3-совместимый сервер, например:
+    python -m moto.server -p 5000
+    docker run -p 9000:9000 minio/minio server /data
+
+Локальный сервер отвечает почти без задержки, поэтому --latency добавляет
+к каждому запросу задержку сети (как при обращении к удаленному S3)
+"""
+import asyncio
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+
+async def create_objects(storage, bucket_name: str, objects: int, size: int):
+    client = storage._client
+    try:
+        await client.create_bucket(Bucket=bucket_name)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    body = b"a" * size
+    for idx in range(objects):
+        await client.put_object(Bucket=bucket_name, Key=f"object_{idx}", Body=body)
+
+
+async def fetch_sequential(storage, s3_objects):
+    # поведение до распараллеливания: по одному запросу за раз
+    for s3_object in s3_objects:
+        await storage.get_s3_object(bucket_name=s3_object.bucket_name, object_key=s3_object.s3_key)
+
+
+async def fetch_concurrent(storage, s3_objects):
+    await storage.get_s3_objects(s3_objects)
+
+
+def add_latency(storage, latency: float):
+    async def delay_request(**_):
+        await asyncio.sleep(latency)
+
+    storage._client.meta.events.register("before-send.s3.GetObject", delay_request)
+
+
+async def measure(name: str, storage, fetch_func, s3_objects, rounds: int, latency: float):
+    await storage.init()
+    if latency:
+        add_latency(storage, latency)
+    await fetch_func(storage, s3_objects)
+
+    t0 = perf_counter()
+    for _ in range(rounds):
+        await fetch_func(storage, s3_objects)
+    elapsed = perf_counter() - t0
+    print(f"{name:>16}: {len(s3_objects) * rounds / elapsed:>10,.0f} objects/s ({elapsed:.3f} s)")
+
+
+async def run(args):
+    from extractor_service.common.struct.data_storage.s3 import S3Storage
+    from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+
+    s3_objects = [S3ObjectId(bucket_name=args.bucket, s3_key=f"object_{idx}") for idx in range(args.objects)]
+
+    storage = S3Storage(max_pool_connections=1)
+    await storage.init()
+    await create_objects(storage, args.bucket, args.objects, args.size)
+    await measure("sequential", storage, fetch_sequential, s3_objects, args.rounds, args.latency)
+    await storage.close()
+
+    for pool_size in args.pool_sizes:
+        storage = S3Storage(max_pool_connections=pool_size)
+        await measure(f"concurrent ({pool_size})", storage, fetch_concurrent, s3_objects, args.rounds, args.latency)
+        await storage.close()
+
+
+def main():
+    parser = ArgumentParser(description="S3 batch fetch throughput")
+    parser.add_argument("--endpoint-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--bucket", default="benchmark")
+    parser.add_argument("--objects", type=int, default=50, help="объектов в пачке")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="размер объекта, байт")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка сети на запрос, с")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[4, 16, 32])
+    args = parser.parse_args()
+
+    # настройки клиента читаются из переменных среды при импорте
+    os.environ.setdefault("S3_ENDPOINT_URL", args.endpoint_url)
+    os.environ.setdefault("S3_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("S3_SECRET_KEY", "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк сериализации результатов: прежняя запись json.dumps(indent=2) со строкой и ее кодированием,
+новая (orjson, компактно и с отступами, и стандартный json при его отсутствии), а также ответ API:
+jsonable_encoder + json (как в FastAPI) против готового ответа models_response.
+"""
+import gc
+import json
+import random
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+ROOT_DIR = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from fastapi.encoders import jsonable_encoder
+
+from extractor_service.common.func import serialization
+from extractor_service.common.func.serialization import dumps, models_response
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionResponseMsg, \
+    AbbreviationExtractionResultsData, S3ObjectProcessed
+
+WORDS = ("информационные", "технологии", "система", "управления", "базы", "данных", "обработки",
+         "естественного", "языка", "программного", "обеспечения", "сети", "передачи")
+
+
+def make_expansions(abbreviations: int, rnd: random.Random) -> dict:
+    return {
+        "".join(rnd.choice(WORDS)[0].upper() for _ in range(rnd.randint(2, 4))): {
+            " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 4))): rnd.randint(1, 20)
+            for _ in range(rnd.randint(1, 3))
+        }
+        for _ in range(abbreviations)
+    }
+
+
+def dumps_legacy(expansions: dict) -> bytes:
+    return json.dumps(expansions, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def dumps_stdlib(expansions: dict) -> bytes:
+    orjson, serialization.orjson = serialization.orjson, None
+    try:
+        return dumps(expansions)
+    finally:
+        serialization.orjson = orjson
+
+
+def measure(name: str, func: Callable, items: list):
+    for item in items[:10]:
+        func(item)
+    gc.collect()
+
+    t0 = perf_counter()
+    size = sum(len(func(item)) for item in items)
+    elapsed = perf_counter() - t0
+    print(f"{name:>22}: {len(items) / elapsed:>10,.0f} items/s, {size / len(items):>8,.0f} bytes/item")
+
+
+def response_legacy(msgs: list) -> bytes:
+    # FastAPI без response_class: jsonable_encoder и json.dumps
+    return json.dumps(jsonable_encoder(msgs), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def response_prepared(msgs: list) -> bytes:
+    return models_response(msgs).body
+
+
+def main():
+    parser = ArgumentParser(description="Result and response serialization throughput")
+    parser.add_argument("--results", type=int, default=20000, help="число результатов")
+    parser.add_argument("--abbreviations", type=int, default=30, help="аббревиатур в результате")
+    parser.add_argument("--responses", type=int, default=50, help="число ответов API")
+    parser.add_argument("--containers", type=int, default=500, help="контейнеров в ответе")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    results = [make_expansions(args.abbreviations, rnd) for _ in range(args.results)]
+    print(f"orjson: {'yes' if serialization.orjson is not None else 'no'}")
+    measure("json indent=2", dumps_legacy, results)
+    measure("stdlib json compact", dumps_stdlib, results)
+    measure("dumps", dumps, results)
+    measure("dumps indent", lambda item: dumps(item, indent=True), results)
+
+    responses = [
+        [AbbreviationExtractionResponseMsg(data=AbbreviationExtractionResultsData(s3_objects=[
+            S3ObjectProcessed(container_id=str(idx), bucket_name="bucket", s3_key=f"results/{idx}",
+                              user_data={"source": "benchmark", "idx": idx})
+            for idx in range(args.containers)
+        ]))]
+        for _ in range(args.responses)
+    ]
+    measure("jsonable_encoder", response_legacy, responses)
+    measure("models_response", response_prepared, responses)
+
+
+if __name__ == "__main__":
+    main()
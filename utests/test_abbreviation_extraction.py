@@ -1,4 +1,7 @@
 import json
+import logging
+from functools import partial
+
 import pytest
 from unittest.mock import AsyncMock
 
@@ -6,7 +9,15 @@ from extractor_service.technologies.abbreviation_extraction.utils.abbreviation_e
 
 from extractor_service.common.func.misc import S3ContentType
 from extractor_service.common.struct.language import LanguageEnum
-from extractor_service.common.struct.model.abbreviation_extractor import ExpansionToSave
+from extractor_service.common.struct.model.abbreviation_extractor import ExpansionToSave, \
+    AbbreviationExtractorTextResult
+from extractor_service.common.struct.model.common import TextContainerInfo
+from extractor_service.common.struct.pipeline import Pipeline, PipelineStep
+from extractor_service.technologies.abbreviation_extraction.utils.inline import load_texts, load_expansions
+from extractor_service.technologies.abbreviation_extraction.utils.merge import merge_contents
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionTextResultsData
+from utils.status import StatusCodes
+import extractor_service.common.globals as aes_globals
 
 
 @pytest.mark.asyncio
@@ -31,7 +42,8 @@ async def test_extract_function():
     assert len(results) == 1
     result_obj = results[0]
 
-    expected_json = json.dumps(dummy_expansions_obj.expansions, ensure_ascii=False, indent=2)
+    # по умолчанию результат записывается компактно
+    expected_json = json.dumps(dummy_expansions_obj.expansions, ensure_ascii=False, separators=(",", ":"))
     expected_bytes = expected_json.encode("utf-8")
     expected_length = len(expected_bytes)
 
@@ -49,6 +61,48 @@ async def test_extract_function():
     )
 
 
+@pytest.mark.asyncio
+async def test_inline_text_pipeline():
+    aes_globals.service_logger = logging.getLogger("test_abbreviation_extraction")
+    abbreviation_detector_model = AsyncMock()
+    expansion_detector_model = AsyncMock()
+    abbreviation_detector_model.detect_abbreviations.return_value = type("DummyAbbr", (), {"abbreviations": ["ИТ"]})()
+    expansion_detector_model.detect_expansions.return_value = type(
+        "DummyExp", (), {"expansions": {"ИТ": {"информационные технологии": 1}}}
+    )()
+
+    attr_mapping = {"content_id": "key_"}
+    pipeline = Pipeline(initial_step=PipelineStep(partial(load_texts, max_length=100), attr_mapping=attr_mapping),
+                        in_item_type=TextContainerInfo,
+                        out_item_type=AbbreviationExtractorTextResult)
+    pipeline.add_branch(
+        PipelineStep(merge_contents, attr_mapping=attr_mapping),
+        PipelineStep(partial(extract,
+                             abbreviation_detector_model=abbreviation_detector_model,
+                             expansion_detector_model=expansion_detector_model),
+                     attr_mapping=attr_mapping),
+        PipelineStep(load_expansions, attr_mapping=attr_mapping),
+    )
+
+    texts = [
+        TextContainerInfo(container_id="short", text="ИТ-отдел", user_data={"id": 1}),
+        TextContainerInfo(container_id="long", text="a" * 101, user_data={}),
+    ]
+    results = await pipeline.start(texts, meta={"language": LanguageEnum.RUSSIAN})
+    results = {result.container_id: result for result in results}
+
+    assert results["short"].expansions == {"ИТ": {"информационные технологии": 1}}
+    assert results["short"].user_data == {"id": 1}
+    assert results["long"].status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+    # текст проходит ту же сборку, что и объект из S3
+    expansion_detector_model.detect_expansions.assert_awaited_once()
+    assert expansion_detector_model.detect_expansions.await_args.kwargs["text"] == "ИТ-отдел."
+
+    response = AbbreviationExtractionTextResultsData(texts=[results["short"]])
+    assert response.texts[0].expansions == {"ИТ": {"информационные технологии": 1}}
+
+
 def test_abbreviation_detector(monkeypatch):
     """
     Тест для класса AbbreviationDetector.
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from multiprocessing import Process, Queue
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.mixins import controlled_runnable_mixin
+from extractor_service.common.struct.mixins.controlled_runnable_mixin import BaseResources, OutMsg
+from extractor_service.common.struct.resource_manager import ResourceManager
+from extractor_service.resource_models.base_resource_model import BaseResourceModel, BaseProxyModel
+from utils.aes_utils.models.base_model import BaseModel
+
+
+class EchoData(BaseModel):
+    value: int
+
+
+class EchoModel(BaseResourceModel):
+    def __init__(self, replicas: int):
+        super().__init__(name="echo", proxy_type=BaseProxyModel, replicas=replicas)
+
+    def handle_data(self, resources: BaseResources, task_data: EchoData):
+        return task_data
+
+
+def _request_from_worker(resource_manager: ResourceManager, reply_to: int, results):
+    """ Процесс API: унаследованный менеджер ресурсов и свой канал ответов """
+    resource_manager.bind_reply_channel(reply_to)
+    proxy = resource_manager.get_resource("echo")
+    results.put(asyncio.run(proxy.request(EchoData(value=reply_to))).value)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    aes_globals.service_logger = logging.getLogger("test_api_workers")
+    monkeypatch.setattr(controlled_runnable_mixin, "API_WORKERS", 2)
+
+    manager = ResourceManager()
+    manager.register("echo", EchoModel(replicas=1))
+    manager.start()
+    yield manager
+    manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_process_uses_shared_replicas_and_own_reply_queue(manager):
+    results = Queue()
+    worker = Process(target=_request_from_worker, args=(manager, 1, results))
+    worker.start()
+
+    # запрос основного процесса (канал 0) выполняется теми же репликами одновременно с запросом процесса API
+    out_data = await manager.get_resource("echo").request(EchoData(value=0))
+    assert out_data.value == 0
+
+    assert await asyncio.to_thread(results.get, True, 30) == 1
+    await asyncio.to_thread(worker.join, 30)
+    assert worker.exitcode == 0
+
+    model = manager._resource_models["echo"]
+    assert model.reply_queue(0).empty() and model.reply_queue(1).empty()
+
+
+@pytest.mark.asyncio
+async def test_restarted_worker_does_not_get_replies_of_exited_one(manager):
+    # ответ, который завершившийся процесс API не успел прочитать
+    model = manager._resource_models["echo"]
+    model.reply_queue(1).put(OutMsg.construct(uuid="stale", data=None, partial=False))
+    while model.reply_queue(1).empty():
+        await asyncio.sleep(0.01)
+
+    assert manager.drain_replies(1) == 1
+    assert model.reply_queue(1).empty()
+
+    results = Queue()
+    worker = Process(target=_request_from_worker, args=(manager, 1, results))
+    worker.start()
+    assert await asyncio.to_thread(results.get, True, 30) == 1
+    await asyncio.to_thread(worker.join, 30)
+    assert worker.exitcode == 0
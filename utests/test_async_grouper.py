@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from utils.aes_utils.common import async_grouper
+
+
+async def _gen(items, delay: float = 0, pause_after: int = None, pause: float = 0):
+    for idx, item in enumerate(items):
+        if pause_after is not None and idx == pause_after:
+            await asyncio.sleep(pause)
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def _collect(gen):
+    return [batch async for batch in gen]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("linger", [None, 10])
+async def test_fixed_batches(linger):
+    batches = await _collect(async_grouper(_gen(range(5)), 2, linger=linger))
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("linger", [None, 10])
+async def test_single_batch(linger):
+    batches = await _collect(async_grouper(_gen(range(5)), -1, linger=linger))
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_linger_flushes_partial_batch():
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    timings = []
+    batches = []
+    async for batch in async_grouper(_gen(range(4), pause_after=3, pause=0.3), 10, linger=0.02):
+        timings.append(loop.time() - t0)
+        batches.append(batch)
+
+    assert batches == [[0, 1, 2], [3]]
+    # неполная пачка отправлена до того, как источник продолжил выдачу
+    assert timings[0] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_linger_propagates_errors():
+    async def failing():
+        yield 1
+        raise RuntimeError("source failed")
+
+    with pytest.raises(RuntimeError):
+        await _collect(async_grouper(failing(), 10, linger=0.01))
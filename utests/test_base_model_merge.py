@@ -0,0 +1,48 @@
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+from extractor_service.common.struct.model.common import BaseData
+
+
+class Left(BaseData):
+    text: str
+
+
+class Right(BaseData):
+    text: str
+    length: int
+
+
+class Other(BaseData):
+    text: str
+
+
+class TestMergedTypeRegistry:
+    def test_merged_type_is_reused(self):
+        first = Left(key_="1", text="a").merge(Right(key_="1", text="b", length=1))
+        second = Left(key_="2", text="c").merge(Right(key_="2", text="d", length=2))
+
+        assert type(first) is type(second)
+        assert issubclass(type(first), Left)
+        assert Left.merged_type(Right) == (type(first), ("length",))
+
+    def test_merge_values_and_status(self):
+        error = Status.make_status(status=StatusCodes.INTERNAL_ERROR)
+        merged = Left(key_="1", text="a").merge(Right(key_="1", text="b", length=5, status=error))
+
+        assert merged.text == "a"
+        assert merged.length == 5
+        assert merged.status.code == StatusCodes.INTERNAL_ERROR.code
+
+    def test_no_new_fields_keeps_type(self):
+        merged = Left(key_="1", text="a").merge(Other(key_="1", text="b"))
+        assert type(merged) is Left
+
+    def test_inplace_merge(self):
+        left = Left(key_="1", text="a")
+        merged = left.merge(Right(key_="1", text="b", length=3), inplace=True)
+
+        assert merged is left
+        assert type(left) is Left.merged_type(Right)[0]
+        assert left.length == 3
+        assert left.dict()["length"] == 3
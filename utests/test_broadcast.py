@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.broadcast import BoundedBroadcast
+from extractor_service.common.struct.metrics import MetricsRegistry
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    aes_globals.metrics = MetricsRegistry()
+    yield aes_globals.metrics
+
+
+async def produce(count: int, state: dict):
+    for idx in range(count):
+        state["produced"] += 1
+        yield idx
+
+
+async def collect(gen, delay: float = 0):
+    items = []
+    async for item in gen:
+        items.append(item)
+        if delay:
+            await asyncio.sleep(delay)
+    return items
+
+
+@pytest.mark.asyncio
+async def test_every_consumer_gets_all_items():
+    state = {"produced": 0}
+    broadcast = BoundedBroadcast(produce(10, state), consumers=3, buffer_size=2)
+
+    results = await asyncio.gather(*(collect(gen) for gen in broadcast.start()))
+
+    assert results == [list(range(10))] * 3
+    assert max(broadcast.high_water_marks) <= 2
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_applies_backpressure(metrics):
+    state = {"produced": 0}
+    broadcast = BoundedBroadcast(produce(100, state), consumers=2, buffer_size=4)
+    fast, slow = broadcast.start()
+
+    fast_task = asyncio.create_task(collect(fast))
+    await asyncio.sleep(0.01)
+
+    # быстрый потребитель не может увести источник дальше буфера медленного
+    assert state["produced"] <= 4 + 1
+    assert not fast_task.done()
+
+    slow_items = await collect(slow)
+    assert slow_items == list(range(100))
+    assert await fast_task == list(range(100))
+    assert metrics.snapshot()["pipeline.broadcast.buffer_high_water"] == 4
+
+
+@pytest.mark.asyncio
+async def test_closed_consumer_does_not_block_source():
+    state = {"produced": 0}
+    broadcast = BoundedBroadcast(produce(50, state), consumers=2, buffer_size=2)
+    main, abandoned = broadcast.start()
+
+    broadcast.close_consumer(1)
+
+    assert await collect(main) == list(range(50))
+
+
+@pytest.mark.asyncio
+async def test_source_error_propagates_to_consumers():
+    async def failing_source():
+        yield 1
+        raise RuntimeError("source failed")
+
+    broadcast = BoundedBroadcast(failing_source(), consumers=2, buffer_size=2)
+    for gen in broadcast.start():
+        with pytest.raises(RuntimeError):
+            await collect(gen)
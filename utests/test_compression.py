@@ -0,0 +1,174 @@
+import gzip
+import logging
+from io import BytesIO
+
+import pytest
+import zstandard
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.content_loader import S3ContentsLoader
+from extractor_service.common.struct.data_storage.compression import DecompressingStream, compress, detect_encoding
+from extractor_service.common.struct.data_storage.filesystem import FileSystemStorage
+from extractor_service.common.struct.data_storage.s3 import S3Storage
+from extractor_service.common.struct.metrics import MetricsRegistry
+from utils.aes_utils.exceptions import S3Exception
+from utils.status import StatusCodes
+
+TEXT = "Информационные технологии (ИТ). " * 100
+
+
+class BytesStream:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offset = 0
+
+    async def __aenter__(self):
+        return object()
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self, amt: int = -1) -> bytes:
+        end = len(self._data) if amt < 0 else self._offset + amt
+        chunk = self._data[self._offset:end]
+        self._offset += len(chunk)
+        return chunk
+
+
+async def _read_all(stream: DecompressingStream, amt: int = 1000) -> bytes:
+    parts = []
+    while True:
+        chunk = await stream.read(amt)
+        if not chunk:
+            return b"".join(parts)
+        assert len(chunk) <= amt
+        parts.append(chunk)
+
+
+def test_detect_encoding():
+    assert detect_encoding("gzip", b"") == "gzip"
+    assert detect_encoding("zstd", b"") == "zstd"
+    assert detect_encoding(None, gzip.compress(b"text")) == "gzip"
+    assert detect_encoding("identity", zstandard.ZstdCompressor().compress(b"text")) == "zstd"
+    assert detect_encoding(None, b"text") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+async def test_stream_is_decompressed(compression):
+    data = TEXT.encode("utf-8")
+    stream = DecompressingStream(BytesStream(compress(data, compression)), read_size=64)
+
+    assert await _read_all(stream) == data
+
+
+@pytest.mark.asyncio
+async def test_uncompressed_stream_is_passed_through():
+    data = TEXT.encode("utf-8")
+
+    assert await _read_all(DecompressingStream(BytesStream(data), read_size=3)) == data
+    assert await _read_all(DecompressingStream(BytesStream(b""))) == b""
+
+
+@pytest.mark.asyncio
+async def test_concatenated_gzip_members():
+    stream = DecompressingStream(BytesStream(gzip.compress(b"first ") + gzip.compress(b"second")))
+
+    assert await _read_all(stream) == b"first second"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+async def test_decompressed_size_limit(compression):
+    # "бомба": несколько килобайт сжатых данных распаковываются в десятки мегабайт
+    bomb = compress(b"\0" * 64 * 1024 * 1024, compression)
+    stream = DecompressingStream(BytesStream(bomb), max_size=1024 * 1024)
+
+    with pytest.raises(S3Exception) as ex_info:
+        await _read_all(stream, amt=64 * 1024)
+    assert ex_info.value.status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+
+@pytest.mark.asyncio
+async def test_broken_gzip():
+    with pytest.raises(S3Exception) as ex_info:
+        await _read_all(DecompressingStream(BytesStream(gzip.compress(TEXT.encode("utf-8"))[:-20])))
+    assert ex_info.value.status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("checksum", [False, True])
+async def test_truncated_zstd(checksum):
+    data = zstandard.ZstdCompressor(write_checksum=checksum).compress(TEXT.encode("utf-8"))
+    # кадры подряд, в том числе пропускаемый, читаются целиком
+    frames = data + zstandard.ZstdCompressor().compress(b"!") + b"\x50\x2a\x4d\x18\x02\x00\x00\x00ab"
+    assert await _read_all(DecompressingStream(BytesStream(frames))) == TEXT.encode("utf-8") + b"!"
+
+    for size in (len(data) - 1, len(data) - 4, 10):
+        with pytest.raises(S3Exception) as ex_info:
+            await _read_all(DecompressingStream(BytesStream(data[:size])))
+        assert ex_info.value.status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+
+class CompressedS3Client:
+    def __init__(self, data: bytes, content_encoding: str = None):
+        self.data = data
+        self.content_encoding = content_encoding
+
+    async def get_object(self, Bucket: str, Key: str):
+        resp = {"Body": BytesStream(self.data), "ContentLength": len(self.data)}
+        if self.content_encoding:
+            resp["ContentEncoding"] = self.content_encoding
+        return resp
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression, content_encoding", [("gzip", "gzip"), ("zstd", None)])
+async def test_s3_storage_reads_compressed_objects(compression, content_encoding):
+    storage = S3Storage(disk_cache_dir=None)
+    storage._client = CompressedS3Client(compress(TEXT.encode("utf-8"), compression), content_encoding)
+
+    assert await storage.get_s3_object(bucket_name="bucket", object_key="key") == TEXT
+
+
+@pytest.mark.asyncio
+async def test_filesystem_storage_reads_compressed_files(tmp_path):
+    (tmp_path / "bucket").mkdir()
+    (tmp_path / "bucket" / "object.txt.zst").write_bytes(compress(TEXT.encode("utf-8"), "zstd"))
+    storage = FileSystemStorage(str(tmp_path), chunk_size=128)
+
+    chunks = await storage.get_s3_object_chunks(bucket_name="bucket", object_key="object.txt.zst")
+    assert "".join(chunks) == TEXT
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.objects = {}
+
+    async def put_s3_object(self, bucket_name, object_id, data, data_length, file_type, content_encoding=None):
+        assert data_length == len(data.getvalue())
+        self.objects[object_id] = (data.getvalue(), content_encoding)
+        return object_id
+
+
+@pytest.mark.asyncio
+async def test_results_are_uploaded_compressed():
+    aes_globals.service_logger = logging.getLogger("test_compression")
+    aes_globals.metrics = MetricsRegistry()
+    storage = RecordingStorage()
+    loader = S3ContentsLoader(storage=storage)
+    data = TEXT.encode("utf-8")
+
+    created = await loader.put_content(content_id="result",
+                                       file_data=BytesIO(data),
+                                       bucket_name="bucket",
+                                       data_length=len(data),
+                                       file_type=S3ContentType.JSON,
+                                       compression="gzip")
+
+    assert created.s3_key == "result"
+    body, content_encoding = storage.objects["result"]
+    assert content_encoding == "gzip"
+    assert len(body) < len(data)
+    assert gzip.decompress(body) == data
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct import content_loader
+from extractor_service.common.struct.cache import TTLCache
+from extractor_service.common.struct.content_loader import ContentsLoader
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.single_flight import SingleFlight
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+
+
+class DummyLoader(ContentsLoader):
+    async def get_contents(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+async def _produce(queue: asyncio.Queue, items, produced: list):
+    for item in items:
+        await queue.put(item)
+        produced.append(item)
+
+
+@pytest.mark.asyncio
+async def test_gen_as_ready_bounded_queue():
+    loader = DummyLoader()
+    queue = asyncio.Queue(maxsize=2)
+    produced = []
+    tasks = [asyncio.create_task(_produce(queue, range(10), produced))]
+
+    results = []
+    async for item in loader.gen_as_ready(tasks, queue):
+        # производитель не уходит дальше размера очереди (+1 элемент, ожидающий put)
+        assert len(produced) - len(results) <= 3
+        results.append(item)
+        await asyncio.sleep(0)
+
+    assert results == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_gen_as_ready_raises_task_errors():
+    async def failing(queue: asyncio.Queue):
+        await queue.put(1)
+        raise RuntimeError("fetch failed")
+
+    loader = DummyLoader()
+    queue = asyncio.Queue(maxsize=2)
+    tasks = [asyncio.create_task(failing(queue))]
+
+    results = []
+    with pytest.raises(RuntimeError):
+        async for item in loader.gen_as_ready(tasks, queue):
+            results.append(item)
+    assert results == [1]
+
+
+class FakeS3Storage:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+
+    async def get_s3_object_chunks(self, bucket_name: str, object_key: str, encoding: str = "utf-8"):
+        self.calls.append((bucket_name, object_key))
+        await asyncio.sleep(self.delay)
+        return [f"{bucket_name}/", object_key]
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def s3_loader(monkeypatch):
+    def make(cache_ttl_sec: float = 0):
+        aes_globals.service_logger = logging.getLogger("test_content_loader")
+        aes_globals.metrics = MetricsRegistry()
+        monkeypatch.setattr(content_loader, "S3_OBJECT_CACHE_TTL_SEC", cache_ttl_sec)
+
+        return content_loader.S3ContentsLoader(storage=FakeS3Storage())
+    return make
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_are_coalesced(s3_loader):
+    loader = s3_loader()
+    shared = S3ObjectId(bucket_name="bucket", s3_key="shared")
+    other = S3ObjectId(bucket_name="bucket", s3_key="other")
+
+    results = await asyncio.gather(
+        loader.fetch_objects([shared]),
+        loader.fetch_objects([shared, other]),
+        loader.fetch_objects([shared]),
+    )
+
+    assert all(result[shared] == ["bucket/", "shared"] for result in results)
+    assert sorted(loader._storage.calls) == [("bucket", "other"), ("bucket", "shared")]
+    assert aes_globals.metrics.snapshot()["content_loader.s3.fetches_saved"] == 2
+
+    # после завершения загрузки объект запрашивается заново (кэш выключен)
+    await loader.fetch_object(shared)
+    assert len(loader._storage.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_saves_sequential_fetches(s3_loader):
+    loader = s3_loader(cache_ttl_sec=60)
+    s3_object = S3ObjectId(bucket_name="bucket", s3_key="key")
+
+    assert await loader.fetch_object(s3_object) == ["bucket/", "key"]
+    assert await loader.fetch_object(s3_object) == ["bucket/", "key"]
+
+    assert len(loader._storage.calls) == 1
+    assert aes_globals.metrics.snapshot()["content_loader.s3.fetches_cached"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_errors_and_survives_cancel():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(0.01)
+        raise RuntimeError("fetch failed")
+
+    leader = asyncio.create_task(flight.do("key", fetch))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+
+    # отмена инициатора не прерывает загрузку для остальных
+    leader.cancel()
+    with pytest.raises(RuntimeError):
+        await follower
+    assert len(flight) == 0
+
+
+def test_ttl_cache_expires_and_bounds_size():
+    cache = TTLCache(ttl_sec=0.01, max_bytes=6)
+    cache.put("a", "123")
+    cache.put("b", "123")
+    cache.put("c", "123")
+    assert cache.get("a") is None
+    assert cache.get("c") == "123"
+
+    time.sleep(0.02)
+    assert cache.get("c") is None
@@ -0,0 +1,88 @@
+import logging
+from io import BytesIO
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.content_loader import S3ContentsLoader
+from extractor_service.common.struct.data_storage.factory import create_data_storage
+from extractor_service.common.struct.data_storage.filesystem import FileSystemStorage
+from extractor_service.common.struct.metrics import MetricsRegistry
+from utils.aes_utils.exceptions import S3Exception
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+from utils.status import StatusCodes
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return FileSystemStorage(str(tmp_path), chunk_size=4, max_object_size=64)
+
+
+@pytest.mark.asyncio
+async def test_put_and_get_object(storage, tmp_path):
+    data = "Информационные технологии".encode("utf-8")
+    object_key = await storage.put_s3_object(bucket_name="bucket",
+                                             object_id="dir/object.txt",
+                                             data=BytesIO(data),
+                                             data_length=len(data),
+                                             file_type=S3ContentType.TEXT)
+
+    assert object_key == "dir/object.txt"
+    assert (tmp_path / "bucket" / "dir" / "object.txt").read_bytes() == data
+    # временные файлы записи не остаются в каталоге
+    assert [path.name for path in (tmp_path / "bucket" / "dir").iterdir()] == ["object.txt"]
+
+    # многобайтовые символы на границах частей собираются декодером
+    chunks = await storage.get_s3_object_chunks(bucket_name="bucket", object_key="dir/object.txt")
+    assert len(chunks) > 1
+    assert "".join(chunks) == "Информационные технологии"
+    assert await storage.get_s3_object(bucket_name="bucket", object_key="dir/object.txt") == \
+           "Информационные технологии"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bucket_name, object_key", [
+    ("bucket", "missing.txt"),
+    ("bucket", "../other/object.txt"),
+    ("bucket", "/etc/passwd"),
+    ("..", "object.txt"),
+])
+async def test_missing_and_invalid_objects(storage, tmp_path, bucket_name, object_key):
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "object.txt").write_text("text")
+
+    with pytest.raises(S3Exception) as ex_info:
+        await storage.get_s3_object_chunks(bucket_name=bucket_name, object_key=object_key)
+    assert ex_info.value.status.code == StatusCodes.CONTENT_NOT_FOUND.code
+
+
+@pytest.mark.asyncio
+async def test_object_size_limit(storage, tmp_path):
+    (tmp_path / "bucket").mkdir()
+    (tmp_path / "bucket" / "large.txt").write_bytes(b"a" * 65)
+
+    with pytest.raises(S3Exception) as ex_info:
+        await storage.get_s3_object_chunks(bucket_name="bucket", object_key="large.txt")
+    assert ex_info.value.status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+
+@pytest.mark.asyncio
+async def test_contents_loader_reads_from_filesystem(tmp_path):
+    aes_globals.service_logger = logging.getLogger("test_filesystem_storage")
+    aes_globals.metrics = MetricsRegistry()
+    (tmp_path / "bucket").mkdir()
+    (tmp_path / "bucket" / "object.txt").write_text("текст", encoding="utf-8")
+
+    loader = S3ContentsLoader(storage=create_data_storage(backend="filesystem", root_dir=str(tmp_path)))
+    s3_object = S3ObjectId(bucket_name="bucket", s3_key="object.txt")
+
+    assert await loader.fetch_objects([s3_object]) == {s3_object: ["текст"]}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_data_storage(backend="ftp")
+
+    with pytest.raises(ValueError):
+        create_data_storage(backend="filesystem", root_dir=None)
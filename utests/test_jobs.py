@@ -0,0 +1,248 @@
+import asyncio
+import logging
+
+import pytest
+from aiohttp import web
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.job_manager import JobManager
+from extractor_service.common.struct.job_store import JobStore
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorS3Result
+from extractor_service.common.struct.model.common import S3ContainerInfo
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+class FakeTech:
+    """ Технология без извлечения; после stop_after результатов ждет бесконечно (процесс "упал") """
+
+    def __init__(self, stop_after: int = None, missing=(), unexpected=()):
+        self.stop_after = stop_after
+        # контейнеры, для которых технология не выдает результата
+        self.missing = set(missing)
+        # лишние результаты, выдаваемые перед результатами запроса
+        self.unexpected = list(unexpected)
+        self.produced = 0
+        self.requested = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handle_stream(self, data, language, cache_mode):
+        self.requested.extend(container.container_id for container in data)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            for container_id in self.unexpected:
+                yield AbbreviationExtractorS3Result.construct(key_=container_id, container_id=container_id,
+                                                              user_data={}, bucket_name=None, s3_key=None,
+                                                              line_index=None, offset=None,
+                                                              status=Status.make_status(status=StatusCodes.OK))
+            for container in data:
+                if self.stop_after is not None and self.produced >= self.stop_after:
+                    await asyncio.Event().wait()
+                self.produced += 1
+                await asyncio.sleep(0.001)
+                if container.container_id in self.missing:
+                    continue
+                status = Status.make_status(status=StatusCodes.CONTENT_NOT_FOUND if container.container_id == "bad"
+                                            else StatusCodes.OK)
+                yield AbbreviationExtractorS3Result.construct(key_=container.key_,
+                                                              container_id=container.container_id,
+                                                              user_data=container.user_data,
+                                                              bucket_name=container.reply_bucket_name,
+                                                              s3_key=f"results/{container.container_id}.json",
+                                                              line_index=None, offset=None, status=status)
+        finally:
+            self.running -= 1
+
+
+class FakeResourceManager:
+    def __init__(self, tech: FakeTech):
+        self.tech = tech
+
+    def get_resource(self, name):
+        return self.tech
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    aes_globals.service_logger = logging.getLogger("test_jobs")
+    aes_globals.metrics = MetricsRegistry()
+    yield aes_globals.metrics
+
+
+def _manager(tech: FakeTech, store: JobStore, max_running: int = 2, chunk_size: int = 2,
+             retention_sec: float = 3600, purge_period_sec: float = 3600) -> JobManager:
+    return JobManager(FakeResourceManager(tech), store, max_running=max_running, chunk_size=chunk_size,
+                      persist_batch_size=1, retention_sec=retention_sec, webhook_timeout_sec=1, webhook_tries=2,
+                      webhook_retry_delay_sec=0.01, purge_period_sec=purge_period_sec)
+
+
+def _containers(*ids: str):
+    return [S3ContainerInfo(container_id=container_id,
+                            s3_object=[S3ObjectId(bucket_name="bucket", s3_key=f"texts/{container_id}.txt")],
+                            user_data={"id": container_id},
+                            reply_bucket_name="replies")
+            for container_id in ids]
+
+
+async def _wait(manager: JobManager, job_id: str, processed: int = None):
+    for _ in range(500):
+        job = await manager.get(job_id)
+        if processed is not None and job.processed >= processed:
+            return job
+        if processed is None and job.status.code not in (StatusCodes.WAITING.code, StatusCodes.IN_PROGRESS.code):
+            return job
+        await asyncio.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+@pytest.mark.asyncio
+async def test_job_results_are_paged_in_request_order():
+    tech = FakeTech()
+    manager = _manager(tech, JobStore())
+    await manager.start()
+
+    job = await manager.submit(_containers("a", "bad", "c", "a"), language="ru", cache_mode="use")
+    assert job.status.code == StatusCodes.WAITING.code and job.total == 4
+
+    done = await _wait(manager, job.job_id)
+    assert done.status.code == StatusCodes.OK.code
+    assert (done.processed, done.failed) == (4, 1)
+
+    page = await manager.get(job.job_id, offset=1, limit=2)
+    assert [item.container_id for item in page.s3_objects] == ["bad", "c"]
+    assert page.s3_objects[0].status.code == StatusCodes.CONTENT_NOT_FOUND.code
+    assert page.s3_objects[1].s3_key == "results/c.json" and page.s3_objects[1].user_data == {"id": "c"}
+    assert await manager.get("unknown") is None
+    await manager.stop()
+
+    snapshot = aes_globals.metrics.snapshot()
+    assert snapshot["jobs.submitted"] == snapshot["jobs.completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_restart_resumes_incomplete_containers(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    interrupted = FakeTech(stop_after=3)
+    manager = _manager(interrupted, JobStore(path))
+    await manager.start()
+    job = await manager.submit(_containers("0", "1", "2", "3", "4"), language="ru", cache_mode="use")
+
+    # первая часть обработана, во второй - один результат из двух
+    await _wait(manager, job.job_id, processed=3)
+    await manager.stop()
+
+    tech = FakeTech()
+    manager = _manager(tech, JobStore(path))
+    await manager.start()
+    done = await _wait(manager, job.job_id)
+
+    assert tech.requested == ["3", "4"]
+    assert done.status.code == StatusCodes.OK.code and done.processed == 5
+    page = await manager.get(job.job_id, limit=10)
+    assert [item.container_id for item in page.s3_objects] == ["0", "1", "2", "3", "4"]
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_jobs_share_bounded_concurrency():
+    tech = FakeTech()
+    manager = _manager(tech, JobStore(), max_running=1)
+    await manager.start()
+
+    jobs = [await manager.submit(_containers(*(f"{job}-{idx}" for idx in range(4))), language="ru",
+                                 cache_mode="use")
+            for job in range(3)]
+    assert aes_globals.metrics.snapshot()["jobs.queued"] >= 1
+    for job in jobs:
+        assert (await _wait(manager, job.job_id)).status.code == StatusCodes.OK.code
+
+    assert tech.max_running == 1
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_webhook_is_posted_on_completion():
+    received = []
+
+    async def on_webhook(request: web.Request):
+        received.append(await request.json())
+        # первая попытка неудачна: уведомление повторяется
+        return web.Response(status=503 if len(received) == 1 else 200)
+
+    app = web.Application()
+    app.router.add_post("/done", on_webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]    # noqa
+
+    try:
+        manager = _manager(FakeTech(), JobStore())
+        await manager.start()
+        job = await manager.submit(_containers("a"), language="ru", cache_mode="use",
+                                   webhook_url=f"http://127.0.0.1:{port}/done")
+        await _wait(manager, job.job_id)
+        for _ in range(100):
+            if len(received) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop()
+    finally:
+        await runner.cleanup()
+
+    assert len(received) == 2
+    assert received[-1]["Data"]["JobId"] == job.job_id
+    assert received[-1]["Data"]["Status"]["Code"] == StatusCodes.OK.code
+    assert received[-1]["Data"]["Processed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_containers_without_result_are_failed():
+    manager = _manager(FakeTech(missing={"lost"}), JobStore())
+    await manager.start()
+
+    job = await manager.submit(_containers("a", "lost", "c"), language="ru", cache_mode="use")
+    done = await asyncio.wait_for(_wait(manager, job.job_id), timeout=10)
+    assert done.status.code == StatusCodes.OK.code
+    assert (done.processed, done.failed) == (3, 1)
+
+    page = await manager.get(job.job_id, offset=0, limit=3)
+    assert [item.container_id for item in page.s3_objects] == ["a", "lost", "c"]
+    assert page.s3_objects[1].status.code == StatusCodes.INTERNAL_ERROR.code
+    assert page.s3_objects[1].user_data == {"id": "lost"}
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_unexpected_results_are_skipped():
+    manager = _manager(FakeTech(unexpected=["other"]), JobStore())
+    await manager.start()
+
+    job = await manager.submit(_containers("a", "b", "c"), language="ru", cache_mode="use")
+    done = await asyncio.wait_for(_wait(manager, job.job_id), timeout=10)
+    assert done.status.code == StatusCodes.OK.code
+    assert (done.processed, done.failed) == (3, 0)
+
+    page = await manager.get(job.job_id, offset=0, limit=3)
+    assert [item.container_id for item in page.s3_objects] == ["a", "b", "c"]
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_purged_periodically():
+    manager = _manager(FakeTech(), JobStore(), retention_sec=0.05, purge_period_sec=0.05)
+    await manager.start()
+
+    job = await manager.submit(_containers("a"), language="ru", cache_mode="use")
+    # задание удаляется после завершения, без перезапуска
+    for _ in range(100):
+        if await manager.get(job.job_id) is None:
+            break
+        await asyncio.sleep(0.02)
+    assert await manager.get(job.job_id) is None
+    await manager.stop()
@@ -0,0 +1,92 @@
+import logging
+from queue import Queue
+
+import pytest
+
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.process_logger import QueueHandler, summarize
+
+
+class Payload:
+    """ Значение, которое считает свои форматирования """
+
+    renders = 0
+
+    def __repr__(self):
+        Payload.renders += 1
+        return "payload"
+
+
+@pytest.fixture
+def make_logger():
+    handlers = []
+
+    def make(queue: Queue, metrics: MetricsRegistry, **kwargs) -> logging.Logger:
+        handler = QueueHandler(queue, metrics=metrics, flush_interval_sec=60, **kwargs)
+        handlers.append(handler)
+        logger = logging.getLogger(f"test_logging.{len(handlers)}")
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        return logger
+
+    yield make
+    for handler in handlers:
+        handler.close()
+
+
+def test_summary_is_short_and_lazy():
+    text = str(summarize({"items": list(range(1000)), "body": b"x" * 10, "text": "a" * 1000}))
+    assert "[0, 1, 2, ... (+997)]" in text
+    assert "<10 bytes>" in text and "(+800 chars)" in text
+
+    logger = logging.getLogger("test_logging.lazy")
+    logger.setLevel(logging.INFO)
+    Payload.renders = 0
+    logger.debug("Msg: %s", summarize([Payload()]))
+    assert Payload.renders == 0
+
+
+def test_records_are_sent_in_batches_and_drops_are_counted(make_logger):
+    queue, metrics = Queue(maxsize=1), MetricsRegistry()
+    logger = make_logger(queue, metrics, batch_size=3)
+
+    for idx in range(3):
+        logger.info("Record %d", idx)
+    assert [record.getMessage() for record in queue.get_nowait()] == ["Record 0", "Record 1", "Record 2"]
+
+    # WARNING отправляется сразу; следующая пачка не помещается в очередь
+    logger.warning("Warning")
+    logger.error("Lost")
+    assert metrics.snapshot()["logging.dropped"] == 1
+
+    assert [record.getMessage() for record in queue.get_nowait()] == ["Warning"]
+    logger.error("Error")
+    batch = queue.get_nowait()
+    assert batch[0].levelno == logging.WARNING and "Dropped 1 log records" in batch[0].getMessage()
+    assert batch[1].getMessage() == "Error"
+    assert metrics.snapshot()["logging.batches"] == 3
+
+
+def test_long_messages_are_truncated(make_logger):
+    queue = Queue()
+    logger = make_logger(queue, MetricsRegistry(), batch_size=1, max_message_length=10)
+
+    logger.info("%s", "x" * 100)
+    assert queue.get_nowait()[0].getMessage() == "x" * 10 + "... (+90 chars)"
+
+
+def test_repetitive_debug_records_are_sampled(make_logger):
+    queue, metrics = Queue(), MetricsRegistry()
+    logger = make_logger(queue, metrics, batch_size=100, debug_sample_rate=3)
+
+    for idx in range(7):
+        logger.debug("Run task '%s'", idx)
+    logger.debug("Other")
+    logger.info("Info %d", 1)
+    logger.info("Info %d", 2)
+    logger.handlers[0].flush()
+
+    messages = [record.getMessage() for record in queue.get_nowait()]
+    assert messages == ["Run task '0'", "Run task '3'", "Run task '6'", "Other", "Info 1", "Info 2"]
+    assert metrics.snapshot()["logging.sampled_out"] == 4
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.memory_profiler import MemoryProfiler
+from extractor_service.common.struct.mixins.controlled_runnable_mixin import BaseResources
+from extractor_service.common.struct.resource_manager import ResourceManager
+from extractor_service.resource_models.base_resource_model import BaseResourceModel, BaseProxyModel
+from utils.aes_utils.models.base_model import BaseModel
+from utils.status import StatusCodes
+
+
+class EchoModel(BaseResourceModel):
+    def __init__(self, replicas: int):
+        super().__init__(name="echo", proxy_type=BaseProxyModel, replicas=replicas)
+
+    def handle_data(self, resources: BaseResources, task_data):
+        return task_data
+
+
+class SleepData(BaseModel):
+    seconds: float
+
+
+class SleepModel(BaseResourceModel):
+    def __init__(self, replicas: int):
+        super().__init__(name="sleep", proxy_type=BaseProxyModel, replicas=replicas)
+
+    def handle_data(self, resources: BaseResources, task_data: SleepData):
+        time.sleep(task_data.seconds)
+        return task_data
+
+
+@pytest.fixture
+def service_logger():
+    aes_globals.service_logger = logging.getLogger("test_memory_snapshot")
+    yield aes_globals.service_logger
+
+
+class TestMemoryProfiler:
+    def test_snapshot_diff(self):
+        profiler = MemoryProfiler()
+        try:
+            profiler.snapshot(resource_name="test")
+            allocated = [bytearray(1024) for _ in range(1000)]  # noqa
+
+            data = profiler.snapshot(resource_name="test", top=5)
+        finally:
+            profiler.stop()
+
+        assert data.resource == "test"
+        assert data.pid == os.getpid()
+        assert data.traced_current > 0
+        assert len(data.top) <= 5
+        assert data.diff
+        assert max(stat.size_diff for stat in data.diff) >= 1024 * 1000
+
+    def test_stop_resets_baseline(self):
+        profiler = MemoryProfiler()
+        profiler.snapshot(resource_name="test", stop=True)
+        assert not profiler.tracing
+
+        data = profiler.snapshot(resource_name="test", stop=True)
+        assert data.diff == []
+
+    def test_type_summary(self):
+        profiler = MemoryProfiler()
+        data = profiler.snapshot(resource_name="test", top=3, with_types=True, stop=True)
+        assert 0 < len(data.types) <= 3
+
+
+@pytest.mark.asyncio
+async def test_snapshot_from_each_replica(service_logger):
+    manager = ResourceManager()
+    manager.register("echo", EchoModel(replicas=2))
+    manager.start()
+    try:
+        results = await manager.get_control_proxy("echo").memory_snapshot(top=3, stop=True)
+    finally:
+        manager.stop()
+
+    assert len(results) == 2
+    assert len({result.pid for result in results}) == 2
+    assert all(result.pid != os.getpid() for result in results)
+
+
+@pytest.mark.asyncio
+async def test_metrics_from_each_replica(service_logger):
+    manager = ResourceManager()
+    manager.register("echo", EchoModel(replicas=2))
+    manager.start()
+    try:
+        results = await manager.get_control_proxy("echo").metrics()
+    finally:
+        manager.stop()
+
+    assert len(results) == 2
+    assert len({result.pid for result in results}) == 2
+    assert all(isinstance(result.metrics, dict) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_busy_replica_is_reported_after_timeout(service_logger):
+    manager = ResourceManager()
+    manager.register("sleep", SleepModel(replicas=2))
+    manager.start()
+    try:
+        # реплики запущены и отвечают
+        assert len(await manager.get_control_proxy("sleep").metrics()) == 2
+
+        busy = asyncio.ensure_future(manager.get_resource("sleep").request(SleepData(seconds=3)))
+        await asyncio.sleep(0.1)
+
+        t0 = time.monotonic()
+        results = await manager.get_control_proxy("sleep", timeout_sec=1).metrics()
+        assert time.monotonic() - t0 < 2.5
+        assert (await busy).seconds == 3
+    finally:
+        manager.stop()
+
+    codes = sorted(result.status.code for result in results)
+    assert codes == [StatusCodes.OK.code, StatusCodes.INTERNAL_ERROR.code]
+    missing = next(result for result in results if result.pid is None)
+    assert missing.resource == "sleep" and missing.metrics == {}
@@ -0,0 +1,91 @@
+import pytest
+
+from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorS3Result, \
+    AbbreviationExtractorTextResult
+from extractor_service.common.struct.model.common import S3ContainerInfo as InternalS3ContainerInfo
+from extractor_service.handlers.abbreviation_extractor import AbbreviationsExtractorHandler, \
+    AbbreviationsTextExtractorHandler, to_internal_containers
+from extractor_service.technologies.abbreviation_extraction.abbreviation_extraction import make_request
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionResponseMsg, \
+    AbbreviationExtractionResultsData, AbbreviationExtractionTextResponseMsg, AbbreviationExtractionTextResultsData, \
+    S3ContainerInfo, S3ObjectId, TextContainerInfo
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+def test_construct_trusted_keeps_values_and_fills_defaults():
+    s3_objects = [S3ObjectId(bucket_name="bucket", s3_key="key")]
+    container = S3ContainerInfo.construct_trusted(s3_object=s3_objects, reply_bucket_name=None)
+
+    assert container.s3_object is s3_objects
+    assert container.user_data == {}
+    assert container.status.code == StatusCodes.OK.code
+    assert container.__fields_set__ == {"s3_object", "reply_bucket_name"}
+
+    with pytest.raises(AttributeError):
+        S3ContainerInfo.construct_trusted(container_id="1")
+
+
+def test_containers_are_converted_without_revalidation():
+    containers = [
+        S3ContainerInfo(ContainerId="1", S3Object=[{"BucketName": "bucket", "S3Key": "key"}], UserData={"a": 1}),
+        S3ContainerInfo(ContainerId="2", S3Object=[], ReplyBucketName="replies"),
+    ]
+
+    converted = to_internal_containers(containers)
+
+    for container, internal in zip(containers, converted):
+        assert isinstance(internal, InternalS3ContainerInfo)
+        assert internal.key_ == internal.container_id == container.container_id
+        assert internal.s3_object is container.s3_object
+        assert internal.user_data == container.user_data
+    assert [internal.reply_bucket_name for internal in converted] == ["abbreviation_extractor", "replies"]
+    # модель запроса не изменяется
+    assert containers[0].reply_bucket_name is None
+
+
+def test_results_match_validated_messages(monkeypatch):
+    from extractor_service.handlers import abbreviation_extractor
+    monkeypatch.setattr(abbreviation_extractor, "ABBREVIATION_EXTRACTOR_MAX_MSG_DATA_BATCH_SIZE", 2)
+
+    failed = Status.make_status(status=StatusCodes.CONTENT_NOT_FOUND)
+    results = [
+        AbbreviationExtractorS3Result.construct(key_=str(idx), container_id=str(idx), user_data={"idx": idx},
+                                                bucket_name="bucket", s3_key=f"result/{idx}", line_index=None,
+                                                offset=None)
+        for idx in range(3)
+    ]
+    results.append(AbbreviationExtractorS3Result.construct(key_="3", container_id="3", user_data={}, status=failed))
+
+    messages = AbbreviationsExtractorHandler._transform_results(results)
+
+    expected = [AbbreviationExtractionResponseMsg(data=AbbreviationExtractionResultsData(s3_objects=batch))
+                for batch in (results[:2], results[2:])]
+    assert [msg.dict() for msg in messages] == [msg.dict() for msg in expected]
+
+
+def test_text_results_match_validated_messages():
+    results = [AbbreviationExtractorTextResult.construct(key_="1", container_id="1", user_data={},
+                                                         expansions={"ИТ": {"информационные технологии": 1}})]
+
+    messages = AbbreviationsTextExtractorHandler._transform_results(results)
+
+    expected = AbbreviationExtractionTextResponseMsg(data=AbbreviationExtractionTextResultsData(texts=results))
+    assert [msg.dict() for msg in messages] == [expected.dict()]
+
+    converted = AbbreviationsTextExtractorHandler._transform_containers([TextContainerInfo(Text="ИТ")])
+    assert converted[0].key_ == converted[0].container_id and converted[0].text == "ИТ"
+
+
+def test_request_validates_only_parameters():
+    containers = to_internal_containers(
+        [S3ContainerInfo(ContainerId="1", S3Object=[])]
+    )
+
+    request = make_request("RU", "bypass", s3_containers=containers)
+
+    assert request.language.value == "ru"
+    assert request.cache_mode.value == "bypass"
+    assert request.s3_containers is containers
+    with pytest.raises(ValueError):
+        make_request("klingon", "use", s3_containers=containers)
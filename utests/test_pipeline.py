@@ -0,0 +1,483 @@
+import asyncio
+import logging
+import tracemalloc
+import typing
+from functools import partial
+from typing import List
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.cache import CACHE_MODE_KEY, CacheMode, ResultCache, StepCache, make_cache_key
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.model.common import BaseData, DataRecord
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+from extractor_service.common.struct.pipeline import (
+    ArgBinding,
+    BaseDataTransformer,
+    Pipeline,
+    PipelineStep,
+    get_func_args,
+)
+
+
+class InItem(BaseData):
+    text: str
+
+
+class LengthItem(BaseData):
+    length: int
+
+
+class ResultItem(BaseData):
+    text: str
+    length: int
+    suffix: str
+
+
+@pytest.fixture(autouse=True)
+def service_logger():
+    aes_globals.service_logger = logging.getLogger("test_pipeline")
+    yield aes_globals.service_logger
+
+
+async def emit(data: List[InItem]):
+    for item in data:
+        yield item
+
+
+async def count_length(content_id: str, text: str) -> LengthItem:
+    return LengthItem(key_=content_id, length=len(text))
+
+
+def add_suffix(content_id: str, text: str, suffix: str) -> BaseData:
+    return ResultItem.construct(key_=content_id, text=text, length=0, suffix=text + suffix)
+
+
+class TestArgBinding:
+    def test_func_args(self):
+        assert get_func_args(count_length) == {"content_id": True, "text": True}
+        assert set(get_func_args(partial(add_suffix, suffix="!"))) == {"content_id", "text", "suffix"}
+
+    def test_bind_with_mapping(self):
+        binding = ArgBinding(count_length, {"content_id": "key_"})
+        item = InItem(key_="1", text="abc")
+
+        assert binding.source_names == ("key_", "text")
+        assert binding.bind(item) == {"content_id": "1", "text": "abc"}
+        assert binding.bind({"key_": "2", "text": "ab"}) == {"content_id": "2", "text": "ab"}
+
+    def test_bind_falls_back_to_meta(self):
+        binding = ArgBinding(add_suffix, {"content_id": "key_"})
+        item = InItem(key_="1", text="abc")
+
+        assert binding.bind(item, meta={"suffix": "!"}) == {"content_id": "1", "text": "abc", "suffix": "!"}
+        assert binding.bind(item) == {"content_id": "1", "text": "abc"}
+
+
+class TestBaseDataTransformer:
+    def test_default_transformer(self):
+        transformer = BaseDataTransformer()
+        item = transformer.transform({"key_": "1", "text": "abc"}, InItem)
+        assert isinstance(item, InItem)
+        assert transformer.transform(item, InItem) is item
+
+    def test_registered_transformers(self):
+        transformer = BaseDataTransformer()
+        item = InItem(key_="1", text="abc")
+        assert transformer.transform(item, BaseData).key_ == "1"
+
+        transformer.register(InItem, BaseData, lambda data: LengthItem(key_=data.key_, length=-1))
+        transformer.register(typing.Any, ResultItem, lambda data: "any")
+
+        assert transformer.transform(item, BaseData).length == -1
+        assert transformer.transform({}, ResultItem) == "any"
+
+
+class TestDataRecord:
+    def test_attribute_access(self):
+        record = DataRecord(key_="1", text="abc")
+        assert record.key_ == "1"
+        assert record.status.code == StatusCodes.OK.code
+
+        record.text = "abcd"
+        assert record.as_dict()["text"] == "abcd"
+        with pytest.raises(AttributeError):
+            getattr(record, "length")
+
+    def test_merge_keeps_existing_fields(self):
+        record = DataRecord(key_="1", text="abc")
+        error = Status.make_status(status=StatusCodes.INTERNAL_ERROR)
+        other = ResultItem.construct(key_="1", text="other", length=3, suffix="!", status=error)
+
+        merged = record.merge(other)
+        assert merged is not record
+        assert merged.text == "abc"
+        assert merged.length == 3
+        assert merged.status.code == StatusCodes.INTERNAL_ERROR.code
+        assert "length" not in record.as_dict()
+
+        assert record.merge(LengthItem(key_="1", length=2), inplace=True) is record
+        assert record.length == 2
+
+    def test_to_model(self):
+        record = DataRecord(key_="1", text="abc", extra=1)
+        model = BaseDataTransformer().transform(record, InItem)
+        assert isinstance(model, InItem)
+        assert model.text == "abc"
+
+    def test_retain(self):
+        record = DataRecord(key_="1", text="abc", payload=b"data")
+        record.retain(frozenset(("text",)))
+        assert set(record.as_dict()) == {"key_", "status", "text"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_branch():
+    attr_mapping = {"content_id": "key_"}
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=InItem,
+                        out_item_type=ResultItem)
+    pipeline.add_next_step(PipelineStep(count_length, attr_mapping=attr_mapping))
+    pipeline.add_next_step(PipelineStep(add_suffix, attr_mapping=attr_mapping))
+
+    data = [{"key_": str(idx), "text": "a" * idx} for idx in range(5)]
+    results = await pipeline.start(data, meta={"suffix": "!"})
+
+    assert sorted(item.key_ for item in results) == [str(idx) for idx in range(5)]
+    for item in results:
+        assert isinstance(item, ResultItem)
+        assert item.length == int(item.key_)
+        assert item.suffix == item.text + "!"
+
+
+class TagItem(BaseData):
+    tag: str
+
+
+class SiblingResultItem(BaseData):
+    length: int
+    description: str
+
+
+@pytest.mark.asyncio
+async def test_sibling_branches_read_item_fields_after_each_other():
+    attr_mapping = {"content_id": "key_"}
+
+    async def tag(content_id: str) -> TagItem:
+        # первая ветвь успевает завершиться раньше
+        await asyncio.sleep(0.01)
+        return TagItem(key_=content_id, tag="#")
+
+    def describe(content_id: str, text: str, tag: str) -> BaseData:
+        return SiblingResultItem.construct(key_=content_id, length=0, description=tag + text)
+
+    def keep_length(content_id: str, length: int) -> BaseData:
+        return LengthItem(key_=content_id, length=length)
+
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=InItem,
+                        out_item_type=SiblingResultItem)
+    # поле text не входит в результат, его читают обе ветви: первая не должна удалить его для второй
+    pipeline.add_branch(PipelineStep(count_length, attr_mapping=attr_mapping),
+                        PipelineStep(keep_length, attr_mapping=attr_mapping))
+    pipeline.add_branch(PipelineStep(tag, attr_mapping=attr_mapping),
+                        PipelineStep(describe, attr_mapping=attr_mapping))
+
+    results = await pipeline.start([{"key_": str(idx), "text": "a" * idx} for idx in range(3)])
+
+    assert all(item.status.code == StatusCodes.OK.code for item in results)
+    assert sorted((item.length, item.description) for item in results) == [(0, "#"), (1, "#a"), (2, "#aa")]
+
+
+@pytest.mark.asyncio
+async def test_start_gen_yields_items_as_they_complete():
+    attr_mapping = {"content_id": "key_"}
+    release = {idx: asyncio.Event() for idx in range(3)}
+
+    async def wait_count(content_id: str, text: str) -> LengthItem:
+        await release[int(content_id)].wait()
+        return LengthItem(key_=content_id, length=len(text))
+
+    async def check_text(content_id: str, text: str):
+        status = Status.make_status(status=StatusCodes.BROKEN_CONTENT_ERROR) if text == "bad" else None
+        return InItem(key_=content_id, text=text, status=status or Status.make_status(status=StatusCodes.OK))
+
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=InItem,
+                        out_item_type=InItem)
+    pipeline.add_branch(PipelineStep(check_text, attr_mapping=attr_mapping),
+                        PipelineStep(wait_count, attr_mapping=attr_mapping))
+
+    data = [{"key_": str(idx), "text": "a" * (idx + 1)} for idx in range(3)]
+    data.append({"key_": "3", "text": "bad"})
+    results = pipeline.start_gen(data)
+
+    # элементы выдаются в порядке завершения, не дожидаясь остальных
+    release[2].set()
+    first = {item.key_: item for item in [await results.__anext__(), await results.__anext__()]}
+    assert first["2"].text == "aaa"
+    assert first["3"].status.code == StatusCodes.BROKEN_CONTENT_ERROR.code
+
+    release[0].set()
+    release[1].set()
+    rest = [item async for item in results]
+    assert sorted((item.key_, item.text) for item in rest) == [("0", "a"), ("1", "aa")]
+    assert all(isinstance(item, InItem) for item in rest)
+
+
+@pytest.mark.asyncio
+async def test_step_concurrency_applies_backpressure():
+    attr_mapping = {"content_id": "key_"}
+    state = {"produced": 0, "completed": 0, "running": 0, "max_running": 0, "max_ahead": 0}
+
+    async def produce(data: List[InItem]):
+        for item in data:
+            state["produced"] += 1
+            state["max_ahead"] = max(state["max_ahead"], state["produced"] - state["completed"])
+            yield item
+
+    async def slow_count(content_id: str, text: str) -> LengthItem:
+        state["running"] += 1
+        state["max_running"] = max(state["max_running"], state["running"])
+        await asyncio.sleep(0.005)
+        state["running"] -= 1
+        state["completed"] += 1
+        return LengthItem(key_=content_id, length=len(text))
+
+    pipeline = Pipeline(initial_step=PipelineStep(produce, attr_mapping=attr_mapping),
+                        in_item_type=InItem)
+    pipeline.add_next_step(PipelineStep(slow_count, attr_mapping=attr_mapping, concurrency=2))
+
+    results = await pipeline.start([{"key_": str(idx), "text": "a"} for idx in range(20)])
+
+    assert len(results) == 20
+    assert all(item.length == 1 for item in results)
+    assert state["max_running"] == 2
+    # источник не обгоняет обработку больше, чем на число слотов шага (+1 ожидающий элемент)
+    assert state["max_ahead"] <= 3
+
+
+def test_step_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        PipelineStep(count_length, concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_pre_collected_step_batches():
+    attr_mapping = {"content_id": "key_"}
+    batch_sizes = []
+
+    async def count_batch(data: List[InItem]):
+        batch_sizes.append(len(data))
+        for item in data:
+            yield LengthItem(key_=item.key_, length=len(item.text))
+
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=InItem)
+    pipeline.add_next_step(PipelineStep(count_batch,
+                                        pre_collected=True,
+                                        pre_collected_batch_size=2,
+                                        in_item_type=InItem,
+                                        concurrency=1))
+
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    results = await pipeline.start([{"key_": str(idx), "text": "a" * idx} for idx in range(5)])
+
+    # пачки не ждут фиксированных таймаутов опроса
+    assert loop.time() - t0 < 0.05
+    assert sorted(batch_sizes) == [1, 2, 2]
+    assert all(item.length == int(item.key_) for item in results)
+
+
+@pytest.mark.asyncio
+async def test_pre_collected_step_errors_propagate():
+    async def failing_batch(data: List[InItem]):
+        raise RuntimeError("batch failed")
+        yield  # noqa
+
+    step = PipelineStep(failing_batch, pre_collected=True, pre_collected_batch_size=2, in_item_type=InItem)
+    items = [InItem(key_=str(idx), text="a") for idx in range(3)]
+
+    with pytest.raises(RuntimeError):
+        async for _ in step._run_processor_in_batch(emit(items)):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_pre_collected_step_error_of_finished_batch_propagates():
+    async def first_batch_fails(data: List[InItem]):
+        if data[0].key_ == "0":
+            raise RuntimeError("batch failed")
+        await asyncio.sleep(0.01)
+        for item in data:
+            yield LengthItem(key_=item.key_, length=len(item.text))
+
+    # пачки по одной: ошибочная пачка завершается до отправки следующих
+    step = PipelineStep(first_batch_fails, pre_collected=True, pre_collected_batch_size=1, in_item_type=InItem,
+                        concurrency=1)
+    items = [InItem(key_=str(idx), text="a") for idx in range(3)]
+
+    with pytest.raises(RuntimeError):
+        async for _ in step._run_processor_in_batch(emit(items)):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_source_error_cancels_item_tasks():
+    attr_mapping = {"content_id": "key_"}
+    state = {"started": 0, "completed": 0}
+
+    async def failing_source(data: List[InItem]):
+        for item in data:
+            yield item
+        # шаги элементов уже запущены
+        await asyncio.sleep(0.01)
+        raise RuntimeError("source failed")
+
+    async def slow_count(content_id: str, text: str) -> LengthItem:
+        state["started"] += 1
+        await asyncio.sleep(0.05)
+        state["completed"] += 1
+        return LengthItem(key_=content_id, length=len(text))
+
+    step = PipelineStep(slow_count, attr_mapping=attr_mapping, concurrency=8)
+    pipeline = Pipeline(initial_step=PipelineStep(failing_source, attr_mapping=attr_mapping), in_item_type=InItem)
+    pipeline.add_next_step(step)
+
+    tasks_before = asyncio.all_tasks()
+    with pytest.raises(RuntimeError):
+        await pipeline.start([{"key_": str(idx), "text": "a"} for idx in range(4)])
+
+    # задачи элементов отменены вместе с запросом и освободили слоты шага
+    assert not [task for task in asyncio.all_tasks() - tasks_before if not task.done()]
+    await asyncio.sleep(0.1)
+    assert state["started"] == 4 and state["completed"] == 0
+    for _ in range(8):
+        await asyncio.wait_for(step.acquire_slot(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_slow_pre_collected_step_bounds_source():
+    attr_mapping = {"content_id": "key_"}
+    state = {"produced": 0, "max_ahead": 0, "consumed": 0}
+
+    async def produce(data: List[InItem]):
+        for item in data:
+            state["produced"] += 1
+            state["max_ahead"] = max(state["max_ahead"], state["produced"] - state["consumed"])
+            yield item
+
+    async def slow_batch(data: List[InItem]):
+        await asyncio.sleep(0.001)
+        state["consumed"] += len(data)
+        for item in data:
+            yield LengthItem(key_=item.key_, length=len(item.text))
+
+    pipeline = Pipeline(initial_step=PipelineStep(produce, attr_mapping=attr_mapping, broadcast_buffer_size=2),
+                        in_item_type=InItem)
+    pipeline.add_next_step(PipelineStep(slow_batch,
+                                        pre_collected=True,
+                                        pre_collected_batch_size=1,
+                                        in_item_type=InItem,
+                                        concurrency=1))
+
+    results = await pipeline.start([{"key_": str(idx), "text": "a"} for idx in range(30)])
+
+    assert len(results) == 30
+    assert all(item.length == 1 for item in results)
+    # источник не уходит от медленного pre-collected шага дальше буфера раздачи и пачек в работе
+    assert state["max_ahead"] <= 6
+
+
+class PayloadItem(BaseData):
+    payload: bytes
+
+
+class SizeItem(BaseData):
+    size: int
+
+
+async def _pipeline_peak_memory(item_count: int, out_item_type=SizeItem) -> int:
+    attr_mapping = {"content_id": "key_"}
+    payload_size = 256 * 1024
+
+    async def download(data: List[InItem]):
+        for item in data:
+            yield PayloadItem.construct(key_=item.key_, payload=bytes(payload_size))
+
+    async def measure(content_id: str, payload: bytes) -> SizeItem:
+        await asyncio.sleep(0)
+        return SizeItem.construct(key_=content_id, size=len(payload))
+
+    async def finish(content_id: str, size: int) -> BaseData:
+        return BaseData.construct(key_=content_id)
+
+    pipeline = Pipeline(initial_step=PipelineStep(download, attr_mapping=attr_mapping),
+                        in_item_type=InItem,
+                        out_item_type=out_item_type)
+    pipeline.add_branch(PipelineStep(measure, attr_mapping=attr_mapping, concurrency=2),
+                        PipelineStep(finish, attr_mapping=attr_mapping))
+
+    data = [{"key_": str(idx), "text": ""} for idx in range(item_count)]
+    tracemalloc.start()
+    try:
+        results = await pipeline.start(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(results) == item_count
+    assert all(item.size == payload_size for item in results)
+    return peak
+
+
+@pytest.mark.asyncio
+async def test_item_fields_released_after_last_reader():
+    small_peak = await _pipeline_peak_memory(10)
+    large_peak = await _pipeline_peak_memory(80)
+
+    # в памяти одновременно находятся только элементы в работе, а не все содержимое запроса
+    assert large_peak < small_peak * 1.5
+
+
+@pytest.mark.asyncio
+async def test_step_cache_modes():
+    aes_globals.metrics = MetricsRegistry()
+    attr_mapping = {"content_id": "key_"}
+    calls = []
+
+    async def measure(content_id: str, text: str) -> LengthItem:
+        calls.append(content_id)
+        return LengthItem(key_=content_id, length=len(text))
+
+    step_cache = StepCache(key_func=lambda content_id, text: make_cache_key(text),
+                           backend=ResultCache("step_cache", memory_max_bytes=1024 * 1024),
+                           key_arg="content_id")
+    pipeline = Pipeline(initial_step=PipelineStep(emit, attr_mapping=attr_mapping),
+                        in_item_type=InItem)
+    pipeline.add_next_step(PipelineStep(measure, attr_mapping=attr_mapping, cache=step_cache))
+
+    async def run(keys, cache_mode=CacheMode.USE):
+        data = [{"key_": key, "text": "abc"} for key in keys]
+        results = await pipeline.start(data, meta={CACHE_MODE_KEY: cache_mode})
+        assert sorted(item.key_ for item in results) == sorted(keys)
+        assert all(item.length == 3 for item in results)
+
+    await run(["1"])
+    # тот же текст под другим ключом берется из кэша
+    await run(["2", "3"])
+    assert calls == ["1"]
+
+    await run(["4"], cache_mode=CacheMode.BYPASS)
+    await run(["5"], cache_mode=CacheMode.REFRESH)
+    assert calls == ["1", "4", "5"]
+
+
+def test_step_cache_not_supported_for_pre_collected_steps():
+    step_cache = StepCache(key_func=lambda **_: None, backend=None)
+    with pytest.raises(ValueError):
+        PipelineStep(count_length, pre_collected=True, in_item_type=InItem, cache=step_cache)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.model.abbreviation_extractor import CreatedS3Object
+from extractor_service.common.struct.result_aggregator import ResultAggregator
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+class FakeContentsLoader:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.objects = {}
+
+    async def put_content(self, content_id: str, file_data: BytesIO, bucket_name: str, data_length: int,
+                          file_type: S3ContentType, compression: str = "none") -> CreatedS3Object:
+        await asyncio.sleep(0)
+        if self.fail:
+            status = Status.make_status(status=StatusCodes.CONNECTION_ERROR)
+            return CreatedS3Object.construct(key_=content_id, status=status)
+
+        assert file_type == S3ContentType.JSON_LINES
+        assert data_length == len(file_data.getvalue())
+        self.objects[(bucket_name, content_id)] = (file_data.getvalue(), compression)
+        return CreatedS3Object.construct(key_=content_id, bucket_name=bucket_name, s3_key=content_id)
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    aes_globals.metrics = MetricsRegistry()
+    yield aes_globals.metrics
+
+
+def _result(expansions: dict) -> BytesIO:
+    return BytesIO(json.dumps(expansions, ensure_ascii=False, indent=2).encode("utf-8"))
+
+
+@pytest.mark.asyncio
+async def test_results_are_written_as_jsonl_lines():
+    loader = FakeContentsLoader()
+    aggregator = ResultAggregator(loader, max_items=2)
+
+    results = [
+        await aggregator.add(content_id=str(idx),
+                             file_data=_result({"ИТ": [f"информационные технологии {idx}"]}),
+                             bucket_name="bucket",
+                             container_id=f"container-{idx}")
+        for idx in range(3)
+    ]
+    assert await aggregator.close() == set()
+
+    assert len(loader.objects) == 2
+    assert [result.line_index for result in results] == [0, 1, 0]
+    assert results[0].s3_key == results[1].s3_key != results[2].s3_key
+
+    for idx, result in enumerate(results):
+        body, compression = loader.objects[(result.bucket_name, result.s3_key)]
+        assert compression == "none"
+        line = body[result.offset:].split(b"\n", 1)[0]
+        assert json.loads(line) == {"container_id": f"container-{idx}",
+                                    "expansions": {"ИТ": [f"информационные технологии {idx}"]}}
+
+    assert aes_globals.metrics.snapshot()["result_upload.aggregated.objects"] == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression, suffix", [("gzip", ".jsonl.gz"), ("zstd", ".jsonl.zst")])
+async def test_results_are_compressed(compression, suffix):
+    loader = FakeContentsLoader()
+    aggregator = ResultAggregator(loader, max_items=10, compression=compression, key_prefix="results/")
+
+    result = await aggregator.add(content_id="1", file_data=_result({"a": ["b"]}), bucket_name="bucket")
+    await aggregator.close()
+
+    assert result.s3_key.startswith("results/") and result.s3_key.endswith(suffix)
+    body, object_compression = loader.objects[("bucket", result.s3_key)]
+    # сжимает загрузчик при выгрузке
+    assert object_compression == compression
+    assert json.loads(body) == {"container_id": None, "expansions": {"a": ["b"]}}
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_keys_are_reported():
+    aggregator = ResultAggregator(FakeContentsLoader(fail=True), max_items=1)
+
+    await aggregator.add(content_id="1", file_data=_result({}), bucket_name="bucket")
+    await aggregator.add(content_id="2", file_data=_result({}), bucket_name="other")
+
+    assert await aggregator.close() == {"1", "2"}
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        ResultAggregator(FakeContentsLoader(), max_items=1, compression="rar")
@@ -0,0 +1,189 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.cache import CacheMode, MemoryLRUCache, ResultCache, SqliteCache, make_cache_key
+from extractor_service.common.struct.language import LanguageEnum
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.technologies.abbreviation_extraction.utils import abbreviation_extraction
+from extractor_service.technologies.abbreviation_extraction.utils.abbreviation_extraction import extract, result_cache_key
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    aes_globals.metrics = MetricsRegistry()
+    yield aes_globals.metrics
+
+
+def test_cache_key_depends_on_every_part():
+    assert make_cache_key("ru", "text", "1") == make_cache_key("ru", "text", "1")
+    assert make_cache_key("ru", "text", "1") != make_cache_key("ru", "text", "2")
+    # границы частей входят в ключ
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+
+
+def test_memory_lru_evicts_by_size():
+    cache = MemoryLRUCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.size == 8
+    assert cache.evictions == 1
+
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None
+
+
+def test_sqlite_cache_evicts_by_size(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.db"), max_bytes=10)
+    try:
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.get("c") == b"1234"
+    finally:
+        cache.close()
+
+
+def test_sqlite_cache_tracks_total_size(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first, second = SqliteCache(path, max_bytes=10), SqliteCache(path, max_bytes=10)
+    try:
+        first.put("a", b"1234")
+        second.put("a", b"12")
+        second.put("b", b"123")
+        assert first.total_size == second.total_size == 5
+
+        first.delete("a")
+        first.delete("missing")
+        second.put("c", b"12345678")
+        # вытеснена "b": 3 + 8 > 10
+        assert second.get("b") is None
+        assert first.total_size == 8
+    finally:
+        first.close()
+        second.close()
+
+    # файл без таблицы размера (прежний формат): размер считается при открытии
+    reopened = SqliteCache(path, max_bytes=10)
+    try:
+        reopened._conn.execute("DROP TABLE cache_meta")
+    finally:
+        reopened.close()
+    reopened = SqliteCache(path, max_bytes=10)
+    try:
+        assert reopened.total_size == 8
+    finally:
+        reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_is_shared(tmp_path, metrics):
+    path = str(tmp_path / "cache.db")
+    first = ResultCache("cache", memory_max_bytes=1024, disk_path=path, disk_max_bytes=1024)
+    second = ResultCache("cache", memory_max_bytes=1024, disk_path=path, disk_max_bytes=1024)
+    try:
+        assert await second.get("key") is None
+        await first.put("key", b"value")
+
+        assert await second.get("key") == b"value"
+        assert await second.get("key") == b"value"
+    finally:
+        first.close()
+        second.close()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["cache.misses"] == 1
+    assert snapshot["cache.disk_hits"] == 1
+    assert snapshot["cache.memory_hits"] == 1
+    assert snapshot["cache.hit_ratio"] == pytest.approx(2 / 3)
+
+
+@pytest.mark.asyncio
+async def test_extract_skips_detectors_on_cache_hit():
+    abbreviation_detector_model = AsyncMock()
+    expansion_detector_model = AsyncMock()
+    abbreviation_detector_model.detect_abbreviations.return_value = type("Abbr", (), {"abbreviations": ["ABBR"]})()
+    expansion_detector_model.detect_expansions.return_value = type("Exp", (), {"expansions": {"ABBR": {"exp": 1}}})()
+
+    cache = ResultCache("cache", memory_max_bytes=1024)
+
+    async def run(content_id: str, language: LanguageEnum):
+        results = [item async for item in extract(content_id, "text",
+                                                  abbreviation_detector_model,
+                                                  expansion_detector_model,
+                                                  language,
+                                                  result_cache=cache)]
+        return results[0]
+
+    first = await run("1", LanguageEnum.RUSSIAN)
+    second = await run("2", LanguageEnum.RUSSIAN)
+
+    assert second.key_ == "2"
+    assert second.file_data.getvalue() == first.file_data.getvalue()
+    assert abbreviation_detector_model.detect_abbreviations.await_count == 1
+    assert expansion_detector_model.detect_expansions.await_count == 1
+
+    # язык входит в ключ кэша
+    await run("3", LanguageEnum.ENGLISH)
+    assert abbreviation_detector_model.detect_abbreviations.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_extract_cache_key_depends_on_json_indent(monkeypatch):
+    abbreviation_detector_model = AsyncMock()
+    expansion_detector_model = AsyncMock()
+    abbreviation_detector_model.detect_abbreviations.return_value = type("Abbr", (), {"abbreviations": ["ABBR"]})()
+    expansion_detector_model.detect_expansions.return_value = type("Exp", (), {"expansions": {"ABBR": {"exp": 1}}})()
+
+    cache = ResultCache("cache", memory_max_bytes=1024)
+
+    async def run() -> bytes:
+        results = [item async for item in extract("1", "text", abbreviation_detector_model, expansion_detector_model,
+                                                  LanguageEnum.RUSSIAN, result_cache=cache)]
+        return results[0].file_data.getvalue()
+
+    monkeypatch.setattr(abbreviation_extraction, "RESULT_JSON_INDENT", False)
+    compact = await run()
+    # после смены форматирования кэш не выдает результат в прежнем формате
+    monkeypatch.setattr(abbreviation_extraction, "RESULT_JSON_INDENT", True)
+    indented = await run()
+
+    assert b"\n" not in compact and b"\n" in indented
+    assert abbreviation_detector_model.detect_abbreviations.await_count == 2
+    assert result_cache_key("text", LanguageEnum.RUSSIAN, indent=True) != \
+        result_cache_key("text", LanguageEnum.RUSSIAN, indent=False)
+
+
+@pytest.mark.asyncio
+async def test_extract_cache_modes():
+    abbreviation_detector_model = AsyncMock()
+    expansion_detector_model = AsyncMock()
+    abbreviation_detector_model.detect_abbreviations.return_value = type("Abbr", (), {"abbreviations": []})()
+    expansion_detector_model.detect_expansions.return_value = type("Exp", (), {"expansions": {}})()
+
+    cache = ResultCache("cache", memory_max_bytes=1024)
+
+    async def run(cache_mode: CacheMode):
+        async for _ in extract("1", "text", abbreviation_detector_model, expansion_detector_model,
+                               LanguageEnum.RUSSIAN, result_cache=cache, cache_mode=cache_mode):
+            pass
+
+    await run(CacheMode.BYPASS)
+    assert await cache.get(result_cache_key("text", LanguageEnum.RUSSIAN)) is None
+
+    await run(CacheMode.REFRESH)
+    await run(CacheMode.REFRESH)
+    assert abbreviation_detector_model.detect_abbreviations.await_count == 3
+
+    await run(CacheMode.USE)
+    assert abbreviation_detector_model.detect_abbreviations.await_count == 3
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from io import BytesIO
+
+import pytest
+from botocore.exceptions import ClientError
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.func.misc import S3ContentType
+from extractor_service.common.struct import content_loader
+from extractor_service.common.struct.data_storage.s3 import S3Storage
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.common.struct.model.common import S3ContainerInfo
+from extractor_service.common.struct.retry_policy import CircuitBreaker, RetryPolicy
+from utils.aes_utils.common import retry
+from utils.aes_utils.exceptions import CircuitOpenException, S3Exception
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Flaky:
+    def __init__(self, failures: int, error: Exception = None):
+        self.failures = failures
+        self.error = error or ConnectionError("S3 is unavailable")
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    aes_globals.metrics = MetricsRegistry()
+    yield aes_globals.metrics
+
+
+def _policy(tries: int = 3, budget_tokens: float = 10, circuit: CircuitBreaker = None) -> RetryPolicy:
+    return RetryPolicy(tries=tries, base_delay=0.001, max_delay=0.01, budget_tokens=budget_tokens,
+                       budget_ratio=0.1, name="test", circuit=circuit)
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    func = Flaky(failures=2)
+
+    assert await _policy().call(func) == "ok"
+    assert func.calls == 3
+    assert aes_globals.metrics.snapshot()["test.retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_content_errors_are_not_retried():
+    error = S3Exception(status=Status.make_status(status=StatusCodes.CONTENT_NOT_FOUND))
+    func = Flaky(failures=1, error=error)
+
+    with pytest.raises(S3Exception):
+        await _policy().call(func)
+    assert func.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_throttles_retries():
+    policy = _policy(tries=10, budget_tokens=4)
+
+    # бюджет исчерпан, когда жетонов осталось не больше половины
+    func = Flaky(failures=100)
+    with pytest.raises(ConnectionError):
+        await policy.call(func)
+    assert func.calls == 2
+    assert aes_globals.metrics.snapshot()["test.retries_throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers():
+    clock = Clock()
+    circuit = CircuitBreaker(failure_threshold=2, reset_timeout_sec=10, name="test", clock=clock)
+    policy = _policy(tries=1, circuit=circuit)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await policy.call(Flaky(failures=1))
+    assert circuit.state == CircuitBreaker.OPEN
+
+    # пока цепь разомкнута, обращений к хранилищу нет
+    func = Flaky(failures=0)
+    with pytest.raises(CircuitOpenException):
+        await policy.call(func)
+    assert func.calls == 0
+
+    clock.now = 10
+    assert circuit.state == CircuitBreaker.HALF_OPEN
+    # одна пробная попытка, остальные отклоняются до ее завершения
+    assert circuit.allow()
+    assert not circuit.allow()
+    circuit.release()
+
+    assert await policy.call(func) == "ok"
+    assert circuit.state == CircuitBreaker.CLOSED
+
+    snapshot = aes_globals.metrics.snapshot()
+    assert snapshot["test.circuit.opened"] == 1
+    assert snapshot["test.circuit.rejected"] == 2
+    assert snapshot["test.circuit.open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_decorator_doesnt_block_event_loop():
+    calls = []
+
+    @retry(exceptions=ConnectionError, tries=2, delay=0.05)
+    async def failing_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError()
+        return "ok"
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticker_task = asyncio.create_task(ticker())
+    t0 = time.perf_counter()
+    assert await failing_once() == "ok"
+    ticker_task.cancel()
+
+    assert time.perf_counter() - t0 >= 0.05
+    assert ticks > 3
+
+
+class UnavailableStorage:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_s3_object_chunks(self, bucket_name: str, object_key: str, encoding: str = "utf-8"):
+        self.calls += 1
+        raise ConnectionError("S3 is unavailable")
+
+    async def put_s3_object(self, **kwargs):
+        self.calls += 1
+        raise ConnectionError("S3 is unavailable")
+
+
+@pytest.mark.asyncio
+async def test_loader_fails_fast_when_storage_is_down(monkeypatch):
+    aes_globals.service_logger = logging.getLogger("test_retry_policy")
+    monkeypatch.setattr(content_loader, "S3_RETRY_TRIES", 2)
+    monkeypatch.setattr(content_loader, "S3_RETRY_BASE_DELAY_SEC", 0.001)
+    monkeypatch.setattr(content_loader, "S3_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(content_loader, "CONTENTS_FETCH_THREADS", 1)
+    storage = UnavailableStorage()
+    loader = content_loader.S3ContentsLoader(storage=storage)
+
+    containers = [S3ContainerInfo.construct(key_=str(idx),
+                                            container_id=str(idx),
+                                            s3_object=[S3ObjectId(bucket_name="bucket", s3_key=str(idx))],
+                                            user_data={})
+                  for idx in range(3)]
+    results = await loader.get_contents(containers)
+
+    # две неудачные попытки размыкают цепь, остальные контейнеры не обращаются к хранилищу
+    assert storage.calls == 2
+    assert [result.status.code for result in results] == [StatusCodes.CONNECTION_ERROR.code] * 3
+
+    created = await loader.put_content(content_id="result", file_data=BytesIO(b"{}"), bucket_name="bucket",
+                                       data_length=2, file_type=S3ContentType.JSON)
+    assert created.status.code == StatusCodes.CONNECTION_ERROR.code
+    assert storage.calls == 2
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aenter__(self):
+        return object()
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self, amt: int = -1) -> bytes:
+        data, self._data = self._data, b""
+        return data
+
+
+class MissingKeysS3Client:
+    """ Клиент S3, в котором есть только объект "present" """
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get_object(self, Bucket: str, Key: str):
+        self.calls += 1
+        if Key != "present":
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "The specified key does not exist."},
+                               "ResponseMetadata": {"HTTPStatusCode": 404}}, "GetObject")
+        return {"Body": FakeBody(b"text"), "ContentLength": 4}
+
+
+@pytest.mark.asyncio
+async def test_missing_s3_object_is_not_retried_and_keeps_circuit_closed(monkeypatch):
+    aes_globals.service_logger = logging.getLogger("test_retry_policy")
+    monkeypatch.setattr(content_loader, "S3_RETRY_TRIES", 3)
+    monkeypatch.setattr(content_loader, "S3_RETRY_BASE_DELAY_SEC", 0.001)
+    monkeypatch.setattr(content_loader, "S3_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(content_loader, "S3_OBJECT_CACHE_TTL_SEC", 0)
+    storage = S3Storage(disk_cache_dir=None)
+    storage._client = client = MissingKeysS3Client()
+    loader = content_loader.S3ContentsLoader(storage=storage)
+
+    def container(key: str) -> S3ContainerInfo:
+        return S3ContainerInfo.construct(key_=key, container_id=key,
+                                         s3_object=[S3ObjectId(bucket_name="bucket", s3_key=key)], user_data={})
+
+    for key in ("missing-1", "missing-2"):
+        results = await loader.get_contents([container(key)])
+        assert [result.status.code for result in results] == [StatusCodes.CONTENT_NOT_FOUND.code]
+    # отсутствующий объект запрашивается один раз и не считается сбоем хранилища
+    assert client.calls == 2
+    assert loader._retry_policy._circuit.state == CircuitBreaker.CLOSED
+
+    results = await loader.get_contents([container("present")])
+    assert results[0].status.code == StatusCodes.OK.code
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import os
+import time
+import tracemalloc
+
+import pytest
+from botocore.exceptions import ClientError
+
+import extractor_service.common.globals as aes_globals
+
+from extractor_service.common.struct.data_storage.disk_cache import DiskObjectCache
+from extractor_service.common.struct.data_storage.s3 import S3Storage
+from extractor_service.common.struct.data_storage.stream import iter_decoded_chunks
+from extractor_service.common.struct.metrics import MetricsRegistry
+from extractor_service.technologies.abbreviation_extraction.utils.merge import merge_contents
+from utils.aes_utils.exceptions import S3Exception
+from utils.aes_utils.models.abbreviation_extractor import S3ObjectId
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offset = 0
+
+    async def __aenter__(self):
+        # как и StreamingBody, контекст возвращает не сам поток
+        return object()
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self, amt: int = -1) -> bytes:
+        end = len(self._data) if amt < 0 else self._offset + amt
+        chunk = self._data[self._offset:end]
+        self._offset += len(chunk)
+        return chunk
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def get_object(self, Bucket: str, Key: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {"Body": FakeBody(f"{Bucket}/{Key}".encode("utf-8"))}
+
+
+@pytest.mark.asyncio
+async def test_get_s3_objects_is_bounded_by_pool():
+    storage = S3Storage(max_pool_connections=3)
+    storage._client = FakeS3Client()
+    s3_objects = [S3ObjectId(bucket_name="bucket", s3_key=str(idx)) for idx in range(10)]
+
+    contents = await storage.get_s3_objects(s3_objects)
+
+    assert list(contents) == s3_objects
+    assert all(contents[s3_object] == f"bucket/{s3_object.s3_key}" for s3_object in s3_objects)
+    assert storage._client.max_running == 3
+
+
+async def _decode(data: bytes, **kwargs) -> list:
+    return [chunk async for chunk in iter_decoded_chunks(FakeBody(data), **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_decode_multibyte_chars_across_chunks():
+    text = "сокращение ABC — пример"
+    chunks = await _decode(text.encode("utf-8"), chunk_size=3)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+
+
+@pytest.mark.asyncio
+async def test_max_object_size_guard():
+    with pytest.raises(S3Exception):
+        await _decode(b"a" * 10, max_size=5, content_length=10)
+
+    # размер проверяется и по мере чтения, если ContentLength не известен
+    with pytest.raises(S3Exception):
+        await _decode(b"a" * 10, chunk_size=4, max_size=5)
+
+    assert await _decode(b"a" * 5, chunk_size=4, max_size=5) == ["aaaa", "a"]
+
+
+def _fixed_object_getter(data: bytes):
+    async def get_object(Bucket: str, Key: str):
+        return {"Body": FakeBody(data), "ContentLength": len(data)}
+    return get_object
+
+
+@pytest.mark.asyncio
+async def test_streamed_object_merge_peak_memory():
+    size = 8 * 1024 * 1024
+    storage = S3Storage()
+    storage._client = FakeS3Client()
+    storage._client.get_object = _fixed_object_getter(b"a" * size)
+
+    tracemalloc.start()
+    try:
+        chunks = await storage.get_s3_object_chunks(bucket_name="bucket", object_key="key")
+        text = (await merge_contents("1", [chunks])).text
+        del chunks
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(text) == size + 1
+    # одновременно в памяти не больше двух полных копий текста: части и результат склейки
+    assert peak < 2.5 * size
+
+
+class VersionedS3Client:
+    """ Клиент с поддержкой условного GET (If-None-Match) """
+
+    def __init__(self):
+        self.objects = {}
+        self.bodies_sent = 0
+
+    def put(self, key: str, data: bytes):
+        self.objects[key] = (data, f'"{hashlib.md5(data).hexdigest()}"')
+
+    async def get_object(self, Bucket: str, Key: str, IfNoneMatch: str = None):
+        data, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"},
+                               "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
+        self.bodies_sent += 1
+        return {"Body": FakeBody(data), "ContentLength": len(data), "ETag": etag}
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_revalidates_by_etag(tmp_path):
+    aes_globals.metrics = MetricsRegistry()
+    storage = S3Storage(disk_cache_dir=str(tmp_path))
+    storage._client = VersionedS3Client()
+    storage._client.put("key", "текст".encode("utf-8"))
+
+    assert await storage.get_s3_object(bucket_name="bucket", object_key="key") == "текст"
+    assert await storage.get_s3_object(bucket_name="bucket", object_key="key") == "текст"
+    assert storage._client.bodies_sent == 1
+
+    storage._client.put("key", "новый текст".encode("utf-8"))
+    assert await storage.get_s3_object(bucket_name="bucket", object_key="key") == "новый текст"
+    assert storage._client.bodies_sent == 2
+
+    snapshot = aes_globals.metrics.snapshot()
+    assert snapshot["s3.disk_cache.hits"] == 1
+    assert snapshot["s3.disk_cache.misses"] == 2
+
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    aes_globals.metrics = MetricsRegistry()
+    cache = DiskObjectCache(str(tmp_path), max_bytes=10)
+
+    def store(key: str, etag: str, data: bytes):
+        fd, tmp_path_ = cache.open_writer()
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        cache.commit("bucket", key, etag, tmp_path_)
+
+    store("a", "etag-a", b"1234")
+    store("b", "etag-b", b"1234")
+    # свежее чтение защищает тело от вытеснения
+    past = time.time() - 100
+    for etag in ("etag-a", "etag-b"):
+        os.utime(cache._object_path(etag), (past, past))
+    assert cache.read_text("etag-a") == ["1234"]
+
+    store("c", "etag-c", b"1234")
+
+    assert cache.lookup("bucket", "b") is None
+    assert cache.lookup("bucket", "a") == "etag-a"
+    assert cache.lookup("bucket", "c") == "etag-c"
+    assert cache.size == 8
@@ -0,0 +1,46 @@
+import datetime
+import json
+
+import pytest
+
+from extractor_service.common.func import serialization
+from extractor_service.common.func.serialization import dumps, loads, models_response
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionResponseMsg, \
+    AbbreviationExtractionResultsData, S3ObjectProcessed
+
+EXPANSIONS = {"ИТ": {"информационные технологии": 2}, "ПО": {"программное обеспечение": 1}}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+def test_dumps_is_compact_by_default(backend):
+    data = dumps(EXPANSIONS)
+
+    assert data == json.dumps(EXPANSIONS, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    assert loads(data) == EXPANSIONS
+    assert loads(memoryview(data)) == EXPANSIONS
+
+
+def test_dumps_with_indent(backend):
+    assert dumps(EXPANSIONS, indent=True) == json.dumps(EXPANSIONS, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def test_models_response_matches_fastapi_encoding(backend):
+    from fastapi.encoders import jsonable_encoder
+
+    msg = AbbreviationExtractionResponseMsg(
+        generated_utc=datetime.datetime(2024, 5, 1, 12, 30, 15, 123456),
+        data=AbbreviationExtractionResultsData(s3_objects=[
+            S3ObjectProcessed(container_id="1", bucket_name="bucket", s3_key="ключ", user_data={"a": [1, None]})
+        ])
+    )
+
+    response = models_response([msg])
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder([msg])
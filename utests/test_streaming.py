@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+import extractor_service.common.globals as aes_globals
+from extractor_service.common.struct.mixins.controlled_runnable_mixin import AsyncControlledRunnableMixin
+from extractor_service.common.struct.model.abbreviation_extractor import AbbreviationExtractorS3Result
+from extractor_service.common.struct.queue import BaseInQueueMsg, BaseOutQueueMsg
+from extractor_service.handlers.abbreviation_extractor import AbbreviationsStreamExtractorHandler
+from extractor_service.resource_models.base_resource_model import BaseProxyModel
+from utils.aes_utils.exceptions import TechHandleException
+from utils.aes_utils.models.abbreviation_extractor import AbbreviationExtractionRequestMsg
+from utils.aes_utils.models.base_message import Status
+from utils.status import StatusCodes
+
+
+class FakeQueue:
+    """ Очередь процессов без процессов: тот же интерфейс, что и у ProcessQueue """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.done = 0
+
+    def put(self, msg):
+        self.queue.put_nowait(msg)
+
+    async def aput(self, msg):
+        self.queue.put_nowait(msg)
+
+    async def aget(self):
+        return await self.queue.get()
+
+    def task_done(self):
+        self.done += 1
+
+
+class FakeRunnable:
+    """ Минимальное состояние ресурса для отправки результатов задачи """
+
+    def __init__(self):
+        self._out_queue = FakeQueue()
+        self._out_msg_type = BaseOutQueueMsg
+        self._logger = logging.getLogger("test_streaming")
+
+    def reply_queue(self, reply_to: int):
+        return self._out_queue
+
+    async def _add_task(self, task):
+        return task.get_name()
+
+    async def _delete_task(self, task):
+        pass
+
+
+def _result(idx: int, status: StatusCodes = StatusCodes.OK) -> AbbreviationExtractorS3Result:
+    return AbbreviationExtractorS3Result.construct(key_=str(idx), container_id=str(idx), user_data={"idx": idx},
+                                                   bucket_name="bucket", s3_key=f"results/{idx}.json",
+                                                   line_index=None, offset=None,
+                                                   status=Status.make_status(status=status))
+
+
+async def _results(count: int, error: Exception = None):
+    for idx in range(count):
+        yield _result(idx)
+    if error is not None:
+        raise error
+
+
+async def _handle(gen):
+    return gen
+
+
+@pytest.mark.asyncio
+async def test_stream_result_is_sent_in_parts():
+    runnable = FakeRunnable()
+
+    await AsyncControlledRunnableMixin._process_and_send_result(runnable, _handle(_results(2)), "task")
+
+    msgs = [runnable._out_queue.queue.get_nowait() for _ in range(3)]
+    assert [msg.partial for msg in msgs] == [True, True, False]
+    assert [msg.data.container_id for msg in msgs[:2]] == ["0", "1"]
+    assert msgs[-1].data is None and msgs[-1].status.code == StatusCodes.OK.code
+
+    # ошибка посреди потока завершает его сообщением с ошибкой
+    await AsyncControlledRunnableMixin._process_and_send_result(runnable, _handle(_results(1, ValueError())), "task")
+
+    msgs = [runnable._out_queue.queue.get_nowait() for _ in range(2)]
+    assert [msg.partial for msg in msgs] == [True, False]
+    assert msgs[-1].status.code == StatusCodes.INTERNAL_ERROR.code
+
+
+async def _collect(stream) -> list:
+    return [data async for data in stream]
+
+
+def _out_msg(uuid: str, data=None, partial: bool = False, status: StatusCodes = StatusCodes.OK):
+    return BaseOutQueueMsg.construct(uuid=uuid, data=data, partial=partial, status=Status.make_status(status=status))
+
+
+@pytest.mark.asyncio
+async def test_proxy_yields_parts_and_skips_abandoned_streams():
+    in_queue, out_queue = FakeQueue(), FakeQueue()
+    proxy = BaseProxyModel(in_queue, out_queue, BaseInQueueMsg)
+
+    stream = proxy.request_stream(data=None)
+    first = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0)
+    uuid = in_queue.queue.get_nowait().uuid
+
+    await out_queue.aput(_out_msg(uuid, data=1, partial=True))
+    assert await first == 1
+    # клиент перестал читать поток: оставшиеся части отбрасываются
+    await stream.aclose()
+    assert in_queue.done == 1
+    await out_queue.aput(_out_msg(uuid, data=2, partial=True))
+    await out_queue.aput(_out_msg(uuid))
+
+    # прокси создается на каждый запрос: сообщения прерванного потока отбрасывает и другой прокси
+    proxy = BaseProxyModel(in_queue, out_queue, BaseInQueueMsg)
+    stream = proxy.request_stream(data=None)
+    first = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0)
+    uuid = in_queue.queue.get_nowait().uuid
+    await out_queue.aput(_out_msg(uuid, data=3, partial=True))
+    await out_queue.aput(_out_msg(uuid, status=StatusCodes.INTERNAL_ERROR))
+
+    assert await first == 3
+    with pytest.raises(TechHandleException):
+        await stream.__anext__()
+    assert out_queue.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_share_reply_queue():
+    in_queue, out_queue = FakeQueue(), FakeQueue()
+    streams = [BaseProxyModel(in_queue, out_queue, BaseInQueueMsg).request_stream(data=None) for _ in range(2)]
+    reads = [asyncio.create_task(_collect(stream)) for stream in streams]
+    await asyncio.sleep(0)
+    uuids = [in_queue.queue.get_nowait().uuid for _ in range(2)]
+
+    # части потоков перемешаны, финальное сообщение одного потока приходит раньше частей другого
+    await out_queue.aput(_out_msg(uuids[0], data="a1", partial=True))
+    await out_queue.aput(_out_msg(uuids[1], data="b1", partial=True))
+    await out_queue.aput(_out_msg(uuids[0], data="a2", partial=True))
+    await out_queue.aput(_out_msg(uuids[0]))
+    await out_queue.aput(_out_msg(uuids[1], data="b2", partial=True))
+    await out_queue.aput(_out_msg(uuids[1]))
+
+    assert await asyncio.wait_for(asyncio.gather(*reads), timeout=5) == [["a1", "a2"], ["b1", "b2"]]
+    assert in_queue.done == 2
+    assert out_queue.queue.empty()
+
+
+class FakeTech:
+    def __init__(self, results: list, error: Exception = None):
+        self.results = results
+        self.error = error
+
+    async def handle_stream(self, data, language, cache_mode):
+        for result in self.results:
+            yield result
+        if self.error is not None:
+            raise self.error
+
+
+class FakeResourceManager:
+    def __init__(self, tech: FakeTech):
+        self.tech = tech
+
+    def get_resource(self, name):
+        return self.tech
+
+
+def _request(containers: int) -> AbbreviationExtractionRequestMsg:
+    return AbbreviationExtractionRequestMsg.parse_obj({
+        "Data": {
+            "Language": "ru",
+            "S3ObjectContainers": [{"ContainerId": str(idx), "S3Object": []} for idx in range(containers)]
+        }
+    })
+
+
+async def _lines(handler, msg) -> list:
+    return [json.loads(line) async for line in handler(msg)]
+
+
+@pytest.mark.asyncio
+async def test_handler_streams_ndjson_with_summary():
+    aes_globals.service_logger = logging.getLogger("test_streaming")
+    tech = FakeTech([_result(0), _result(1, StatusCodes.CONTENT_NOT_FOUND)])
+
+    lines = await _lines(AbbreviationsStreamExtractorHandler(FakeResourceManager(tech)), _request(2))
+
+    assert [line["ContainerId"] for line in lines[:2]] == ["0", "1"]
+    assert lines[0]["S3Key"] == "results/0.json"
+    assert lines[-1]["Summary"] == {"Total": 2, "Succeeded": 1, "Failed": 1,
+                                    "Status": {"Code": StatusCodes.OK.code, "Message": StatusCodes.OK.value[1]}}
+
+
+@pytest.mark.asyncio
+async def test_handler_reports_error_in_summary():
+    aes_globals.service_logger = logging.getLogger("test_streaming")
+    error = TechHandleException(status=Status.make_status(status=StatusCodes.INTERNAL_ERROR))
+    tech = FakeTech([_result(0)], error=error)
+
+    lines = await _lines(AbbreviationsStreamExtractorHandler(FakeResourceManager(tech)), _request(2))
+
+    assert len(lines) == 2
+    assert lines[-1]["Summary"]["Total"] == 1
+    assert lines[-1]["Summary"]["Status"]["Code"] == StatusCodes.INTERNAL_ERROR.code
@@ -11,7 +11,70 @@ import utils.ut_logging as ut_logging
 SRV_LOG_LEVEL_ENV = "SRV_LOG_LEVEL"
 
 
-async def async_grouper(content_gen: AsyncGenerator, batch_size: Optional[int] = -1) -> AsyncGenerator:
+_GROUPER_END = object()
+
+
+async def _linger_grouper(content_gen: AsyncGenerator, batch_size: int, linger: float) -> AsyncGenerator:
+    # чтение источника вынесено в отдельную задачу: ожидание очереди с таймаутом
+    # можно безопасно прервать, в отличие от __anext__ асинхронного генератора
+    queue = asyncio.Queue(maxsize=max(batch_size, 0))
+
+    async def _read():
+        try:
+            async for content_info in content_gen:
+                await queue.put(content_info)
+        finally:
+            await queue.put(_GROUPER_END)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.create_task(_read())
+    cur_batch = []
+    deadline = None
+    try:
+        while True:
+            timeout = max(deadline - loop.time(), 0) if cur_batch else None
+            try:
+                content_info = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield cur_batch
+                cur_batch = []
+                continue
+
+            if content_info is _GROUPER_END:
+                break
+
+            if not cur_batch:
+                deadline = loop.time() + linger
+            cur_batch.append(content_info)
+            if 0 < batch_size <= len(cur_batch):
+                yield cur_batch
+                cur_batch = []
+
+        if cur_batch:
+            yield cur_batch
+
+        # пробрасываем исключения источника
+        await reader
+    finally:
+        reader.cancel()
+
+
+async def async_grouper(content_gen: AsyncGenerator,
+                        batch_size: Optional[int] = -1,
+                        linger: Optional[float] = None) -> AsyncGenerator:
+    """
+    Разбивает асинхронный генератор на группы по batch_size элементов
+
+    :param content_gen: источник элементов
+    :param batch_size: размер группы (-1 - все элементы одной группой)
+    :param linger: максимальное время (с) ожидания заполнения группы с момента
+                   поступления ее первого элемента; None - ждать заполнения
+    """
+    if linger is not None:
+        async for batch in _linger_grouper(content_gen, batch_size, linger):
+            yield batch
+        return
+
     cur_batch = []
     async for content_info in content_gen:
         cur_batch.append(content_info)
@@ -67,8 +130,9 @@ def retry(exceptions: Union[Type[Exception], Tuple[Type[Exception]]] = Exception
                     if _tries == 0:
                         raise
 
-                logger.debug(f"retry: {func}")
-                time.sleep(_delay)
+                logger.debug("retry: %s", func)
+                # time.sleep остановил бы весь цикл событий на время ожидания
+                await asyncio.sleep(_delay)
                 _delay = update_delay(_delay)
 
         @wraps(func)
@@ -82,7 +146,7 @@ def retry(exceptions: Union[Type[Exception], Tuple[Type[Exception]]] = Exception
                     if _tries == 0:
                         raise
 
-                logger.debug(f"retry: {func}")
+                logger.debug("retry: %s", func)
                 time.sleep(_delay)
                 _delay = update_delay(_delay)
 
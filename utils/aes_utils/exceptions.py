@@ -24,3 +24,7 @@ class InternalErrorException(BaseAesException):
 
 class TechHandleException(BaseAesException):
     """ Ошибка при работе технологий """
+
+
+class CircuitOpenException(BaseAesException):
+    """ Обращение к недоступному сервису отклонено без попытки (цепь разомкнута) """
@@ -30,6 +30,8 @@ class S3ObjectContainersData(BaseData):
 
 class AbbreviationExtractionRequestData(S3ObjectContainersData):
     language: str
+    # режим использования кэшей результатов: 'use', 'bypass' (не обращаться), 'refresh' (пересчитать)
+    cache_mode: str = "use"
 
 
 class AbbreviationExtractionRequestMsg(BaseMsgBody):
@@ -42,6 +44,10 @@ class S3ObjectProcessed(BaseModel):
     container_id: str
     bucket_name: Optional[str]
     s3_key: Optional[str]
+    # если результаты запроса собраны в общий объект JSONL:
+    # номер строки результата и ее смещение в байтах (в несжатых данных)
+    line_index: Optional[int]
+    offset: Optional[int]
     user_data: Dict = Field(default_factory=dict)
     status: Status = Status.make_status(status=StatusCodes.OK)
 
@@ -52,3 +58,80 @@ class AbbreviationExtractionResultsData(BaseData):
 
 class AbbreviationExtractionResponseMsg(BaseMsgBody):
     data: AbbreviationExtractionResultsData
+
+
+class ExtractionSummary(BaseData):
+    """Итог потоковой обработки: число контейнеров всего, обработанных успешно и с ошибкой"""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+
+
+class AbbreviationExtractionStreamSummary(BaseModel):
+    """Последняя строка потокового ответа (NDJSON) /abbrev/extract_stream"""
+
+    summary: ExtractionSummary
+
+
+class AbbreviationExtractionJobRequestData(AbbreviationExtractionRequestData):
+    # адрес, на который по завершении задания отправляется POST с AbbreviationExtractionJobResponseMsg
+    # (без результатов)
+    webhook_url: Optional[str]
+
+
+class AbbreviationExtractionJobRequestMsg(BaseMsgBody):
+    """Сообщение для запуска асинхронного задания расшифровки аббревиатур объектов DS"""
+
+    data: AbbreviationExtractionJobRequestData
+
+
+class AbbreviationExtractionJobData(BaseData):
+    """Состояние задания: статус WAITING - в очереди, IN_PROGRESS - выполняется, OK - завершено"""
+
+    job_id: str
+    total: int = 0
+    processed: int = 0
+    failed: int = 0
+    # результаты обработанных контейнеров (часть, запрошенная offset и limit)
+    s3_objects: List[S3ObjectProcessed] = Field(default_factory=list)
+
+
+class AbbreviationExtractionJobResponseMsg(BaseMsgBody):
+    data: AbbreviationExtractionJobData
+
+
+class TextContainerInfo(BaseData):
+    container_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    text: str
+    user_data: Dict = Field(default_factory=dict)
+    status: Status = Status.make_status(status=StatusCodes.OK)
+
+
+class AbbreviationExtractionTextRequestData(BaseData):
+    texts: List[TextContainerInfo]
+    language: str
+    # режим использования кэшей результатов: 'use', 'bypass' (не обращаться), 'refresh' (пересчитать)
+    cache_mode: str = "use"
+
+
+class AbbreviationExtractionTextRequestMsg(BaseMsgBody):
+    """Сообщение для запроса расшифровки аббревиатур текстов, переданных в самом запросе"""
+
+    data: AbbreviationExtractionTextRequestData
+
+
+class TextProcessed(BaseModel):
+    container_id: str
+    # аббревиатура -> {расшифровка: число вхождений}
+    expansions: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    user_data: Dict = Field(default_factory=dict)
+    status: Status = Status.make_status(status=StatusCodes.OK)
+
+
+class AbbreviationExtractionTextResultsData(BaseData):
+    texts: List[TextProcessed]
+
+
+class AbbreviationExtractionTextResponseMsg(BaseMsgBody):
+    data: AbbreviationExtractionTextResultsData
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from typing import Any, Dict, TypeVar
+from threading import Lock
+from typing import Any, Dict, TypeVar, Tuple, Type
 
 from pydantic import BaseModel as PydanticBaseModel, create_model
 from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
 
 ModelType = TypeVar("ModelType")
 
+# Реестр типов, полученных при слиянии моделей: (левый тип, правый тип) -> (тип, добавленные поля)
+_MERGED_TYPES: Dict[Tuple[type, type], Tuple[type, Tuple[str, ...]]] = {}
+_MERGED_TYPES_LOCK = Lock()
+
 
 def to_pascal(string: str) -> str:
     return ''.join(word.capitalize() for word in string.split('_'))
@@ -85,22 +90,95 @@ class BaseModel(PydanticBaseModel):
         new_model._init_private_attributes()
         return new_model
 
+    @classmethod
+    def construct_trusted(cls, **values):
+        """ Создать модель из значений, уже имеющих типы полей (например, полей другой модели)
+
+        В отличие от construct вложенные значения не пересоздаются и не копируются, а поля
+        не сопоставляются с псевдонимами: values - значения по названиям полей
+        """
+        new_model = cls.__new__(cls)                                        # pylint: disable=E1120
+        fields_set = set(values)
+        if len(fields_set) < len(cls.__fields__):
+            for name in cls.__fields__.keys() - fields_set:
+                field = cls.__fields__[name]
+                if field.required:
+                    raise AttributeError(f"Required field '{name}' is not found in values")
+                values[name] = field.get_default()
+
+        object.__setattr__(new_model, '__dict__', values)
+        object.__setattr__(new_model, '__fields_set__', fields_set)
+        new_model._init_private_attributes()
+        return new_model
+
+    @classmethod
+    def from_model(cls, model: PydanticBaseModel, **values):
+        """ Модель cls из одноименных полей model без валидации и промежуточных словарей
+
+        :param model: исходная модель (например, публичная модель API для внутренней)
+        :param values: значения, заменяющие или дополняющие поля model
+        """
+        model_values = model.__dict__
+        fields = {name: model_values[name] for name in cls.__fields__ if name in model_values}
+        fields.update(values)
+        return cls.construct_trusted(**fields)
+
     @staticmethod
     def get_fields_as_dict(item: BaseModel) -> Dict[str, Any]:
         return {f_name: getattr(item, f_name) for f_name in item.__fields__}
 
-    def merge(self, model: ModelType) -> ModelType:
-        # TODO: merge in-place (copy - update)
+    @classmethod
+    def _create_merged_type(cls, model_type: Type[PydanticBaseModel]) -> Tuple[type, Tuple[str, ...]]:
         added_fields = {}
-        for name, field1 in model.__fields__.items():
-            if name in self.__fields__:
+        for name, model_field in model_type.__fields__.items():
+            if name in cls.__fields__:
                 continue
 
-            model_field = model.__fields__[name]
             added_fields[name] = (model_field.annotation, model_field.field_info)
 
-        new_model = create_model(f"Merged_{self.__repr_name__()}_{model.__repr_name__()}",
-                                 __base__=type(self), **added_fields)
+        if not added_fields:
+            return cls, ()
+
+        new_model = create_model(f"Merged_{cls.__name__}_{model_type.__name__}",
+                                 __base__=cls, **added_fields)
+        return new_model, tuple(added_fields)
+
+    @classmethod
+    def merged_type(cls, model_type: Type[PydanticBaseModel]) -> Tuple[type, Tuple[str, ...]]:
+        """ Тип, объединяющий поля cls и model_type
+
+        Тип создается один раз на процесс и переиспользуется при последующих слияниях
+
+        :param model_type: тип присоединяемой модели
+        :return: объединенный тип и названия добавленных в него полей
+        """
+        key = (cls, model_type)
+        merged = _MERGED_TYPES.get(key)
+        if merged is not None:
+            return merged
+
+        with _MERGED_TYPES_LOCK:
+            merged = _MERGED_TYPES.get(key)
+            if merged is None:
+                merged = cls._create_merged_type(model_type)
+                _MERGED_TYPES[key] = merged
+        return merged
+
+    def merge(self, model: ModelType, inplace: bool = False) -> ModelType:
+        """ Добавить к модели поля model, которых в ней нет
+
+        :param model: присоединяемая модель
+        :param inplace: изменить текущую модель (допустимо, только если на нее нет других ссылок)
+        :return: модель объединенного типа
+        """
+        merged_type, added_fields = self.merged_type(type(model))
+
+        if inplace:
+            for f_name in added_fields:
+                self.__dict__[f_name] = getattr(model, f_name)
+            self.__fields_set__.update(added_fields)
+            object.__setattr__(self, '__class__', merged_type)
+            return self
 
         values = self.get_fields_as_dict(self)
         values.update(
@@ -109,7 +187,7 @@ class BaseModel(PydanticBaseModel):
                 for f_name in added_fields
             }
         )
-        return new_model.construct(**values)
+        return merged_type.construct(**values)
 
     def json(self, **kwargs) -> str:
         if "by_alias" in kwargs:
@@ -1,4 +1,6 @@
 import argparse
+import gc
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterable, Generator, Any
 
@@ -28,6 +30,24 @@ def grouper(iterable: Iterable, n: int) -> Generator:
         yield iterable[i: i + n]
 
 
+@contextmanager
+def gc_paused():
+    """
+    Отключает сборщик мусора на время синхронного блока, создающего много объектов
+    (например, преобразования тысяч моделей): иначе сборки поколений запускаются
+    многократно посреди блока. Мусор блока собирается после его завершения
+    """
+    if not gc.isenabled():
+        yield
+        return
+
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
 def str_to_bool(bool_str: str) -> bool:
     if bool_str.lower() in BOOL_TRUE_STRINGS:
         return True